@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+# Bump when the metadata written by detect_scenes_and_objects changes shape
+ANALYSIS_VERSION = 5
+
+_ENTRY_FILE = "entry.json"
+_STAGING_PREFIX = ".staging-"
+# Folders of columnar metadata, kept when frame images are evicted
+_COLUMNS_SUFFIX = ".columns"
+
+
+@lru_cache(maxsize=8)
+def _file_digest(path, mtime, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_fingerprint(model):
+    """
+    Identify the weights of a model.
+
+    Args:
+        model (YOLO): The detection model.
+
+    Returns:
+        str: SHA-256 of the checkpoint file the model was loaded from (of the files of an
+            exported model folder, e.g. OpenVINO), or the model's config name when it was not
+            loaded from a file.
+    """
+    path = getattr(model, "ckpt_path", None)
+    if path and os.path.isfile(path):
+        stat = os.stat(path)
+        return _file_digest(os.path.abspath(path), stat.st_mtime, stat.st_size)
+    if path and os.path.isdir(path):
+        digest = hashlib.sha256()
+        for file_name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, file_name)
+            if os.path.isfile(file_path):
+                stat = os.stat(file_path)
+                digest.update(f"{file_name}:{_file_digest(os.path.abspath(file_path), stat.st_mtime, stat.st_size)}".encode())
+        return digest.hexdigest()
+    return str(getattr(model, "cfg", None) or getattr(model, "model_name", None) or type(model).__name__)
+
+
+def _folder_size(path):
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.path.getsize(os.path.join(dir_path, file_name))
+            except OSError:
+                pass
+    return total
+
+
+class AnalysisCache:
+    """
+    On-disk cache of analysis results keyed by video content and analysis parameters.
+
+    Every entry is a folder holding the metadata JSON and the annotated and raw frame images of
+    one analysis run. Runs write into a staging folder that is renamed into place when they
+    finish, so concurrent runs of the same video never see a half-written entry.
+
+    When the cache grows past `max_bytes`, the image folders of the least recently used entries
+    are deleted first. Their metadata stays cached, so later hits still skip the analysis.
+    Whole entries are only removed if the metadata alone is over the limit.
+
+    Args:
+        root (str): Cache directory, defaults to FREEZE_CACHE_DIR or "analysis_cache".
+        max_bytes (int): Size limit, defaults to FREEZE_CACHE_MAX_MB megabytes (5 GB).
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.environ.get("FREEZE_CACHE_DIR", "analysis_cache")
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("FREEZE_CACHE_MAX_MB", "5120")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, video_id, model, frame_skip, threshold, **options):
+        """
+        Build the cache key of one analysis.
+
+        Args:
+            video_id (str): Content hash of the video, from `compute_video_id`.
+            model (YOLO): The detection model.
+            frame_skip (int): Sampling stride used for object detection.
+            threshold (float): ContentDetector threshold used for scene detection.
+            **options: Any other settings that change the result, e.g. the sampling mode.
+
+        Returns:
+            str: Hex digest identifying the analysis.
+        """
+        params = {
+            "version": ANALYSIS_VERSION,
+            "video_id": video_id,
+            "model": model_fingerprint(model),
+            "frame_skip": frame_skip,
+            "threshold": threshold,
+            **options,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _read_entry(self, key):
+        try:
+            with open(os.path.join(self._entry_path(key), _ENTRY_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, key, entry):
+        path = os.path.join(self._entry_path(key), _ENTRY_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, indent=4)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """
+        Look up an analysis and mark it as recently used.
+
+        Returns:
+            str: Path to the cached metadata JSON, or None on a miss.
+        """
+        with self._lock:
+            entry = self._read_entry(key)
+            if entry is None:
+                return None
+            metadata_path = os.path.join(self._entry_path(key), entry["metadata_file"])
+            if not os.path.exists(metadata_path):
+                return None
+            entry["last_used"] = time.time()
+            self._write_entry(key, entry)
+            return metadata_path
+
+    def staging_folder(self):
+        """Create a private folder for a run whose result will be passed to `put`."""
+        path = os.path.join(self.root, f"{_STAGING_PREFIX}{uuid.uuid4().hex}")
+        os.makedirs(path)
+        return path
+
+    def put(self, key, staging_folder, metadata_path):
+        """
+        Move a finished run into the cache and evict old entries if the cache is too large.
+
+        Args:
+            key (str): Cache key from `key`.
+            staging_folder (str): Folder from `staging_folder` holding the run's outputs.
+            metadata_path (str): Path of the metadata JSON inside `staging_folder`.
+
+        Returns:
+            str: Path to the cached metadata JSON.
+        """
+        metadata_file = os.path.relpath(metadata_path, staging_folder)
+        entry_path = self._entry_path(key)
+        with self._lock:
+            try:
+                os.rename(staging_folder, entry_path)
+            except OSError:
+                # Another run of the same analysis finished first, keep its entry
+                shutil.rmtree(staging_folder, ignore_errors=True)
+                if self._read_entry(key) is None:
+                    raise
+            else:
+                now = time.time()
+                self._write_entry(key, {
+                    "metadata_file": metadata_file,
+                    "created": now,
+                    "last_used": now,
+                    "size": _folder_size(entry_path),
+                    "frames_evicted": False,
+                })
+            metadata_file = self._read_entry(key)["metadata_file"]
+            self._evict()
+        return os.path.join(entry_path, metadata_file)
+
+    def discard(self, staging_folder):
+        """Remove the staging folder of a failed run."""
+        shutil.rmtree(staging_folder, ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.startswith(_STAGING_PREFIX):
+                continue
+            entry = self._read_entry(name)
+            if entry is not None:
+                entries.append((name, entry))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda item: item[1]["last_used"])
+        total = sum(entry["size"] for _, entry in entries)
+        if total <= self.max_bytes:
+            return
+
+        # Drop frame images first, oldest use first
+        for key, entry in entries:
+            if total <= self.max_bytes:
+                return
+            if entry["frames_evicted"]:
+                continue
+            entry_path = self._entry_path(key)
+            for name in os.listdir(entry_path):
+                path = os.path.join(entry_path, name)
+                if os.path.isdir(path) and not name.endswith(_COLUMNS_SUFFIX):
+                    shutil.rmtree(path, ignore_errors=True)
+            size = _folder_size(entry_path)
+            total -= entry["size"] - size
+            entry.update(size=size, frames_evicted=True)
+            self._write_entry(key, entry)
+
+        # Still too large: drop whole entries
+        for key, entry in entries:
+            if total <= self.max_bytes:
+                return
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            total -= entry["size"]
+
+    def stats(self):
+        """Return the number of entries, their total size and the size limit."""
+        with self._lock:
+            entries = self._entries()
+        return {
+            "entries": len(entries),
+            "entries_with_frames": sum(not entry["frames_evicted"] for _, entry in entries),
+            "bytes": sum(entry["size"] for _, entry in entries),
+            "max_bytes": self.max_bytes,
+        }
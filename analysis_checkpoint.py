@@ -0,0 +1,123 @@
+import json
+import os
+
+from scenedetect import FrameTimecode
+
+# Bump when the record format changes; logs of another version are not resumed
+CHECKPOINT_VERSION = 2
+
+
+class AnalysisCheckpoint:
+    """
+    Append-only JSON Lines log of the scenes an analysis has finished.
+
+    The first line holds the analysis settings and frame rate. Every later line is one finished
+    scene: its start and end frame and the detections of its sampled frames. A scene is written
+    and synced to disk as soon as the first frame of the next scene comes back from the model,
+    and the last one when the run ends, so a killed run only loses the scene in progress.
+
+    With `resume=True` the scenes of an existing log are kept and `end_frame` is where the
+    analysis should continue. The same applies to a video file that has grown since it was
+    analyzed, such as footage that is still being recorded: only the new frames are analyzed,
+    and they start a new scene at the old end. Without `resume` an existing log is started over.
+
+    Args:
+        path (str): Path of the .jsonl log.
+        settings (dict): Analysis settings; a log written with other settings is not resumed.
+        fps (float): Frame rate of the video.
+        resume (bool): Keep the scenes of an existing log.
+    """
+
+    def __init__(self, path, settings, fps, resume=False):
+        self.path = path
+        self.settings = settings
+        self.fps = float(fps)
+        self.scenes = []
+        self._current = None
+        self._current_index = None
+
+        if resume and os.path.exists(path):
+            self._load()
+            self._file = open(path, "a")
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "w")
+            self._write({"version": CHECKPOINT_VERSION, "settings": settings, "fps": self.fps})
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            lines = f.readlines()
+        if not lines:
+            raise ValueError(f"Checkpoint {self.path} is empty.")
+        header = json.loads(lines[0])
+        if header.get("version") != CHECKPOINT_VERSION or header.get("settings") != self.settings:
+            raise ValueError(
+                f"Checkpoint {self.path} was written by a different analysis version or settings "
+                f"({header.get('settings')}); resume with the same settings or start over.")
+        self.fps = header["fps"]
+
+        valid_bytes = len(lines[0])
+        for line in lines[1:]:
+            try:
+                self.scenes.append(json.loads(line))
+            except ValueError:
+                # A run killed mid-write leaves a partial last line
+                print(f"Warning: dropping a partial record at the end of {self.path}.")
+                break
+            valid_bytes += len(line)
+        with open(self.path, "r+b") as f:
+            f.truncate(valid_bytes)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @property
+    def end_frame(self):
+        """First frame after the last checkpointed scene."""
+        return self.scenes[-1]["end_frame"] if self.scenes else 0
+
+    def record(self, key, detected_objects):
+        """
+        Add the result of one sampled frame. Results must arrive in sampling order.
+
+        Args:
+            key (tuple): (scene_index, frame_index) of the frame.
+            detected_objects (list): Detections of the frame, possibly empty.
+        """
+        scene_index, frame_index = key
+        if scene_index != self._current_index:
+            # Every scene's first frame is sampled, so it is also where the previous scene ends
+            self._finish_scene(frame_index)
+            self._current_index = scene_index
+            self._current = {"start_frame": frame_index, "end_frame": None, "frames": []}
+        if detected_objects:
+            self._current["frames"].append([frame_index, detected_objects])
+
+    def _finish_scene(self, end_frame):
+        if self._current is None:
+            return
+        self._current["end_frame"] = end_frame
+        self._write(self._current)
+        self.scenes.append(self._current)
+        self._current = None
+
+    def finish(self, scene_list):
+        """Checkpoint the last scene of a completed run, which ends where `scene_list` ends."""
+        if scene_list:
+            self._finish_scene(scene_list[-1][1].get_frames())
+
+    def close(self):
+        self._file.close()
+
+    def scene_list(self):
+        """Return every checkpointed scene as a (start, end) FrameTimecode pair."""
+        return [
+            (FrameTimecode(scene["start_frame"], self.fps), FrameTimecode(scene["end_frame"], self.fps))
+            for scene in self.scenes
+        ]
+
+    def frame_detections(self):
+        """Return the (frame_index, detected_objects) pairs of every checkpointed scene in frame order."""
+        return [(frame_index, objects) for scene in self.scenes for frame_index, objects in scene["frames"]]
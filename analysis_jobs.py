@@ -0,0 +1,462 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import traceback
+from contextlib import contextmanager
+
+from analysis_cache import AnalysisCache
+from analysis_metrics import AnalysisMetrics
+from detection_cache import DetectionCache
+from detector_backends import export_detector, weights_path
+from frame_sampling import max_sample_stride
+from pyscene_optimized import (
+    analysis_options,
+    columnar_path,
+    compute_video_id,
+    detect_scenes_and_objects,
+    get_video_fps,
+    insert_metadata_into_db,
+    stored_analysis_key,
+)
+
+# A job is queued, then running, and ends as done, failed or cancelled
+ACTIVE_STATUSES = ("queued", "running")
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        video_path TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        options TEXT NOT NULL,  -- JSON keyword arguments for run_analysis
+        status TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,  -- Fraction of the video analyzed
+        message TEXT,  -- Progress detail, or the error of a failed job
+        result TEXT,  -- JSON returned by run_analysis
+        metrics TEXT,  -- JSON snapshot of the job's AnalysisMetrics
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        worker_pid INTEGER,
+        created REAL NOT NULL,
+        started REAL,
+        finished REAL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status_idx ON jobs (status, id);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running analysis once its job has been cancelled."""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Queue of analysis jobs in a SQLite table, shared by the app and the worker processes.
+
+    Every call opens its own connection, so one instance can be used from any thread or
+    process. The table lives in FREEZE_JOBS_DB, by default output_metadata/analysis_jobs.sqlite3,
+    and outlives the app, so a refreshed browser or restarted app still sees its jobs.
+
+    Args:
+        path (str): SQLite database file, defaults to FREEZE_JOBS_DB.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("FREEZE_JOBS_DB", os.path.join("output_metadata", "analysis_jobs.sqlite3"))
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._connect() as conn:
+            # Readers polling for status do not block the workers' writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA_SQL)
+            # Tables created before jobs recorded metrics
+            if "metrics" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN metrics TEXT")
+                except sqlite3.OperationalError as e:
+                    if "duplicate column" not in str(e):  # Added by another process meanwhile
+                        raise
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["metrics"] = json.loads(job["metrics"]) if job["metrics"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(self, video_path, video_id, **options):
+        """
+        Queue the analysis of a video.
+
+        Args:
+            video_path (str): Path to the video file. Must stay in place until the job ends.
+            video_id (str): Id of the video, e.g. from `compute_video_id`.
+            **options: Keyword arguments for `run_analysis`, and optionally `model_size` and
+                `backend` to choose the detector (see `start_workers`).
+
+        Returns:
+            int: Id of the new job, or of the queued or running job for the same video and
+                options if there is one.
+        """
+        options = json.dumps(options, sort_keys=True)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT id FROM jobs WHERE video_id = ? AND options = ? AND status IN {ACTIVE_STATUSES}",
+                (video_id, options)).fetchone()
+            if row is not None:
+                conn.execute("COMMIT")
+                return row["id"]
+            job_id = conn.execute(
+                "INSERT INTO jobs (video_path, video_id, options, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (video_path, video_id, options, time.time())).lastrowid
+            conn.execute("COMMIT")
+        return job_id
+
+    def get(self, job_id):
+        """Return a job as a dict of its columns, or None if it does not exist."""
+        with self._connect() as conn:
+            return self._job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def jobs(self, limit=20):
+        """Return the most recently submitted jobs, newest first."""
+        with self._connect() as conn:
+            return [self._job(row) for row in conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+    def active_jobs(self):
+        """Return every queued or running job, oldest first."""
+        with self._connect() as conn:
+            return [self._job(row) for row in conn.execute(
+                f"SELECT * FROM jobs WHERE status IN {ACTIVE_STATUSES} ORDER BY id")]
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job ends at once; a running job stops at its next progress report.
+
+        Returns:
+            bool: False if the job had already ended.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cancelled = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (now, job_id)).rowcount
+            cancelled += conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)).rowcount
+            conn.execute("COMMIT")
+        return bool(cancelled)
+
+    def claim(self):
+        """
+        Take the oldest queued job for the calling process.
+
+        Returns:
+            dict: The job, now running, or None if nothing is queued.
+        """
+        with self._connect() as conn:
+            # Taking the write lock first keeps two workers from claiming the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started = ?, message = NULL WHERE id = ?",
+                (os.getpid(), time.time(), row["id"]))
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        return self._job(job)
+
+    def report_progress(self, job_id, progress, message=None, metrics=None):
+        """
+        Record the progress of a running job.
+
+        Args:
+            job_id (int): The job.
+            progress (float): Fraction of the video analyzed.
+            message (str): Progress detail shown with the job.
+            metrics (dict): Snapshot of the job's AnalysisMetrics so far.
+
+        Returns:
+            bool: True if the job has been cancelled and should stop.
+        """
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ?, message = ?, metrics = COALESCE(?, metrics) WHERE id = ?",
+                         (progress, message, json.dumps(metrics) if metrics is not None else None, job_id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def _end(self, job_id, status, message=None, result=None, progress=None, metrics=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, result = ?, progress = COALESCE(?, progress), "
+                "metrics = COALESCE(?, metrics), finished = ? WHERE id = ?",
+                (status, message, json.dumps(result) if result is not None else None, progress,
+                 json.dumps(metrics) if metrics is not None else None, time.time(), job_id))
+
+    def finish(self, job_id, result, metrics=None):
+        """Mark a job done with the result of `run_analysis` and its final metrics snapshot."""
+        self._end(job_id, "done", result=result, progress=1.0, metrics=metrics)
+
+    def fail(self, job_id, error, metrics=None):
+        """Mark a job failed with an error message."""
+        self._end(job_id, "failed", message=error, metrics=metrics)
+
+    def mark_cancelled(self, job_id, metrics=None):
+        """Mark a running job as stopped after a cancellation."""
+        self._end(job_id, "cancelled", metrics=metrics)
+
+    def requeue_orphans(self):
+        """
+        Queue again the running jobs whose worker process no longer exists.
+
+        Their analysis resumes from its checkpoint. Orphans that were being cancelled are
+        marked cancelled instead.
+
+        Returns:
+            int: Number of jobs requeued.
+        """
+        requeued = 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id, worker_pid, cancel_requested FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                if row["worker_pid"] is not None and _pid_alive(row["worker_pid"]):
+                    continue
+                if row["cancel_requested"]:
+                    conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?",
+                                 (time.time(), row["id"]))
+                else:
+                    conn.execute("UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE id = ?", (row["id"],))
+                    requeued += 1
+            conn.execute("COMMIT")
+        return requeued
+
+
+def run_analysis(model, video_path, video_id=None, base_output_folder="output_metadata", frame_skip=24,
+                 threshold=30.0, cache=None, on_progress=None, **options):
+    """
+    Analyze a video and store its metadata in the database, as the app's "Analyze Video" does.
+
+    The analysis is checkpointed under `base_output_folder`/checkpoints, so an interrupted run
+    with the same options continues where it stopped, and served from the analysis cache when it
+    was run before. The database ingest is skipped when it already holds this analysis.
+
+    Args:
+        model (YOLO): The detection model.
+        video_path (str): Path to the input video file.
+        video_id (str): Id of the video, computed from its content when not given.
+        base_output_folder (str): Folder for checkpoints and uncached outputs.
+        frame_skip (int): Number of frames to skip during object detection.
+        threshold (float): ContentDetector threshold for scene cuts.
+        cache (AnalysisCache): Cache of earlier analyses, a default AnalysisCache when not given.
+        on_progress (callable): Passed to `detect_scenes_and_objects`.
+        **options: Further keyword arguments for `detect_scenes_and_objects`, e.g. single_pass or metrics.
+
+    Returns:
+        dict: video_id, metadata_file, analysis_key (the analysis cache key of the result), and
+            sample_interval, the most seconds between two sampled frames of a scene: the fixed
+            stride, or the adaptive sampler's longest stride with adaptive=True.
+    """
+    cache = cache if cache is not None else AnalysisCache()
+    video_id = video_id or compute_video_id(video_path)
+    fps = get_video_fps(video_path)
+    analysis_key = cache.key(video_id, model, frame_skip, threshold, **analysis_options(**options))
+    # Scenes finished by an interrupted run with the same options are not redone. Runs of the
+    # same analysis with other options, e.g. jobs from the two apps, each get their own log.
+    run_options = json.dumps(options, sort_keys=True, default=lambda value: type(value).__name__)
+    run_key = hashlib.sha256(f"{analysis_key}:{run_options}".encode()).hexdigest()
+    checkpoint_path = os.path.join(base_output_folder, "checkpoints", f"{run_key}.jsonl")
+
+    # Run detection, or reuse the cached result of the same analysis
+    metadata_file = detect_scenes_and_objects(
+        model=model,
+        video_path=video_path,
+        base_output_folder=base_output_folder,
+        fps=fps,
+        frame_skip=frame_skip,
+        threshold=threshold,
+        cache=cache,
+        video_id=video_id,
+        checkpoint_path=checkpoint_path,
+        resume=True,
+        on_progress=on_progress,
+        **options
+    )
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    # Insert metadata into the database, replacing earlier rows of this video only.
+    # Skipped when the rows of this exact analysis are already stored.
+    if stored_analysis_key(video_id) != analysis_key:
+        insert_metadata_into_db(columnar_path(metadata_file), video_id=video_id, video_path=video_path,
+                                analysis_key=analysis_key)
+
+    return {
+        "video_id": video_id,
+        "metadata_file": metadata_file,
+        "analysis_key": analysis_key,
+        "sample_interval": max_sample_stride(frame_skip, options.get("adaptive", False)) / fps,
+    }
+
+
+def _progress_reporter(queue, job_id, metrics, interval=0.5):
+    # on_progress callback that writes at most every `interval` seconds and stops cancelled jobs
+    last_report = 0.0
+
+    def on_progress(frames_done, total_frames):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < interval and frames_done < total_frames:
+            return
+        last_report = now
+        if queue.report_progress(job_id, frames_done / total_frames, f"Frame {frames_done} of {total_frames}",
+                                 metrics.snapshot()):
+            raise JobCancelled(f"Job {job_id} was cancelled.")
+
+    return on_progress
+
+
+def load_yolo(model_path, torch_threads, backend="torch"):
+    """
+    Load YOLO weights in a worker, limiting torch to its share of the CPU threads.
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        torch_threads (int): Threads torch may use.
+        backend (str): One of detector_backends.DETECTOR_BACKENDS. Other backends than "torch"
+            load an export of the weights, made on first use.
+
+    Returns:
+        YOLO: The detection model.
+    """
+    import torch
+    from ultralytics import YOLO
+
+    torch.set_num_threads(torch_threads)
+    return YOLO(export_detector(model_path, backend), task="detect")
+
+
+def _export_worker_metrics(metrics, worker_index):
+    # One file per worker for node_exporter's textfile collector, rewritten after every job
+    metrics_dir = os.environ.get("FREEZE_METRICS_DIR")
+    if not metrics_dir:
+        return
+    os.makedirs(metrics_dir, exist_ok=True)
+    metrics.write_textfile(os.path.join(metrics_dir, f"analysis_worker_{worker_index}.prom"),
+                           labels={"worker": str(worker_index)})
+
+
+def _worker_main(queue_path, model_path, load_model, torch_threads, parent_pid, poll_interval, worker_index):
+    queue = JobQueue(queue_path)
+    cache = AnalysisCache()
+    # Shared by every job of this worker, and through its file by every worker
+    cache_entries = int(os.environ.get("FREEZE_DETECTION_CACHE_ENTRIES", "0"))
+    detection_cache = (DetectionCache(cache_entries, os.environ.get("FREEZE_DETECTION_CACHE_PATH"))
+                       if cache_entries else None)
+    model, loaded = None, None
+    # Totals over every job of this worker
+    worker_metrics = AnalysisMetrics()
+    # Exit with the app, even if it was killed without stopping its workers
+    while os.getppid() == parent_pid:
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        job_metrics = AnalysisMetrics()
+        options = dict(job["options"])
+        # The job may pick another model size or backend than the worker's default
+        model_size = options.pop("model_size", None)
+        backend = options.pop("backend", "torch")
+        job_model_path = weights_path(model_size, os.path.dirname(model_path) or ".") if model_size else model_path
+        try:
+            if loaded != (job_model_path, backend):
+                # Kept for the following jobs, reloaded only when a job asks for another model
+                model, loaded = None, None
+                model = load_model(job_model_path, torch_threads, backend)
+                loaded = (job_model_path, backend)
+            result = run_analysis(model, job["video_path"], job["video_id"], cache=cache, metrics=job_metrics,
+                                  on_progress=_progress_reporter(queue, job["id"], job_metrics),
+                                  detection_cache=detection_cache, **options)
+        except JobCancelled:
+            queue.mark_cancelled(job["id"], job_metrics.snapshot())
+            job_metrics.count("jobs_cancelled")
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(job["id"], f"{type(e).__name__}: {e}", job_metrics.snapshot())
+            job_metrics.count("jobs_failed")
+        else:
+            queue.finish(job["id"], result, job_metrics.snapshot())
+            job_metrics.count("jobs_done")
+        worker_metrics.merge(job_metrics.snapshot())
+        _export_worker_metrics(worker_metrics, worker_index)
+
+
+def start_workers(model_path, queue_path=None, workers=None, load_model=load_yolo, poll_interval=1.0):
+    """
+    Start the worker processes that run queued analysis jobs.
+
+    Each worker takes one job at a time, so `workers` is the number of videos analyzed at once.
+    Jobs left running by workers that died are queued again first. The workers are daemonic
+    and exit with the calling process. Each job's metrics are stored with it, and if
+    FREEZE_METRICS_DIR is set every worker writes its totals there in the Prometheus text format.
+    With FREEZE_DETECTION_CACHE_ENTRIES set, each worker keeps a `DetectionCache` of that many
+    frames across its jobs, persisted to FREEZE_DETECTION_CACHE_PATH if that is set too.
+
+    Args:
+        model_path (str): Weights loaded by every worker on its first job. Jobs submitted with a
+            `model_size` option use the weights of that size in the same folder instead, and jobs
+            with a `backend` option an export of them (see detector_backends).
+        queue_path (str): SQLite file of the JobQueue, defaults to FREEZE_JOBS_DB.
+        workers (int): Number of worker processes, defaults to FREEZE_ANALYSIS_WORKERS or 1.
+        load_model (callable): Called as load_model(model_path, torch_threads, backend) in a worker.
+            Must be importable from a new process.
+        poll_interval (float): Seconds an idle worker waits before looking for jobs again.
+
+    Returns:
+        list: The started multiprocessing.Process objects.
+    """
+    queue = JobQueue(queue_path)
+    requeued = queue.requeue_orphans()
+    if requeued:
+        print(f"Requeued {requeued} analysis jobs left running by stopped workers.")
+    workers = workers or int(os.environ.get("FREEZE_ANALYSIS_WORKERS", "1"))
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    # Spawn rather than fork: the parent may already hold torch and decoder threads
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for worker_index in range(workers):
+        process = context.Process(
+            target=_worker_main,
+            args=(queue.path, model_path, load_model, torch_threads, os.getpid(), poll_interval, worker_index),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    return processes
@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+# Marks the end of the sampled frame stream
+_DONE = object()
+
+
+class AnalysisPipeline:
+    """
+    Runs decoding, inference and artifact writing as separate stages connected by bounded queues.
+
+    One decoder thread iterates the sampler, one inference thread feeds the
+    BatchInferenceEngine, and a thread pool runs `write_artifacts` for every frame with
+    detections. A full queue blocks the stage in front of it, so at most
+    `frame_queue_size` decoded frames, one batch and `write_queue_size` pending writes are held
+    in memory. The first error in any stage stops all of them and is re-raised by `run`.
+
+    Args:
+        sampler (iterable): Yields (scene_index, frame_index, frame) tuples.
+        engine (BatchInferenceEngine): Batching inference stage.
+        write_artifacts (callable): Called as write_artifacts(key, frame, detected_objects, result)
+            on a writer thread for every frame with detections.
+        frame_queue_size (int): Maximum number of decoded frames waiting for inference.
+        write_queue_size (int): Maximum number of frames waiting to be written.
+        writer_threads (int): Size of the writer pool, defaults to the number of CPUs.
+        on_result (callable): Called as on_result(key, detected_objects) on the inference thread
+            for every sampled frame, in sampling order.
+    """
+
+    def __init__(self, sampler, engine, write_artifacts, frame_queue_size=16, write_queue_size=32,
+                 writer_threads=None, on_result=None):
+        self.sampler = sampler
+        self.engine = engine
+        self.write_artifacts = write_artifacts
+        self.on_result = on_result
+        self.frame_queue_size = frame_queue_size
+        self.write_queue_size = write_queue_size
+        self.writer_threads = writer_threads or os.cpu_count() or 1
+        self._stop = threading.Event()
+        self._errors = []
+
+    def run(self):
+        """
+        Process the whole sampler.
+
+        Returns:
+            list: (frame_index, detected_objects) pairs for every frame with detections.
+        """
+        self._stop.clear()
+        self._errors = []
+        frame_queue = queue.Queue(self.frame_queue_size)
+        write_slots = threading.BoundedSemaphore(self.write_queue_size)
+        frame_detections = []
+
+        with ThreadPoolExecutor(max_workers=self.writer_threads, thread_name_prefix="writer") as writers:
+            decoder = threading.Thread(target=self._decode, args=(frame_queue,), name="decoder")
+            inference = threading.Thread(
+                target=self._infer, args=(frame_queue, writers, write_slots, frame_detections), name="inference")
+            decoder.start()
+            inference.start()
+            inference.join()
+            decoder.join()
+        # Leaving the executor waits for the pending writes
+
+        if self._errors:
+            raise self._errors[0]
+        frame_detections.sort(key=lambda item: item[0])
+        return frame_detections
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+    def _put(self, q, item):
+        # Block while the queue is full, but give up once another stage has failed
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self, frame_queue):
+        frames = iter(self.sampler)
+        try:
+            for scene_index, frame_index, frame in frames:
+                if not self._put(frame_queue, ((scene_index, frame_index), frame)):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # Stops the sampler's own decoding if we did not exhaust it
+            close = getattr(frames, "close", None)
+            if close is not None:
+                close()
+            self._put(frame_queue, _DONE)
+
+    def _infer(self, frame_queue, writers, write_slots, frame_detections):
+        progress = tqdm(unit="frame")
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    self._dispatch(self.engine.flush(), writers, write_slots, frame_detections)
+                    break
+                key, frame = item
+                self._dispatch(self.engine.submit(key, frame), writers, write_slots, frame_detections)
+                progress.update(1)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            progress.close()
+
+    def _dispatch(self, completed, writers, write_slots, frame_detections):
+        for key, frame, detected_objects, result in completed:
+            if self.on_result is not None:
+                self.on_result(key, detected_objects)
+            if not detected_objects:
+                continue
+            frame_detections.append((key[1], detected_objects))
+            # Wait for a free write slot so pending images stay bounded
+            while not write_slots.acquire(timeout=0.1):
+                if self._stop.is_set():
+                    return
+            future = writers.submit(self.write_artifacts, key, frame, detected_objects, result)
+            future.add_done_callback(lambda f: self._write_done(f, write_slots))
+
+    def _write_done(self, future, write_slots):
+        write_slots.release()
+        error = future.exception()
+        if error is not None:
+            self._fail(error)
@@ -0,0 +1,219 @@
+import time
+
+import numpy as np
+
+from analysis_cache import model_fingerprint
+from analysis_metrics import NULL_METRICS
+
+
+def resolve_device(device="auto"):
+    """
+    Pick the torch device for inference.
+
+    Args:
+        device (str): "auto", or any device string ultralytics accepts ("cpu", "mps", "cuda:0").
+
+    Returns:
+        str: The requested device, or for "auto" the best available one (CUDA, then MPS, then CPU).
+    """
+    if device != "auto":
+        return device
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda:0"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def results_to_objects(result, names):
+    """
+    Convert one ultralytics Results object to the metadata dicts stored per scene.
+
+    Args:
+        result (Results): Detection result for a single frame.
+        names (dict): Class ID to class name mapping of the model.
+
+    Returns:
+        list: One dict per detected box.
+    """
+    detected_objects = []
+    for box in result.boxes:
+        class_id = int(box.cls[0])
+        class_name = names[class_id]  # Map class ID to real-world name
+        confidence = float(box.conf[0])
+        # Normalized to [0, 1] by the frame size, so boxes do not depend on the resolution
+        bbox = box.xyxyn[0].tolist()
+        detected_objects.append({
+            # "class_id": class_id,
+            "class_name": class_name,
+            "confidence": confidence,
+            "bbox": {
+                "x1": float(bbox[0]),
+                "y1": float(bbox[1]),
+                "x2": float(bbox[2]),
+                "y2": float(bbox[3]),
+            },
+        })
+    return detected_objects
+
+
+def _normalized_boxes(result):
+    # Boxes of a Results object as float32 rows of normalized x1, y1, x2, y2, confidence, class id
+    height, width = result.orig_shape
+    boxes = result.boxes.data.cpu().numpy().astype(np.float32)
+    boxes[:, :4] /= np.array([width, height, width, height], dtype=np.float32)
+    return boxes
+
+
+def _cached_result(frame, boxes, names):
+    # Results object for a frame whose boxes came from the detection cache
+    import torch
+    from ultralytics.engine.results import Results
+
+    height, width = frame.shape[:2]
+    boxes = boxes.copy()
+    boxes[:, :4] *= np.array([width, height, width, height], dtype=np.float32)
+    return Results(frame, path="", names=names, boxes=torch.from_numpy(boxes))
+
+
+class BatchInferenceEngine:
+    """
+    Collects sampled frames and runs the model once per batch.
+
+    Frames are submitted with a (scene_index, frame_index) key. `submit` returns the results
+    of a batch whenever one fills up and `flush` returns whatever is left, each as a list of
+    (key, frame, detected_objects, result) tuples in submission order. `result` is the
+    ultralytics Results object for the frame, or None if the model call failed.
+
+    With a `cache`, every frame is looked up first and only the misses are sent to the model;
+    a frame repeated within a batch, by the same hash and thumbnail test as a hit, is inferred
+    once. Hits get a Results object rebuilt from the cached boxes, so they are written and
+    tracked like inferred frames.
+
+    Args:
+        model (YOLO): Pre-trained YOLOv8 model for object detection.
+        batch_size (int): Number of frames per model call.
+        device (str): Inference device, "auto" to pick one. If a call fails on a non-CPU
+            device the engine switches to CPU and retries.
+        cross_scene (bool): Let a batch span scene boundaries. If False, the pending batch is
+            flushed when a frame from a new scene is submitted.
+        verbose (bool): Let ultralytics log every prediction.
+        metrics (AnalysisMetrics): Records the time of every model call as "inference", and
+            counts frames_inferred, batches, detection_errors and device_fallbacks, and with a
+            cache detection_cache_hits and detection_cache_misses.
+        cache (DetectionCache): Detections of earlier frames, see `detection_cache.DetectionCache`.
+    """
+
+    def __init__(self, model, batch_size=8, device="auto", cross_scene=True, verbose=True, metrics=None,
+                 cache=None):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.device = resolve_device(device)
+        self.cross_scene = cross_scene
+        self.verbose = verbose
+        self.metrics = metrics or NULL_METRICS
+        self.cache = cache
+        self._model_key = model_fingerprint(model) if cache is not None else None
+        self.batches = 0
+        self.frames = 0
+        self._keys = []
+        self._frames = []
+        # (cache entry, cached boxes or None, seconds saved) per pending frame, when there is a cache
+        self._lookups = []
+
+    def submit(self, key, frame):
+        completed = []
+        if not self.cross_scene and self._keys and self._keys[-1][0] != key[0]:
+            completed = self.flush()
+        self._keys.append(key)
+        self._frames.append(frame)
+        if self.cache is not None:
+            self._lookups.append(self.cache.lookup(self._model_key, frame))
+        if len(self._frames) >= self.batch_size:
+            completed.extend(self.flush())
+        return completed
+
+    def flush(self):
+        if not self._frames:
+            return []
+        keys, frames = self._keys, self._frames
+        self._keys, self._frames = [], []
+        if self.cache is not None:
+            return self._flush_cached(keys, frames)
+
+        results = self._predict(frames)
+        self.batches += 1
+        self.frames += len(frames)
+        self.metrics.count("batches")
+        self.metrics.count("frames_inferred", len(frames))
+        if results is None:
+            return [(key, frame, [], None) for key, frame in zip(keys, frames)]
+        return [
+            (key, frame, results_to_objects(result, self.model.names), result)
+            for key, frame, result in zip(keys, frames, results)
+        ]
+
+    def _flush_cached(self, keys, frames):
+        lookups, self._lookups = self._lookups, []
+        # Misses to infer. A miss that is the same frame as an earlier one of the batch, by the
+        # cache's own hash and thumbnail test, reuses that frame's result instead.
+        infer = []
+        reuse = {}
+        for i, (entry, boxes, _) in enumerate(lookups):
+            if boxes is not None:
+                continue
+            source = next((j for j in infer if self.cache.same_frame(lookups[j][0], entry)), None)
+            if source is None:
+                infer.append(i)
+            else:
+                reuse[i] = source
+                self.cache.record_reuse()
+        inferred = {}
+        seconds = 0.0
+        if infer:
+            start = time.perf_counter()
+            results = self._predict([frames[i] for i in infer])
+            seconds = (time.perf_counter() - start) / len(infer)
+            self.batches += 1
+            self.frames += len(infer)
+            self.metrics.count("batches")
+            self.metrics.count("frames_inferred", len(infer))
+            if results is not None:
+                for i, result in zip(infer, results):
+                    inferred[i] = result
+                    self.cache.store(lookups[i][0], _normalized_boxes(result), seconds)
+        self.metrics.count("detection_cache_hits", len(frames) - len(infer))
+        self.metrics.count("detection_cache_misses", len(infer))
+
+        completed = []
+        for i, (key, frame, (entry, boxes, saved)) in enumerate(zip(keys, frames, lookups)):
+            if boxes is not None:
+                self.metrics.count("inference_seconds_saved", saved)
+                result = _cached_result(frame, boxes, self.model.names)
+            elif reuse.get(i, i) not in inferred:
+                # The model call failed
+                completed.append((key, frame, [], None))
+                continue
+            elif i in inferred:
+                result = inferred[i]
+            else:
+                self.metrics.count("inference_seconds_saved", seconds)
+                result = _cached_result(frame, _normalized_boxes(inferred[reuse[i]]), self.model.names)
+            completed.append((key, frame, results_to_objects(result, self.model.names), result))
+        return completed
+
+    def _predict(self, frames):
+        try:
+            with self.metrics.timer("inference"):
+                return self.model(frames, device=self.device, verbose=self.verbose)
+        except Exception as e:
+            self.metrics.count("detection_errors")
+            if self.device == "cpu":
+                print(f"Detection error: {e}")
+                return None
+            print(f"Detection error on {self.device}: {e}. Falling back to CPU.")
+            self.metrics.count("device_fallbacks")
+            self.device = "cpu"
+            return self._predict(frames)
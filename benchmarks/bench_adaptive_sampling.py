@@ -0,0 +1,118 @@
+"""
+Inference calls and detection recall of adaptive vs fixed-stride sampling.
+
+Every frame of each video is run through the model once as the reference. For each sampler,
+each reference detection counts as recalled if the sample closest to its frame, in the same
+scene, detected the same class ("frame recall"), or if any sample of its scene did ("scene
+recall"). "Change since sample" is the summed ContentDetector score between a frame and the
+sample before it, a model-independent measure of how stale the sampled view is.
+
+Usage:
+    python -m benchmarks.bench_adaptive_sampling --model yolo_models/YOLOv8x.pt --frame-skip 24
+"""
+import argparse
+import glob
+from bisect import bisect_left
+from collections import defaultdict
+
+from ultralytics import YOLO
+
+from batch_inference import BatchInferenceEngine
+from frame_sampling import AdaptiveSampler, SinglePassSampler
+
+
+class _DenseSampler(SinglePassSampler):
+    """Samples every frame and records the content score of each."""
+
+    def __init__(self, video_path, threshold):
+        super().__init__(video_path, frame_skip=1, threshold=threshold)
+        self.scores = []
+
+    def _should_sample(self, offset, score):
+        self.scores.append(score or 0.0)
+        return True
+
+
+def reference(model, video_path, threshold, device, batch_size):
+    sampler = _DenseSampler(video_path, threshold)
+    engine = BatchInferenceEngine(model, batch_size=batch_size, device=device, verbose=False)
+    scenes, classes = {}, {}
+    completed = []
+    for scene_index, frame_index, frame in sampler:
+        scenes[frame_index] = scene_index
+        completed.extend(engine.submit((scene_index, frame_index), frame))
+    completed.extend(engine.flush())
+    for (_, frame_index), _, detected_objects, _ in completed:
+        classes[frame_index] = {obj["class_name"] for obj in detected_objects}
+    return scenes, classes, sampler.scores
+
+
+def evaluate(sampler, scenes, classes, scores):
+    samples = defaultdict(list)
+    for scene_index, frame_index, _ in sampler:
+        samples[scene_index].append(frame_index)
+
+    frame_hits = scene_hits = total = 0
+    staleness = []
+    # Scores are per frame in decode order, starting at the first frame
+    first = min(scenes)
+    for frame_index in sorted(scenes):
+        scene_samples = samples[scenes[frame_index]]
+        i = bisect_left(scene_samples, frame_index)
+        nearest = min(scene_samples[max(0, i - 1):i + 1], key=lambda f: abs(f - frame_index))
+        previous = scene_samples[i] if i < len(scene_samples) and scene_samples[i] == frame_index else scene_samples[i - 1]
+        staleness.append(sum(scores[previous - first + 1:frame_index - first + 1]))
+
+        scene_classes = set().union(*(classes.get(f, set()) for f in scene_samples))
+        for class_name in classes.get(frame_index, set()):
+            total += 1
+            frame_hits += class_name in classes.get(nearest, set())
+            scene_hits += class_name in scene_classes
+    calls = sum(len(frames) for frames in samples.values())
+    return calls, frame_hits, scene_hits, total, staleness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", nargs="+", default=sorted(glob.glob("03_scenes_segmented/*.mp4")))
+    parser.add_argument("--model", default="yolo_models/YOLOv8x.pt")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--frame-skip", type=int, default=24)
+    parser.add_argument("--threshold", type=float, default=30.0)
+    parser.add_argument("--change-threshold", type=float, default=None)
+    args = parser.parse_args()
+
+    model = YOLO(args.model)
+    totals = defaultdict(lambda: [0, 0, 0, 0, []])
+    frames = 0
+    for video_path in args.videos:
+        scenes, classes, scores = reference(model, video_path, args.threshold, args.device, args.batch_size)
+        frames += len(scenes)
+        samplers = {
+            "fixed": SinglePassSampler(video_path, frame_skip=args.frame_skip, threshold=args.threshold),
+            "adaptive": AdaptiveSampler(video_path, frame_skip=args.frame_skip, threshold=args.threshold,
+                                        change_threshold=args.change_threshold),
+        }
+        for name, sampler in samplers.items():
+            calls, frame_hits, scene_hits, total, staleness = evaluate(sampler, scenes, classes, scores)
+            summary = totals[name]
+            summary[0] += calls
+            summary[1] += frame_hits
+            summary[2] += scene_hits
+            summary[3] += total
+            summary[4].extend(staleness)
+
+    print(f"{len(args.videos)} videos, {frames} frames, frame_skip {args.frame_skip}, model {args.model}")
+    print(f"{'sampler':>9} {'calls':>6} {'saved':>6} {'frame recall':>13} {'scene recall':>13} "
+          f"{'change since sample (mean/max)':>31}")
+    fixed_calls = totals["fixed"][0]
+    for name, (calls, frame_hits, scene_hits, total, staleness) in totals.items():
+        frame_recall = f"{frame_hits / total:.3f}" if total else "n/a"
+        scene_recall = f"{scene_hits / total:.3f}" if total else "n/a"
+        change = f"{sum(staleness) / len(staleness):.1f} / {max(staleness):.1f}"
+        print(f"{name:>9} {calls:>6} {fixed_calls - calls:>6} {frame_recall:>13} {scene_recall:>13} {change:>31}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Startup and per-interaction latency of the Streamlit apps.
+
+Runs an app script headless with Streamlit's AppTest, as if a video had already been
+analyzed, then types into the search box repeatedly. Each keystroke is a full script rerun,
+like in the browser. Run it in a fresh process: the first run includes the module imports.
+
+Usage:
+    FREEZE_MODEL_PATH=yolo_models/YOLOv8x.pt python -m benchmarks.bench_app_startup --app streamlit3.py
+"""
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+
+def timed_run(app_test):
+    start = time.perf_counter()
+    app_test.run()
+    if app_test.exception:
+        raise SystemExit(f"App raised: {app_test.exception[0].message}")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="streamlit3.py")
+    parser.add_argument("--interactions", type=int, default=10)
+    args = parser.parse_args()
+
+    app_test = AppTest.from_file(os.path.abspath(args.app), default_timeout=600)
+    # Show the search form without uploading and analyzing a video
+    app_test.session_state["video_path"] = os.path.abspath(args.app)
+    startup = timed_run(app_test)
+
+    timings = []
+    for i in range(args.interactions):
+        app_test.text_input[0].input("person" if i % 2 else "car")
+        timings.append(timed_run(app_test))
+
+    print(f"{args.app}: model {os.environ.get('FREEZE_MODEL_PATH', 'default')}")
+    print(f"{'first run s':>12} {'rerun p50 s':>12} {'rerun max s':>12}")
+    print(f"{startup:>12.3f} {statistics.median(timings):>12.3f} {max(timings):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
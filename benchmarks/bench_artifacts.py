@@ -0,0 +1,67 @@
+"""
+Analysis time and disk footprint of each artifact mode of detect_scenes_and_objects.
+
+Analyzes the same video once per mode into a fresh output folder and reports the wall time,
+the number of images written and their total size. The metadata is the same in every mode.
+
+Usage:
+    python -m benchmarks.bench_artifacts --video 03_scenes_segmented/scene_2.mp4 \
+        --model yolo_models/YOLOv8x.pt --frame-skip 4 --jpeg-quality 85
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from frame_artifacts import ARTIFACT_MODES
+
+
+def image_footprint(folder):
+    count, size = 0, 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.endswith(".jpg"):
+                count += 1
+                size += os.path.getsize(os.path.join(root, name))
+    return count, size
+
+
+def run_mode(model, args, mode):
+    from pyscene_optimized import detect_scenes_and_objects, get_video_fps
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        detect_scenes_and_objects(model, args.video, folder, get_video_fps(args.video), frame_skip=args.frame_skip,
+                                  single_pass=True, pipelined=args.pipelined, device=args.device,
+                                  columnar=False, artifacts=mode, jpeg_quality=args.jpeg_quality,
+                                  thumbnail_size=args.thumbnail_size)
+        seconds = time.perf_counter() - start
+        return seconds, *image_footprint(folder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default="03_scenes_segmented/scene_2.mp4")
+    parser.add_argument("--model", default="yolo_models/YOLOv8x.pt")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--frame-skip", type=int, default=4)
+    parser.add_argument("--jpeg-quality", type=int, default=95)
+    parser.add_argument("--thumbnail-size", type=int, default=320)
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--modes", nargs="+", choices=ARTIFACT_MODES, default=["full", "keyframe", "thumbnails", "none"])
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+
+    # Warm up so model fusing and device initialization are not timed
+    run_mode(model, args, "none")
+
+    print(f"{'mode':>10} {'seconds':>8} {'images':>7} {'MB':>8}")
+    for mode in args.modes:
+        seconds, images, size = run_mode(model, args, mode)
+        print(f"{mode:>10} {seconds:>8.2f} {images:>7} {size / (1024 * 1024):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Speed and accuracy of each model size and detector backend on CPU.
+
+Runs every combination of --sizes and --backends over the same frames, spread evenly over the
+sample clips, through BatchInferenceEngine. Reports frames per second, and how well the
+detections agree with the baseline detector (YOLOv8x in PyTorch by default), taking the
+baseline's detections as ground truth:
+
+- mAP50: mean over the baseline's classes of the average precision at IoU 0.5
+- F1: harmonic mean of precision and recall at IoU 0.5, counting only boxes of the same class
+
+Exports are made on first use next to the weights, see detector_backends.
+
+Usage:
+    python -m benchmarks.bench_backends --sizes n s m x --backends torch onnx openvino int8 \
+        --frames 64 --batch-size 8
+"""
+import argparse
+import glob
+import time
+
+import numpy as np
+
+from detector_backends import DEFAULT_CALIBRATION_VIDEOS, DETECTOR_BACKENDS, MODEL_SIZES, calibration_frames
+
+
+def iou(box, boxes):
+    # IoU of one box with each of `boxes`, all as [x1, y1, x2, y2]
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = (box[2] - box[0]) * (box[3] - box[1]) + (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / np.maximum(areas - intersection, 1e-9)
+
+
+def _boxes(objects, class_name):
+    return np.array([[o["bbox"]["x1"], o["bbox"]["y1"], o["bbox"]["x2"], o["bbox"]["y2"]]
+                     for o in objects if o["class_name"] == class_name]).reshape(-1, 4)
+
+
+def _match(baseline, detections, class_name, iou_threshold):
+    # Greedily match the detections of one class to the baseline boxes of each frame, most
+    # confident first. Returns (confidence, is_true_positive) per detection and the baseline count.
+    matches, total = [], 0
+    for truth, found in zip(baseline, detections):
+        truth_boxes = _boxes(truth, class_name)
+        total += len(truth_boxes)
+        used = np.zeros(len(truth_boxes), dtype=bool)
+        for o in sorted((o for o in found if o["class_name"] == class_name), key=lambda o: -o["confidence"]):
+            box = [o["bbox"]["x1"], o["bbox"]["y1"], o["bbox"]["x2"], o["bbox"]["y2"]]
+            overlaps = np.where(used, 0.0, iou(box, truth_boxes)) if len(truth_boxes) else np.zeros(0)
+            best = int(np.argmax(overlaps)) if len(overlaps) else -1
+            hit = bool(best >= 0 and overlaps[best] >= iou_threshold)
+            if hit:
+                used[best] = True
+            matches.append((o["confidence"], hit))
+    return matches, total
+
+
+def agreement(baseline, detections, iou_threshold=0.5):
+    """
+    Compare detections with the baseline's, frame by frame.
+
+    Args:
+        baseline (list): Detected objects of each frame by the baseline, as from results_to_objects.
+        detections (list): Detected objects of the same frames by the compared detector.
+        iou_threshold (float): Minimum IoU of a detection with a baseline box of its class.
+
+    Returns:
+        tuple: (mAP, F1). mAP is None when the baseline found nothing, F1 is 1.0 when neither did.
+    """
+    classes = {o["class_name"] for objects in baseline for o in objects}
+    found_classes = classes | {o["class_name"] for objects in detections for o in objects}
+    precisions = []
+    true_positives = false_positives = baseline_total = 0
+    for class_name in sorted(found_classes):
+        matches, total = _match(baseline, detections, class_name, iou_threshold)
+        hits = sum(hit for _, hit in matches)
+        true_positives += hits
+        false_positives += len(matches) - hits
+        baseline_total += total
+        if class_name not in classes:
+            continue
+        # All-point interpolated average precision
+        matches.sort(key=lambda match: -match[0])
+        tp = np.cumsum([hit for _, hit in matches])
+        recall = np.concatenate([[0.0], tp / total, [1.0]])
+        precision = np.concatenate([[1.0], tp / np.arange(1, len(matches) + 1), [0.0]])
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        precisions.append(float(np.sum(np.diff(recall[:-1]) * precision[1:-1])) if matches else 0.0)
+    misses = baseline_total - true_positives
+    # Two detectors that both find nothing agree
+    f1 = 2 * true_positives / (2 * true_positives + false_positives + misses) if false_positives + baseline_total else 1.0
+    return (float(np.mean(precisions)) if precisions else None), f1
+
+
+def detect(model, frames, batch_size, device):
+    """Run frames through BatchInferenceEngine, returning (seconds, detected objects per frame)."""
+    from batch_inference import BatchInferenceEngine
+
+    engine = BatchInferenceEngine(model, batch_size=batch_size, device=device, verbose=False)
+    # Warm up so session creation, fusing and first-call allocations are not timed
+    engine.submit((0, 0), frames[0])
+    engine.flush()
+
+    detections = []
+    start = time.perf_counter()
+    for index, frame in enumerate(frames):
+        detections.extend(objects for _, _, objects, _ in engine.submit((0, index), frame))
+    detections.extend(objects for _, _, objects, _ in engine.flush())
+    return time.perf_counter() - start, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", nargs="+", default=None,
+                        help=f"Clips to take frames from, defaults to {DEFAULT_CALIBRATION_VIDEOS}")
+    parser.add_argument("--weights-dir", default=None, help="Folder of YOLOv8<size>.pt, see detector_backends")
+    parser.add_argument("--sizes", nargs="+", choices=MODEL_SIZES, default=["n", "s", "m", "x"])
+    parser.add_argument("--backends", nargs="+", choices=DETECTOR_BACKENDS, default=list(DETECTOR_BACKENDS))
+    parser.add_argument("--baseline", default="x:torch", help="<size>:<backend> whose detections are the truth")
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    from detector_backends import load_detector
+
+    videos = args.videos or sorted(glob.glob(DEFAULT_CALIBRATION_VIDEOS))
+    frames = calibration_frames(videos, args.frames)
+    baseline_size, baseline_backend = args.baseline.split(":")
+
+    def run(size, backend):
+        model = load_detector(size, backend, args.weights_dir, calibration_videos=videos)
+        return detect(model, frames, args.batch_size, args.device)
+
+    _, baseline = run(baseline_size, baseline_backend)
+    print(f"{len(frames)} frames from {len(videos)} clips, baseline {args.baseline} found "
+          f"{sum(map(len, baseline))} objects")
+    print(f"{'size':>4} {'backend':>9} {'fps':>7} {'objects':>8} {'mAP50':>6} {'F1':>6}")
+    for size in args.sizes:
+        for backend in args.backends:
+            seconds, detections = run(size, backend)
+            mean_ap, f1 = agreement(baseline, detections)
+            mean_ap = "-" if mean_ap is None else f"{mean_ap:.3f}"
+            print(f"{size:>4} {backend:>9} {len(frames) / seconds:>7.2f} {sum(map(len, detections)):>8} "
+                  f"{mean_ap:>6} {f1:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Frames/sec of BatchInferenceEngine for a range of batch sizes.
+
+Usage:
+    python -m benchmarks.bench_batch_inference --video 03_scenes_segmented/scene_2.mp4 \
+        --model yolo_models/YOLOv8x.pt --device auto --batch-sizes 1 2 4 8 16
+"""
+import argparse
+import time
+
+import cv2
+from ultralytics import YOLO
+
+from batch_inference import BatchInferenceEngine
+
+
+def load_frames(video_path, num_frames, stride):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    frame_index = 0
+    while len(frames) < num_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_index % stride == 0:
+            frames.append(frame)
+        frame_index += 1
+    cap.release()
+    return frames
+
+
+def run(model, frames, batch_size, device):
+    engine = BatchInferenceEngine(model, batch_size=batch_size, device=device, verbose=False)
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        engine.submit((0, i), frame)
+    engine.flush()
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed, engine.device
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default="03_scenes_segmented/scene_2.mp4")
+    parser.add_argument("--model", default="yolo_models/YOLOv8x.pt")
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--frames", type=int, default=64, help="Number of frames to run per batch size")
+    parser.add_argument("--stride", type=int, default=1, help="Take every n-th frame of the video")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, args.stride)
+    if not frames:
+        raise SystemExit(f"No frames could be read from {args.video}")
+    model = YOLO(args.model)
+
+    # Warm up so model fusing and device initialization are not timed
+    run(model, frames[:1], 1, args.device)
+
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'batch':>6} {'device':>8} {'frames/s':>10}")
+    for batch_size in args.batch_sizes:
+        fps, device = run(model, frames, batch_size, args.device)
+        print(f"{batch_size:>6} {device:>8} {fps:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Clip extraction time of the MoviePy re-encode vs ffmpeg stream copy and smart cut.
+
+Without --video a synthetic H.264/AAC video is generated with ffmpeg. Scenes are spread
+evenly over the video and start off keyframes, so "exact" has to re-encode a head GOP.
+
+Usage:
+    python -m benchmarks.bench_clip_extraction --scenes 8 --scene-seconds 10 --modes moviepy copy exact
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+
+from clip_extraction import create_subclips, find_ffmpeg, parse_timestamp, probe_video
+
+
+def make_video(path, seconds, fps, gop):
+    subprocess.run(
+        [find_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+         "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate={fps}:duration={seconds}",
+         "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+         "-c:v", "libx264", "-preset", "veryfast", "-g", str(gop), "-pix_fmt", "yuv420p",
+         "-c:a", "aac", "-shortest", path],
+        check=True,
+    )
+
+
+def make_scenes(duration, num_scenes, scene_seconds):
+    step = duration / num_scenes
+    scenes = []
+    for i in range(num_scenes):
+        # Start a third of a second in so no scene begins on a keyframe
+        start = i * step + 0.33
+        end = min(start + scene_seconds, duration)
+        scenes.append({
+            "scene": i + 1,
+            "start_time": str(timedelta(seconds=start)),
+            "end_time": str(timedelta(seconds=end)),
+        })
+    return scenes
+
+
+def clip_duration(path):
+    output = subprocess.run([find_ffmpeg(), "-hide_banner", "-i", path], capture_output=True, text=True).stderr
+    for line in output.splitlines():
+        if "Duration:" in line:
+            return parse_timestamp(line.split("Duration:")[1].split(",")[0].strip())
+    return 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Source video, a synthetic one is generated if omitted")
+    parser.add_argument("--seconds", type=int, default=120, help="Length of the synthetic video")
+    parser.add_argument("--scenes", type=int, default=8)
+    parser.add_argument("--scene-seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--modes", nargs="+", default=["moviepy", "copy", "exact"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        video = args.video
+        if video is None:
+            video = os.path.join(work_dir, "source.mp4")
+            make_video(video, args.seconds, fps=25, gop=50)
+        duration = clip_duration(video)
+        scenes = make_scenes(duration, args.scenes, args.scene_seconds)
+        _, keyframes = probe_video(video)  # Probe once up front, like a second search on the same video
+        print(f"{video}: {duration:.1f}s, {len(keyframes)} keyframes, {len(scenes)} scenes of {args.scene_seconds}s")
+
+        print(f"{'mode':>8} {'seconds':>8} {'clips/s':>8} {'avg clip s':>11}")
+        for mode in args.modes:
+            output_folder = os.path.join(work_dir, mode)
+            start = time.perf_counter()
+            clips = create_subclips(video, scenes, output_folder=output_folder, mode=mode, workers=args.workers)
+            elapsed = time.perf_counter() - start
+            average = sum(clip_duration(clip) for clip in clips) / len(clips)
+            print(f"{mode:>8} {elapsed:>8.2f} {len(clips) / elapsed:>8.2f} {average:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Rows/sec of bulk metadata ingestion into PostgreSQL, against the previous row-at-a-time insert.
+
+Usage:
+    python -m benchmarks.bench_db_ingest --videos 20 --scenes 500 --objects 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import metadata_db
+from db_pool import get_db_connection
+from benchmarks.synthetic import write_scene_metadata
+
+# Frame size the synthetic bboxes are generated for
+FRAME_SIZE = (1920, 1080)
+
+
+def insert_row_by_row(video_id, json_file_path):
+    # The ingestion loop used before bulk COPY, kept for comparison
+    with open(json_file_path, 'r') as file:
+        data = json.load(file)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            metadata_db.ensure_schema(cursor)
+            cursor.execute("DELETE FROM video_metadata WHERE video_id = %s", (video_id,))
+            for scene in data:
+                cursor.execute(
+                    """
+                    INSERT INTO video_metadata (video_id, scene, start_time, end_time, objects, class_counts)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    (video_id, scene['scene'], scene['start_time'], scene['end_time'],
+                     json.dumps(scene['objects']), json.dumps(scene['class_counts']))
+                )
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=20)
+    parser.add_argument("--scenes", type=int, default=500, help="Scenes per video")
+    parser.add_argument("--objects", type=int, default=50, help="Objects per scene")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        metadata_file = write_scene_metadata(os.path.join(folder, "metadata.json"), args.scenes, args.objects)
+        size_mb = os.path.getsize(metadata_file) / 1e6
+        print(f"{args.videos} videos x {args.scenes} scenes x {args.objects} objects ({size_mb:.1f} MB per video)")
+
+        video_ids = [f"bench-{i:05d}" for i in range(args.videos)]
+        for label, ingest in [
+            ("row-by-row", lambda: sum(insert_row_by_row(video_id, metadata_file) for video_id in video_ids)),
+            ("bulk COPY", lambda: metadata_db.bulk_insert_metadata_into_db(
+                (video_id, metadata_file, FRAME_SIZE) for video_id in video_ids)),
+            # Re-ingesting the same videos replaces their rows
+            ("bulk re-ingest", lambda: metadata_db.bulk_insert_metadata_into_db(
+                (video_id, metadata_file, FRAME_SIZE) for video_id in video_ids)),
+        ]:
+            start = time.perf_counter()
+            rows = ingest()
+            elapsed = time.perf_counter() - start
+            print(f"{label:>15}: {rows} rows in {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s, "
+                  f"{rows * args.objects / elapsed:,.0f} objects/s")
+
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM video_metadata WHERE video_id LIKE 'bench-%%'")
+            cursor.execute("DELETE FROM detections WHERE video_id LIKE 'bench-%%'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Hit rate, inference time saved and accuracy of the perceptual-hash detection cache.
+
+Samples every --frame-skip-th frame of each scene of each video and runs the frames through
+BatchInferenceEngine twice: without a cache, and with one DetectionCache shared by all videos
+in order, as an analysis worker shares it across jobs. Reports per video the cache hit rate,
+the inference time without and with the cache, and the share of frames whose cached
+detections agree with the uncached ones (same classes, box corners within 1% of the frame).
+
+By default the videos are synthetic and written to a temporary folder: a video of static
+shots, one of moving objects, and the static one again, standing in for an intro or slate
+repeated across videos.
+
+Also checks that a cache file keeps its most recently used entries: a frame looked up before
+each of many stores must still be a hit after the cache is reopened. Exits with an error if it
+is not.
+
+Usage:
+    python -m benchmarks.bench_detection_cache
+    python -m benchmarks.bench_detection_cache --model yolo_models/YOLOv8n.pt --videos a.mp4 b.mp4
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from analysis_metrics import AnalysisMetrics
+from detection_cache import DetectionCache
+
+
+def sampled_frames(video_path, frame_skip):
+    from frame_sampling import SeekingSampler
+
+    return [frame for _, _, frame in SeekingSampler(video_path, frame_skip=frame_skip)]
+
+
+def detect(model, frames, batch_size, cache):
+    """Run frames through BatchInferenceEngine, returning (detected objects per frame, metrics snapshot)."""
+    from batch_inference import BatchInferenceEngine
+
+    metrics = AnalysisMetrics()
+    engine = BatchInferenceEngine(model, batch_size=batch_size, device="cpu", verbose=False, metrics=metrics,
+                                  cache=cache)
+    detections = []
+    for index, frame in enumerate(frames):
+        detections.extend(objects for _, _, objects, _ in engine.submit((0, index), frame))
+    detections.extend(objects for _, _, objects, _ in engine.flush())
+    return detections, metrics.snapshot()
+
+
+def same_objects(objects, others, tolerance=0.01):
+    """True if both frames have the same classes with box corners within `tolerance` of the frame size."""
+    if len(objects) != len(others):
+        return False
+    key = lambda o: (o["class_name"], o["bbox"]["x1"], o["bbox"]["y1"])
+    for a, b in zip(sorted(objects, key=key), sorted(others, key=key)):
+        if a["class_name"] != b["class_name"]:
+            return False
+        if any(abs(a["bbox"][corner] - b["bbox"][corner]) > tolerance for corner in ("x1", "y1", "x2", "y2")):
+            return False
+    return True
+
+
+def persistent_lru_holds(path, max_entries=4, stores=300):
+    """
+    True if a frame hit before each of `stores` other stores survives the file's eviction.
+
+    Args:
+        path (str): SQLite file for the cache, which must not exist yet.
+        max_entries (int): Entries kept.
+        stores (int): Other frames stored, enough for the file to be evicted from.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (64, 64, 3), dtype=np.uint8) for _ in range(stores + 1)]
+    boxes = np.zeros((0, 6), dtype=np.float32)
+    cache = DetectionCache(max_entries, path=path)
+    entry, _, _ = cache.lookup("model", frames[0])
+    cache.store(entry, boxes, 0.1)
+    for frame in frames[1:]:
+        cache.lookup("model", frames[0])
+        entry, _, _ = cache.lookup("model", frame)
+        cache.store(entry, boxes, 0.1)
+    cache.close()
+
+    reopened = DetectionCache(max_entries, path=path)
+    _, cached, _ = reopened.lookup("model", frames[0])
+    reopened.close()
+    return cached is not None
+
+
+def inference_seconds(snapshot):
+    histogram = snapshot["histograms"].get("inference")
+    return histogram["sum"] if histogram else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", nargs="+", default=None, help="Defaults to synthetic videos")
+    parser.add_argument("--model", default="stand-in", help="YOLO weights, or stand-in for benchmarks.stand_in_model")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Length of each synthetic video")
+    parser.add_argument("--frame-skip", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--max-pixel-difference", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.model == "stand-in":
+        from benchmarks.stand_in_model import StandInModel
+        model = StandInModel()
+    else:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+
+    with tempfile.TemporaryDirectory() as folder:
+        videos = args.videos
+        if videos is None:
+            from benchmarks.synthetic import write_synthetic_video
+            static = write_synthetic_video(os.path.join(folder, "static.mp4"), args.seconds, seed=1, motion=0.0)
+            moving = write_synthetic_video(os.path.join(folder, "moving.mp4"), args.seconds, seed=2)
+            videos = [static, moving, static]
+
+        cache = DetectionCache(args.max_entries, max_pixel_difference=args.max_pixel_difference)
+        print(f"{'video':>12} {'frames':>7} {'hits':>6} {'uncached s':>11} {'cached s':>9} {'agree':>6}")
+        total_uncached = total_cached = 0.0
+        for video in videos:
+            frames = sampled_frames(video, args.frame_skip)
+            reference, uncached = detect(model, frames, args.batch_size, None)
+            detections, cached = detect(model, frames, args.batch_size, cache)
+            counters = cached["counters"]
+            hit_rate = counters.get("detection_cache_hits", 0) / max(len(frames), 1)
+            agree = sum(map(same_objects, detections, reference)) / max(len(frames), 1)
+            total_uncached += inference_seconds(uncached)
+            total_cached += inference_seconds(cached)
+            print(f"{os.path.basename(video)[-12:]:>12} {len(frames):>7} {hit_rate:>6.0%} "
+                  f"{inference_seconds(uncached):>11.3f} {inference_seconds(cached):>9.3f} {agree:>6.0%}")
+        print(f"Overall hit rate {cache.hit_rate:.0%}, inference {total_uncached:.3f} s without the cache, "
+              f"{total_cached:.3f} s with it")
+
+        if not persistent_lru_holds(os.path.join(folder, "lru.sqlite3")):
+            sys.exit("The cache file evicted its most recently used entry.")
+        print("The cache file keeps its most recently used entries")
+
+
+if __name__ == "__main__":
+    main()
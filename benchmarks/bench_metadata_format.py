@@ -0,0 +1,97 @@
+"""
+File size, write time and load time of the indented metadata JSON against the columnar folder.
+
+"open + scan" loads the metadata and reads every confidence, the access pattern of an
+offline filter. With --db, both formats are also ingested into PostgreSQL.
+
+Usage:
+    python -m benchmarks.bench_metadata_format --scenes 2000 --objects 100 --db
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import metadata_db
+from benchmarks.synthetic import make_scene_metadata
+from columnar_metadata import ColumnarMetadata, write_columnar_metadata
+from db_pool import get_db_connection
+
+# Frame size the synthetic bboxes are generated for
+FRAME_SIZE = (1920, 1080)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def folder_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def write_json(scene_metadata, path):
+    with open(path, "w") as json_file:
+        json.dump(scene_metadata, json_file, indent=4)
+
+
+def scan_json(path):
+    with open(path) as json_file:
+        data = json.load(json_file)
+    return sum(obj["confidence"] for scene in data for obj in scene["objects"])
+
+
+def scan_columnar(path):
+    return float(ColumnarMetadata(path).object_confidence.sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, default=2000)
+    parser.add_argument("--objects", type=int, default=100, help="Objects per scene")
+    parser.add_argument("--db", action="store_true", help="Also time ingesting each format into PostgreSQL")
+    args = parser.parse_args()
+
+    scene_metadata = make_scene_metadata(args.scenes, args.objects)
+    with tempfile.TemporaryDirectory() as folder:
+        json_path = os.path.join(folder, "metadata.json")
+        columns_path = os.path.join(folder, "metadata.columns")
+        formats = [
+            ("json", json_path, lambda: write_json(scene_metadata, json_path), lambda: scan_json(json_path)),
+            ("columnar", columns_path, lambda: write_columnar_metadata(scene_metadata, columns_path),
+             lambda: scan_columnar(columns_path)),
+        ]
+
+        print(f"{args.scenes} scenes x {args.objects} objects")
+        print(f"{'format':>9} {'size MB':>8} {'write s':>8} {'open + scan s':>14} {'ingest s':>9}")
+        for name, path, write, scan in formats:
+            _, write_time = timed(write)
+            _, scan_time = timed(scan)
+            ingest = "-"
+            if args.db:
+                _, ingest_time = timed(lambda: metadata_db.insert_metadata_into_db(
+                    path, video_id=f"bench-format-{name}", frame_size=FRAME_SIZE))
+                ingest = f"{ingest_time:.2f}"
+            print(f"{name:>9} {folder_size(path) / 1e6:>8.1f} {write_time:>8.2f} {scan_time:>14.3f} {ingest:>9}")
+
+    if args.db:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # Both formats must produce the same detection rows, up to the float32 rounding of
+            # the columnar boxes (the synthetic boxes are float64, unlike the model's)
+            cursor.execute("""
+                SELECT count(*) FROM detections a JOIN detections b
+                ON a.scene = b.scene AND a.frame = b.frame AND a.class_name = b.class_name
+                AND a.confidence = b.confidence AND abs(a.x1 - b.x1) < 1e-6 AND abs(a.y2 - b.y2) < 1e-6
+                WHERE a.video_id = 'bench-format-json' AND b.video_id = 'bench-format-columnar'
+            """)
+            print(f"Detections matching between formats: {cursor.fetchone()[0]} of {args.scenes * args.objects}")
+            cursor.execute("DELETE FROM video_metadata WHERE video_id LIKE 'bench-format-%%'")
+            cursor.execute("DELETE FROM detections WHERE video_id LIKE 'bench-format-%%'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+End-to-end benchmark of the analysis and search pipeline, stage by stage.
+
+Runs every stage on each video, one after the other:
+scene detection, decode/seek, inference, annotation/imwrite, tracking, JSON dump, DB ingest,
+search query and subclip extraction. Every video is run --rounds times and the median time of
+each stage is kept. Per-stage seconds and throughput are written to a JSON file named after
+the commit, for comparison between commits with --compare.
+
+The videos are the bundled 03_scenes_segmented/scene_*.mp4 clips plus a synthetic video of
+--synthetic-seconds. With `--model stand-in` a cheap grid detector replaces YOLO (see
+benchmarks.stand_in_model), so the suite runs on CPU without weights. Stages that need
+PostgreSQL or ffmpeg are recorded as skipped when those are not available.
+
+Usage:
+    python -m benchmarks.bench_pipeline --model stand-in --synthetic-seconds 120
+    python -m benchmarks.bench_pipeline --model stand-in --compare benchmark_results/<earlier run>.json
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+STAGES = ["scene_detection", "decode_seek", "inference", "annotation_imwrite", "tracking", "json_dump",
+          "db_ingest", "search_query", "search_query_offline", "subclip_extraction"]
+
+
+def _stage(seconds, items, unit):
+    return {"seconds": seconds, "items": items, "unit": unit, "per_second": items / seconds if seconds else None}
+
+
+def _skipped(reason):
+    return {"skipped": reason}
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def analyze(model, video_path, output_folder, args):
+    """Scene detection through tracking. Returns the stages and the scene metadata."""
+    from batch_inference import BatchInferenceEngine
+    from frame_artifacts import FrameArtifactWriter
+    from frame_sampling import SeekingSampler, detect_scene_list
+    from pyscene_optimized import _build_scene_metadata
+
+    stages = {}
+    start = time.perf_counter()
+    scene_list = detect_scene_list(video_path, threshold=args.threshold)
+    frames = scene_list[-1][1].get_frames() if scene_list else 0
+    stages["scene_detection"] = _stage(time.perf_counter() - start, frames, "frames")
+
+    annotated_folder = os.path.join(output_folder, "annotated")
+    detected_folder = os.path.join(output_folder, "detected")
+    os.makedirs(annotated_folder)
+    os.makedirs(detected_folder)
+    sampler = iter(SeekingSampler(video_path, frame_skip=args.frame_skip, scene_list=scene_list))
+    engine = BatchInferenceEngine(model, batch_size=args.batch_size, device=args.device, verbose=False)
+    # Written on the timed thread, so the stage measures the encoding work itself
+    writer = FrameArtifactWriter(args.artifacts, annotated_folder, detected_folder, jpeg_quality=args.jpeg_quality)
+    decode_time = inference_time = write_time = 0.0
+    frame_detections = []
+
+    def write(completed):
+        for key, frame, detected_objects, result in completed:
+            if detected_objects:
+                writer(key, frame, detected_objects, result)
+                frame_detections.append((key[1], detected_objects))
+
+    while True:
+        start = time.perf_counter()
+        sample = next(sampler, None)
+        decode_time += time.perf_counter() - start
+        start = time.perf_counter()
+        completed = engine.flush() if sample is None else engine.submit(sample[:2], sample[2])
+        inference_time += time.perf_counter() - start
+        start = time.perf_counter()
+        write(completed)
+        write_time += time.perf_counter() - start
+        if sample is None:
+            break
+    start = time.perf_counter()
+    writer.close()
+    write_time += time.perf_counter() - start
+
+    stages["decode_seek"] = _stage(decode_time, engine.frames, "frames")
+    stages["inference"] = _stage(inference_time, engine.frames, "frames")
+    stages["annotation_imwrite"] = _stage(write_time, writer.images_written, "images")
+
+    start = time.perf_counter()
+    scene_metadata = _build_scene_metadata(scene_list, frame_detections)
+    stages["tracking"] = _stage(time.perf_counter() - start, len(frame_detections), "frames")
+    return stages, scene_metadata
+
+
+def store_and_search(video_id, video_path, scene_metadata, output_folder, args):
+    """JSON dump through subclip extraction. Returns the stages."""
+    from clip_extraction import create_subclips, find_ffmpeg
+    from columnar_metadata import columnar_path
+    from detection_search import DetectionSearchEngine
+    from metadata_db import get_video_frame_size
+    from pyscene_optimized import _write_metadata
+
+    stages = {}
+    detections = sum(len(scene["objects"]) for scene in scene_metadata)
+    frame_size = get_video_frame_size(video_path)
+    metadata_json_path = os.path.join(output_folder, "video_metadata.json")
+    start = time.perf_counter()
+    _write_metadata(scene_metadata, metadata_json_path, True, frame_size)
+    stages["json_dump"] = _stage(time.perf_counter() - start, detections, "detections")
+
+    counts = Counter(obj["class_name"] for scene in scene_metadata for obj in scene["objects"])
+    # The most common class at any confidence, so the queries return scenes
+    query = {"object_class": counts.most_common(1)[0][0] if counts else None, "confidence_threshold": 0}
+
+    if args.no_db:
+        stages["db_ingest"] = stages["search_query"] = _skipped("--no-db")
+    else:
+        stages.update(_database_stages(video_id, metadata_json_path, frame_size, detections, query, args))
+
+    engine = DetectionSearchEngine()
+    engine.add_video(video_id, columnar_path(metadata_json_path))
+    engine.fetch_scenes(**query)  # Builds the arrays
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        engine.fetch_scenes(**query)
+        timings.append(time.perf_counter() - start)
+    stages["search_query_offline"] = _stage(statistics.median(timings), 1, "queries")
+
+    scenes = scene_metadata[:args.clips]
+    try:
+        find_ffmpeg()
+    except (ImportError, RuntimeError) as e:
+        stages["subclip_extraction"] = _skipped(str(e))
+    else:
+        start = time.perf_counter()
+        create_subclips(video_path, scenes, os.path.join(output_folder, "clips"), mode=args.clip_mode)
+        stages["subclip_extraction"] = _stage(time.perf_counter() - start, len(scenes), "clips")
+    return stages
+
+
+def _database_stages(video_id, metadata_json_path, frame_size, detections, query, args):
+    import psycopg2
+
+    from db_pool import get_db_connection
+    from metadata_db import fetch_scenes_from_db, insert_metadata_into_db
+
+    try:
+        start = time.perf_counter()
+        insert_metadata_into_db(metadata_json_path, video_id=video_id, frame_size=frame_size)
+        ingest = _stage(time.perf_counter() - start, detections, "detections")
+    except psycopg2.OperationalError as e:
+        reason = f"database unavailable: {str(e).splitlines()[0]}"
+        return {"db_ingest": _skipped(reason), "search_query": _skipped(reason)}
+
+    try:
+        timings = []
+        # fetch_scenes_from_db prints its results
+        with contextlib.redirect_stdout(io.StringIO()):
+            fetch_scenes_from_db(video_id=video_id, **query)  # Prepares the statement
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                fetch_scenes_from_db(video_id=video_id, **query)
+                timings.append(time.perf_counter() - start)
+    finally:
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            for table in ("video_metadata", "detections", "videos"):
+                cursor.execute(f"DELETE FROM {table} WHERE video_id = %s", (video_id,))
+    return {"db_ingest": ingest, "search_query": _stage(statistics.median(timings), 1, "queries")}
+
+
+def _median_stage(timings):
+    if "skipped" in timings[0]:
+        return timings[0]
+    return sorted(timings, key=lambda timing: timing["seconds"])[len(timings) // 2]
+
+
+def run_video(model, video_path, args):
+    from metadata_db import get_video_frame_size
+
+    print(f"Benchmarking {video_path}...")
+    video_id = f"bench-pipeline-{os.path.splitext(os.path.basename(video_path))[0]}"
+    rounds = []
+    for _ in range(args.rounds):
+        with tempfile.TemporaryDirectory() as output_folder:
+            stages, scene_metadata = analyze(model, video_path, output_folder, args)
+            stages.update(store_and_search(video_id, video_path, scene_metadata, output_folder, args))
+        rounds.append(stages)
+    width, height = get_video_frame_size(video_path)
+    return {
+        "video": os.path.basename(video_path),
+        "resolution": f"{width}x{height}",
+        "scenes": len(scene_metadata),
+        # The round with the median time, per stage
+        "stages": {stage: _median_stage([stages[stage] for stages in rounds]) for stage in STAGES},
+    }
+
+
+def print_results(results):
+    for video in results["videos"]:
+        print(f"\n{video['video']} ({video['resolution']}, {video['scenes']} scenes)")
+        print(f"{'stage':>22} {'seconds':>9} {'items':>7} {'per second':>11}")
+        for stage, timing in video["stages"].items():
+            if "skipped" in timing:
+                print(f"{stage:>22}  skipped: {timing['skipped']}")
+            else:
+                per_second = f"{timing['per_second']:.1f}" if timing["per_second"] is not None else "-"
+                print(f"{stage:>22} {timing['seconds']:>9.3f} {timing['items']:>7} {per_second:>11} "
+                      f"{timing['unit']}/s")
+
+
+def compare(previous, results, tolerance, min_seconds):
+    """
+    Print the throughput change of every stage against an earlier run and return the regressions.
+
+    Stages shorter than `min_seconds` in either run are printed but too noisy to count.
+    """
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('created')}):")
+    previous_videos = {video["video"]: video for video in previous["videos"]}
+    regressions = []
+    for video in results["videos"]:
+        before = previous_videos.get(video["video"])
+        if before is None:
+            continue
+        for stage, timing in video["stages"].items():
+            old_timing = before["stages"].get(stage, {})
+            old, new = old_timing.get("per_second"), timing.get("per_second")
+            if not old or not new:
+                continue
+            change = new / old - 1
+            slower = change < -tolerance and min(old_timing["seconds"], timing["seconds"]) >= min_seconds
+            if slower:
+                regressions.append((video["video"], stage))
+            print(f"{video['video']:>24} {stage:>22} {old:>11.1f} -> {new:>11.1f} {change:>+8.1%}"
+                  f"{'  SLOWER' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", nargs="*", default=sorted(glob.glob("03_scenes_segmented/scene_*.mp4")))
+    parser.add_argument("--synthetic-seconds", type=float, default=60, help="0 to skip the synthetic video")
+    parser.add_argument("--synthetic-size", default="1280x720")
+    parser.add_argument("--model", default="yolo_models/YOLOv8x.pt", help='Weights, or "stand-in"')
+    parser.add_argument("--device", default="auto")
+    parser.add_argument("--frame-skip", type=int, default=24)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=30.0)
+    parser.add_argument("--artifacts", default="full")
+    parser.add_argument("--jpeg-quality", type=int, default=95)
+    parser.add_argument("--clips", type=int, default=5, help="Scenes cut per video")
+    parser.add_argument("--clip-mode", default="copy")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs of every stage, the median is kept")
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per search query, the median is kept")
+    parser.add_argument("--no-db", action="store_true", help="Skip the PostgreSQL stages")
+    parser.add_argument("--output", help="Results file, defaults to benchmark_results/pipeline-<commit>-<time>.json")
+    parser.add_argument("--compare", help="Earlier results file to compare throughput with")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Throughput drop, as a fraction, reported as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Stages shorter than this are not reported as regressions")
+    args = parser.parse_args()
+
+    if args.model == "stand-in":
+        from benchmarks.stand_in_model import StandInModel
+        model = StandInModel()
+    else:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+
+    commit = _git_commit()
+    created = datetime.now(timezone.utc)
+    results = {
+        "commit": commit,
+        "created": created.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": vars(args),
+        "videos": [],
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        videos = list(args.videos)
+        if args.synthetic_seconds:
+            from benchmarks.synthetic import write_synthetic_video
+
+            width, height = map(int, args.synthetic_size.split("x"))
+            path = os.path.join(folder, f"synthetic_{int(args.synthetic_seconds)}s_{args.synthetic_size}.mp4")
+            print(f"Writing a {args.synthetic_seconds:g} s synthetic video...")
+            videos.append(write_synthetic_video(path, args.synthetic_seconds, frame_width=width, frame_height=height))
+        # Warm up so imports, model initialization and the first database connection are not timed
+        with contextlib.redirect_stdout(io.StringIO()), tempfile.TemporaryDirectory() as output_folder:
+            stages, scene_metadata = analyze(model, videos[0], output_folder, args)
+            store_and_search("bench-pipeline-warmup", videos[0], scene_metadata, output_folder, args)
+        for video_path in videos:
+            results["videos"].append(run_video(model, video_path, args))
+
+    output = args.output or os.path.join(
+        "benchmark_results", f"pipeline-{commit or 'unknown'}-{created.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_results(results)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.tolerance, args.min_seconds)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} stages are more than {args.tolerance:.0%} slower.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Scene detection time by number of worker processes and detection width.
+
+Runs detect_scene_list over a video once sequentially at scenedetect's default size, then with
+each --workers count and --widths size. Reports the wall time, the speedup, and whether the
+cuts match the sequential ones: every cut must have a counterpart within --tolerance frames.
+Exits with an error if any run does not match.
+
+The default video is synthetic (60 seconds of 720p with a cut every 8 seconds), written to a
+temporary folder.
+
+Usage:
+    python -m benchmarks.bench_scene_detection --workers 1 2 4 8 --widths 0 128
+    python -m benchmarks.bench_scene_detection --video my_video.mp4 --min-chunk-frames 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from frame_sampling import detect_scene_list
+
+
+def cut_frames(scene_list):
+    return [start.get_frames() for start, _ in scene_list[1:]]
+
+
+def cuts_match(cuts, reference, tolerance):
+    """True if both cut lists have the same length and every cut is within `tolerance` frames of its counterpart."""
+    return len(cuts) == len(reference) and all(abs(a - b) <= tolerance for a, b in zip(cuts, reference))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None, help="Defaults to a synthetic video")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic video")
+    parser.add_argument("--threshold", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--widths", type=int, nargs="+", default=[0, 128],
+                        help="Detection widths in pixels, 0 for scenedetect's default")
+    parser.add_argument("--min-chunk-frames", type=int, default=250)
+    parser.add_argument("--tolerance", type=int, default=1, help="Frames a cut may move")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        video_path = args.video
+        if video_path is None:
+            from benchmarks.synthetic import write_synthetic_video
+            video_path = os.path.join(folder, "synthetic.mp4")
+            write_synthetic_video(video_path, args.seconds)
+
+        start = time.perf_counter()
+        reference = cut_frames(detect_scene_list(video_path, args.threshold))
+        sequential = time.perf_counter() - start
+        print(f"{len(reference)} cuts sequentially in {sequential:.2f} s on {os.cpu_count()} CPUs")
+
+        print(f"{'workers':>7} {'width':>6} {'seconds':>8} {'speedup':>8} {'cuts':>5} {'match':>6}")
+        mismatches = 0
+        for width in args.widths:
+            for workers in args.workers:
+                start = time.perf_counter()
+                cuts = cut_frames(detect_scene_list(video_path, args.threshold, detection_width=width or None,
+                                                    workers=workers, min_chunk_frames=args.min_chunk_frames))
+                seconds = time.perf_counter() - start
+                match = cuts_match(cuts, reference, args.tolerance)
+                mismatches += not match
+                print(f"{workers:>7} {width or 'auto':>6} {seconds:>8.2f} {sequential / seconds:>7.2f}x "
+                      f"{len(cuts):>5} {'yes' if match else 'NO':>6}")
+    if mismatches:
+        sys.exit(f"{mismatches} runs found other cuts than the sequential run.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Scene search latency over the normalized detections table against the JSONB objects query.
+
+Loads synthetic metadata until at least --detections detected objects are stored, then times
+each filter shape with both query paths.
+
+Usage:
+    python -m benchmarks.bench_search --detections 1200000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import metadata_db
+from db_pool import get_db_connection
+from benchmarks.synthetic import write_scene_metadata
+
+FRAME_SIZE = (1920, 1080)
+
+# (label, filters for the detections query, filters for the JSONB query if they differ)
+QUERIES = [
+    ("class", dict(object_class="dog", confidence_threshold=None), None),
+    ("class + confidence", dict(object_class="dog", confidence_threshold=0.95), None),
+    ("class + confidence + location",
+     dict(object_class="dog", confidence_threshold=0.9, location=(0.0, 0.0, 0.5, 0.5)), None),
+    ("class + quadrant", dict(object_class="dog", confidence_threshold=None, location="bottom-right"), None),
+    ("class + rectangle", dict(object_class="dog", confidence_threshold=None, location=(0.1, 0.2, 0.7, 0.9)), None),
+    ("class + min counts", dict(object_class="person", confidence_threshold=0.8, min_class_counts={"person": 9}), None),
+]
+
+
+def time_query(cursor, query, params, repeat, execute=None):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if execute is None:
+            cursor.execute(query, params)
+        else:
+            execute(cursor, query, params)
+        rows = cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, default=1_200_000)
+    parser.add_argument("--scenes", type=int, default=1000, help="Scenes per video")
+    parser.add_argument("--objects", type=int, default=50, help="Objects per scene")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-load", action="store_true", help="Reuse the rows of a previous run")
+    args = parser.parse_args()
+
+    videos = -(-args.detections // (args.scenes * args.objects))
+    video_ids = [f"bench-search-{i:04d}" for i in range(videos)]
+    if not args.skip_load:
+        with tempfile.TemporaryDirectory() as folder:
+            metadata_files = []
+            for i, video_id in enumerate(video_ids):
+                path = write_scene_metadata(os.path.join(folder, f"{video_id}.json"), args.scenes, args.objects, seed=i)
+                metadata_files.append((video_id, path, FRAME_SIZE))
+            start = time.perf_counter()
+            metadata_db.bulk_insert_metadata_into_db(metadata_files)
+            print(f"Loaded {videos * args.scenes * args.objects:,} detections in {time.perf_counter() - start:.1f}s")
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("ANALYZE video_metadata")
+        cursor.execute("ANALYZE detections")
+        cursor.execute("SELECT count(*) FROM detections")
+        print(f"{cursor.fetchone()[0]:,} detections in {videos * args.scenes:,} scenes")
+
+        print(f"{'query':>32} {'scope':>9} {'jsonb ms':>10} {'rows':>6} {'detections ms':>14} {'rows':>6} "
+              f"{'prepared ms':>12} {'speedup':>8}")
+        for label, filters, jsonb_filters in QUERIES:
+            jsonb_filters = jsonb_filters or filters
+            for scope, video_id in [("all", None), ("one video", video_ids[0])]:
+                jsonb_ms, jsonb_rows = time_query(
+                    cursor, *metadata_db._jsonb_query(**_filters(jsonb_filters), video_id=video_id), args.repeat)
+                detections_query = metadata_db._detections_query(**_filters(filters), video_id=video_id)
+                detections_ms, detections_rows = time_query(cursor, *detections_query, args.repeat)
+                prepared_ms, _ = time_query(cursor, *detections_query, args.repeat, execute=metadata_db.execute_prepared)
+                print(f"{label:>32} {scope:>9} {jsonb_ms:>10.1f} {jsonb_rows:>6} {detections_ms:>14.1f} "
+                      f"{detections_rows:>6} {prepared_ms:>12.1f} {jsonb_ms / prepared_ms:>7.1f}x")
+
+
+def _filters(filters):
+    return dict(dict(object_class=None, confidence_threshold=None, location=None, min_class_counts=None), **filters)
+
+
+if __name__ == "__main__":
+    main()
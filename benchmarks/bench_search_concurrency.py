@@ -0,0 +1,117 @@
+"""
+Search latency under concurrent users: a new connection per search vs the shared pool,
+with and without prepared statements.
+
+Runs the detections queries of bench_search from several threads against whatever is
+already loaded (run bench_search first to load synthetic data). Exits with an error if the
+pool opened more connections than its maximum, i.e. if returned connections were closed and
+reopened rather than reused.
+
+Usage:
+    python -m benchmarks.bench_search_concurrency --threads 8 --searches 50
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+
+import db_pool
+import metadata_db
+from benchmarks.bench_search import QUERIES, _filters
+
+
+@contextmanager
+def connect_per_call():
+    settings = db_pool.db_settings()
+    for key in ("minconn", "maxconn", "timeout"):
+        settings.pop(key)
+    conn = psycopg2.connect(**settings)
+    try:
+        with conn, conn.cursor() as cursor:
+            yield cursor
+    finally:
+        conn.close()
+
+
+@contextmanager
+def pooled():
+    with db_pool.get_db_connection() as conn, conn.cursor() as cursor:
+        yield cursor
+
+
+def search(checkout, query, params, prepared):
+    with checkout() as cursor:
+        if prepared:
+            metadata_db.execute_prepared(cursor, query, params)
+        else:
+            cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def run(checkout, prepared, queries, threads, searches):
+    latencies = []
+    lock = threading.Lock()
+
+    def user(offset):
+        timings = []
+        for i in range(searches):
+            query, params = queries[(offset + i) % len(queries)]
+            start = time.perf_counter()
+            search(checkout, query, params, prepared)
+            timings.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(timings)
+
+    workers = [threading.Thread(target=user, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return statistics.median(latencies) * 1000, p95 * 1000, len(latencies) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent users")
+    parser.add_argument("--searches", type=int, default=50, help="Searches per user")
+    args = parser.parse_args()
+
+    # Only the single-video queries, the shape the app runs after an upload
+    with db_pool.get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT DISTINCT video_id FROM video_metadata LIMIT 1")
+        row = cursor.fetchone()
+    if row is None:
+        raise SystemExit("No videos in the database, run benchmarks.bench_search first")
+    queries = [metadata_db._detections_query(**_filters(filters), video_id=row[0]) for _, filters, _ in QUERIES]
+
+    print(f"{args.threads} users x {args.searches} searches, pool of {db_pool.db_settings()['maxconn']}")
+    print(f"{'mode':>24} {'p50 ms':>8} {'p95 ms':>8} {'searches/s':>11}")
+    for label, checkout, prepared in [
+        ("connect per search", connect_per_call, False),
+        ("pool", pooled, False),
+        ("pool + prepared", pooled, True),
+    ]:
+        p50, p95, throughput = run(checkout, prepared, queries, args.threads, args.searches)
+        print(f"{label:>24} {p50:>8.2f} {p95:>8.2f} {throughput:>11.1f}")
+
+    print("Pool metrics:")
+    metrics = db_pool.pool_metrics()
+    for key, value in metrics.items():
+        print(f"  {key}: {value:.4f}" if isinstance(value, float) else f"  {key}: {value}")
+    # Only a connection that broke is replaced
+    if metrics["connects"] > metrics["max_connections"] + metrics["discarded"]:
+        sys.exit(f"The pool opened {metrics['connects']} connections for {metrics['checkouts']} checkouts, "
+                 f"more than its {metrics['max_connections']}.")
+
+
+if __name__ == "__main__":
+    main()
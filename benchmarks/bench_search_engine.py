@@ -0,0 +1,95 @@
+"""
+Query latency of the in-process NumPy search engine, and its agreement with the SQL path.
+
+Writes synthetic columnar metadata until at least --detections detected objects exist and
+loads it into a DetectionSearchEngine. Then each filter shape of bench_search is timed over
+all videos and over one video. With --db, the same metadata is ingested into PostgreSQL and
+every query is checked against the detections query, video by video.
+
+Usage:
+    python -m benchmarks.bench_search_engine --detections 2000000 --repeat 20 --db
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import metadata_db
+from benchmarks.bench_search import QUERIES, _filters
+from benchmarks.synthetic import make_scene_metadata
+from columnar_metadata import write_columnar_metadata
+from db_pool import get_db_connection
+from detection_search import DetectionSearchEngine
+
+EXTRA_QUERIES = [
+    ("confidence only", dict(confidence_threshold=0.99)),
+    ("min counts only", dict(confidence_threshold=None, min_class_counts={"car": 9, "dog": 6})),
+]
+
+
+def time_search(engine, filters, video_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        scenes = engine.fetch_scenes(**_filters(filters), video_id=video_id)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, len(scenes)
+
+
+def sql_scenes(cursor, filters, video_id):
+    cursor.execute(*metadata_db._detections_query(**_filters(filters), video_id=video_id))
+    return [
+        {"scene": row[0], "start_time": row[1].strftime("%H:%M:%S"), "end_time": row[2].strftime("%H:%M:%S"),
+         "video_id": row[3]}
+        for row in cursor.fetchall()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, default=2_000_000)
+    parser.add_argument("--scenes", type=int, default=1000, help="Scenes per video")
+    parser.add_argument("--objects", type=int, default=50, help="Objects per scene")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--db", action="store_true", help="Check every query against PostgreSQL")
+    args = parser.parse_args()
+
+    videos = -(-args.detections // (args.scenes * args.objects))
+    video_ids = [f"bench-engine-{i:04d}" for i in range(videos)]
+    queries = [(label, filters) for label, filters, _ in QUERIES] + EXTRA_QUERIES
+
+    with tempfile.TemporaryDirectory() as folder:
+        engine = DetectionSearchEngine()
+        for i, video_id in enumerate(video_ids):
+            path = os.path.join(folder, f"{video_id}.columns")
+            write_columnar_metadata(make_scene_metadata(args.scenes, args.objects, seed=i), path)
+            engine.add_video(video_id, path)
+        start = time.perf_counter()
+        print(f"{len(engine):,} detections in {videos * args.scenes:,} scenes, "
+              f"indexed in {time.perf_counter() - start:.2f}s")
+
+        print(f"{'query':>32} {'scope':>9} {'engine ms':>10} {'rows':>6}")
+        for label, filters in queries:
+            for scope, video_id in [("all", None), ("one video", video_ids[0])]:
+                engine_ms, rows = time_search(engine, filters, video_id, args.repeat)
+                print(f"{label:>32} {scope:>9} {engine_ms:>10.2f} {rows:>6}")
+
+        if args.db:
+            metadata_db.bulk_insert_metadata_into_db(
+                (video_id, os.path.join(folder, f"{video_id}.columns"), None) for video_id in video_ids)
+            mismatches = 0
+            with get_db_connection() as conn, conn.cursor() as cursor:
+                for label, filters in queries:
+                    for video_id in video_ids:
+                        if engine.fetch_scenes(**_filters(filters), video_id=video_id) != sql_scenes(
+                                cursor, filters, video_id):
+                            mismatches += 1
+                            print(f"Mismatch: {label} on {video_id}")
+                cursor.execute("DELETE FROM video_metadata WHERE video_id LIKE 'bench-engine-%%'")
+                cursor.execute("DELETE FROM detections WHERE video_id LIKE 'bench-engine-%%'")
+            print(f"{len(queries) * videos - mismatches} of {len(queries) * videos} queries match PostgreSQL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Wall-clock time of sharded analysis from 1 to N worker processes.
+
+Usage:
+    python -m benchmarks.bench_sharded_analysis --video resources/new_york.mp4 \
+        --model yolo_models/YOLOv8x.pt --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pyscene_optimized import get_video_fps
+from sharded_analysis import detect_scenes_and_objects_sharded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--model", default="yolo_models/YOLOv8x.pt")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--frame-skip", type=int, default=24)
+    parser.add_argument("--threshold", type=float, default=30.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    fps = get_video_fps(args.video)
+    timings = []
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as output_folder:
+            start = time.perf_counter()
+            detect_scenes_and_objects_sharded(args.model, args.video, output_folder, fps, frame_skip=args.frame_skip,
+                                              threshold=args.threshold, workers=workers, batch_size=args.batch_size, device=args.device)
+            timings.append((workers, time.perf_counter() - start))
+
+    # Speedup and parallel efficiency relative to the first worker count
+    base_workers, base_elapsed = timings[0]
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8} {'efficiency':>11}")
+    for workers, elapsed in timings:
+        speedup = base_elapsed / elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {speedup:>8.2f} {speedup * base_workers / workers:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
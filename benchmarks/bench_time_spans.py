@@ -0,0 +1,84 @@
+"""
+Time-span search against scene search: query latency and seconds of footage selected.
+
+Loads synthetic columnar metadata until at least --detections detected objects are stored,
+then runs each filter shape of bench_search as a scene query and as a time-span query. The
+footage columns add up the durations the results cover, i.e. what create_subclips would cut.
+
+Usage:
+    python -m benchmarks.bench_time_spans --detections 1000000 --repeat 10
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import metadata_db
+from benchmarks.bench_search import QUERIES, _filters
+from benchmarks.synthetic import make_scene_metadata
+from columnar_metadata import write_columnar_metadata
+from db_pool import get_db_connection
+
+
+def time_query(cursor, query, params, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        metadata_db.execute_prepared(cursor, query, params)
+        rows = cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, rows
+
+
+def _seconds(value):
+    # TIME column of a scene row, or seconds of a span
+    if isinstance(value, float):
+        return value
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+
+
+def footage(rows):
+    return sum(_seconds(end) - _seconds(start) for _, start, end in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--detections", type=int, default=1_000_000)
+    parser.add_argument("--scenes", type=int, default=1000, help="Scenes per video")
+    parser.add_argument("--objects", type=int, default=50, help="Objects per scene")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-gap", type=float, default=1.0)
+    parser.add_argument("--padding", type=float, default=0.5)
+    args = parser.parse_args()
+
+    videos = -(-args.detections // (args.scenes * args.objects))
+    video_ids = [f"bench-spans-{i:04d}" for i in range(videos)]
+    with tempfile.TemporaryDirectory() as folder:
+        metadata_db.bulk_insert_metadata_into_db(
+            (video_id, write_columnar_metadata(make_scene_metadata(args.scenes, args.objects, seed=i),
+                                               os.path.join(folder, f"{video_id}.columns")), None)
+            for i, video_id in enumerate(video_ids))
+
+    with get_db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("ANALYZE video_metadata")
+        cursor.execute("ANALYZE detections")
+        print(f"{'query':>32} {'scope':>9} {'scenes ms':>10} {'footage s':>10} {'spans ms':>9} {'footage s':>10}")
+        for label, filters, _ in QUERIES:
+            for scope, video_id in [("all", None), ("one video", video_ids[0])]:
+                scenes_ms, scenes = time_query(
+                    cursor, *metadata_db._detections_query(**_filters(filters), video_id=video_id), args.repeat)
+                spans_ms, spans = time_query(
+                    cursor, *metadata_db._time_spans_query(**_filters(filters), video_id=video_id,
+                                                           merge_gap=max(args.max_gap, 2 * args.padding),
+                                                           padding=args.padding), args.repeat)
+                print(f"{label:>32} {scope:>9} {scenes_ms:>10.1f} {footage(scenes):>10.0f} {spans_ms:>9.1f} "
+                      f"{footage(spans):>10.0f}")
+
+        cursor.execute("DELETE FROM video_metadata WHERE video_id LIKE 'bench-spans-%%'")
+        cursor.execute("DELETE FROM detections WHERE video_id LIKE 'bench-spans-%%'")
+        cursor.execute("DELETE FROM videos WHERE video_id LIKE 'bench-spans-%%'")
+
+
+if __name__ == "__main__":
+    main()
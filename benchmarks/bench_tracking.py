@@ -0,0 +1,58 @@
+"""
+Metadata size and count accuracy with and without object tracking.
+
+Builds scene metadata from synthetic detections of moving objects whose true number per
+scene is known, once keeping every detection and once merged into tracks, and compares
+the JSON size and how far `class_counts` is from the true object counts.
+
+Usage:
+    python -m benchmarks.bench_tracking --scenes 200 --objects 6 --frame-skip 24
+"""
+import argparse
+import json
+import time
+
+from scenedetect import FrameTimecode
+
+from benchmarks.synthetic import make_moving_detections
+from pyscene_optimized import _build_scene_metadata
+
+
+def count_errors(scene_metadata, true_counts):
+    errors = []
+    for scene, truth in zip(scene_metadata, true_counts):
+        for class_name in set(truth) | set(scene["class_counts"]):
+            errors.append(abs(scene["class_counts"].get(class_name, 0) - truth.get(class_name, 0)))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, default=200)
+    parser.add_argument("--objects", type=int, default=6, help="Distinct objects per scene")
+    parser.add_argument("--frame-skip", type=int, default=24)
+    parser.add_argument("--fps", type=float, default=24.0)
+    parser.add_argument("--miss-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    scene_bounds, frame_detections, true_counts = make_moving_detections(
+        args.scenes, args.objects, frame_skip=args.frame_skip, fps=args.fps, miss_rate=args.miss_rate)
+    scene_list = [(FrameTimecode(start, args.fps), FrameTimecode(end, args.fps)) for start, end in scene_bounds]
+    detections = sum(len(objects) for _, objects in frame_detections)
+    print(f"{args.scenes} scenes, {args.scenes * args.objects} objects, {detections} detections, "
+          f"frame_skip {args.frame_skip}")
+
+    print(f"{'mode':>11} {'JSON KB':>9} {'objects':>8} {'count MAE':>10} {'exact counts':>13} {'build s':>8}")
+    for mode, track_objects in [("detections", False), ("tracks", True)]:
+        start = time.perf_counter()
+        scene_metadata = _build_scene_metadata(scene_list, frame_detections, track_objects)
+        elapsed = time.perf_counter() - start
+        size = len(json.dumps(scene_metadata, indent=4)) / 1024
+        objects = sum(len(scene["objects"]) for scene in scene_metadata)
+        errors = count_errors(scene_metadata, true_counts)
+        exact = sum(error == 0 for error in errors) / len(errors)
+        print(f"{mode:>11} {size:>9.0f} {objects:>8} {sum(errors) / len(errors):>10.2f} {exact:>13.1%} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Peak memory and time of storing an upload: the previous read-everything handler against
+VideoStorage.store.
+
+Writes a file of --size-mb random megabytes, then stores it from a fresh process with each
+handler, so every peak RSS is measured on its own. The previous handler is
+`temp_video.write(uploaded_file.read())` followed by the separate hashing pass of
+compute_video_id.
+
+Usage:
+    python -m benchmarks.bench_upload --size-mb 1024
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def previous_handler(source, folder):
+    from metadata_db import compute_video_id
+
+    start = time.perf_counter()
+    with open(source, "rb") as uploaded_file:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4", dir=folder) as temp_video:
+            temp_video.write(uploaded_file.read())
+            video_path = temp_video.name
+    video_id = compute_video_id(video_path)
+    return video_id, time.perf_counter() - start, _peak_rss_mb()
+
+
+def storage_handler(source, folder):
+    from video_storage import VideoStorage
+
+    start = time.perf_counter()
+    with open(source, "rb") as uploaded_file:
+        video_id, _ = VideoStorage(os.path.join(folder, "storage")).store(uploaded_file, "upload.mp4")
+    return video_id, time.perf_counter() - start, _peak_rss_mb()
+
+
+def _run(handler, source, folder, results):
+    results.put(handler(source, folder))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "source.bin")
+        with open(source, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        print(f"{'handler':>10} {'seconds':>8} {'peak RSS MB':>12}")
+        video_ids = set()
+        for name, handler in [("previous", previous_handler), ("storage", storage_handler)]:
+            results = context.Queue()
+            process = context.Process(target=_run, args=(handler, source, folder, results))
+            process.start()
+            video_id, seconds, peak = results.get()
+            process.join()
+            video_ids.add(video_id)
+            print(f"{name:>10} {seconds:>8.2f} {peak:>12.0f}")
+        print("Video ids match" if len(video_ids) == 1 else "Video ids differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Cheap stand-in for a YOLO model, so benchmarks run on CPU without weights.
+
+Splits each frame into a grid and reports every bright cell as a detection. The output is
+real ultralytics Results objects, so everything downstream of the model (results_to_objects,
+plot(), tracking, storage) does the same work as with a real model.
+"""
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from benchmarks.synthetic import CLASS_NAMES
+
+
+class StandInModel:
+    """
+    Called like a YOLO model: model(frames, device=..., verbose=...) returns one Results per frame.
+
+    Args:
+        grid (int): Cells per side. Each cell brighter than `min_brightness` is one box.
+        min_brightness (float): Mean gray level, 0-255, above which a cell counts as an object.
+    """
+
+    names = dict(enumerate(CLASS_NAMES))
+    model_name = "stand-in"
+
+    def __init__(self, grid=4, min_brightness=96.0):
+        self.grid = grid
+        self.min_brightness = min_brightness
+
+    def __call__(self, frames, device="cpu", verbose=True, **kwargs):
+        return [self._detect(frame) for frame in frames]
+
+    def _detect(self, frame):
+        height, width = frame.shape[:2]
+        cells = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (self.grid, self.grid),
+                           interpolation=cv2.INTER_AREA)
+        rows, cols = np.nonzero(cells > self.min_brightness)
+        cell_w, cell_h = width / self.grid, height / self.grid
+        boxes = np.stack([
+            cols * cell_w, rows * cell_h, (cols + 1) * cell_w, (rows + 1) * cell_h,
+            cells[rows, cols] / 255.0,
+            (rows * self.grid + cols) % len(self.names),
+        ], axis=1) if len(rows) else np.zeros((0, 6))
+        return Results(frame, path="", names=self.names, boxes=torch.tensor(boxes, dtype=torch.float32))
@@ -0,0 +1,158 @@
+"""Synthetic scene metadata in the format written by detect_scenes_and_objects."""
+import json
+import random
+from datetime import timedelta
+
+CLASS_NAMES = ["person", "car", "truck", "bicycle", "dog", "boat", "tie", "tv", "chair", "bus"]
+
+
+def make_scene_metadata(num_scenes, objects_per_scene, fps=24.0, frame_width=1920, frame_height=1080, seed=0):
+    rng = random.Random(seed)
+    scenes = []
+    start_frame = 0
+    for i in range(num_scenes):
+        length = rng.randint(48, 720)
+        objects = []
+        class_counts = {}
+        frames = sorted(rng.randrange(start_frame, start_frame + length) for _ in range(objects_per_scene))
+        for frame in frames:
+            class_name = rng.choice(CLASS_NAMES)
+            x1 = rng.uniform(0, frame_width * 0.9)
+            y1 = rng.uniform(0, frame_height * 0.9)
+            objects.append({
+                "frame": frame,
+                "time": str(timedelta(seconds=frame / fps)),
+                "class_name": class_name,
+                "confidence": rng.uniform(0.25, 1.0),
+                # Normalized by the frame size, as written by detect_scenes_and_objects
+                "bbox": {
+                    "x1": x1 / frame_width,
+                    "y1": y1 / frame_height,
+                    "x2": rng.uniform(x1, frame_width) / frame_width,
+                    "y2": rng.uniform(y1, frame_height) / frame_height,
+                },
+            })
+            class_counts[class_name] = class_counts.get(class_name, 0) + 1
+        scenes.append({
+            "scene": i + 1,
+            "start_time": str(timedelta(seconds=start_frame / fps)),
+            "end_time": str(timedelta(seconds=(start_frame + length) / fps)),
+            "objects": objects,
+            "class_counts": class_counts,
+        })
+        start_frame += length
+    return scenes
+
+
+def write_scene_metadata(path, num_scenes, objects_per_scene, **kwargs):
+    with open(path, "w") as json_file:
+        json.dump(make_scene_metadata(num_scenes, objects_per_scene, **kwargs), json_file, indent=4)
+    return path
+
+
+def make_moving_detections(num_scenes, objects_per_scene, frame_skip=24, fps=24.0, frame_width=1920,
+                           frame_height=1080, miss_rate=0.1, seed=0):
+    """
+    Sampled-frame detections of objects that move across the frame, with their true counts.
+
+    Every object has a class, a box size, a constant velocity of up to 6 px per frame and a
+    time span within its scene. Each sample of a visible object is missed with probability
+    `miss_rate`, and detected boxes are jittered by a few percent.
+
+    Returns:
+        tuple: ((start_frame, end_frame) per scene, (frame_index, detected_objects) pairs in
+            frame order, {class_name: count} of distinct objects per scene).
+    """
+    rng = random.Random(seed)
+    scene_bounds, frame_detections, true_counts = [], [], []
+    start_frame = 0
+    for _ in range(num_scenes):
+        length = rng.randint(240, 1440)
+        end_frame = start_frame + length
+        objects = []
+        counts = {}
+        for _ in range(objects_per_scene):
+            class_name = rng.choice(CLASS_NAMES[:4])
+            first = rng.randrange(start_frame, end_frame)
+            objects.append({
+                "class_name": class_name,
+                "first": first,
+                "last": rng.randrange(first, end_frame),
+                "w": rng.uniform(80, 400),
+                "h": rng.uniform(80, 400),
+                "x": rng.uniform(0, frame_width - 400),
+                "y": rng.uniform(0, frame_height - 400),
+                "vx": rng.uniform(-6, 6),
+                "vy": rng.uniform(-3, 3),
+            })
+            counts[class_name] = counts.get(class_name, 0) + 1
+
+        for frame in range(start_frame, end_frame, frame_skip):
+            detected = []
+            for obj in objects:
+                if not obj["first"] <= frame <= obj["last"] or rng.random() < miss_rate:
+                    continue
+                t = frame - obj["first"]
+                x1 = min(max(obj["x"] + obj["vx"] * t, 0), frame_width - obj["w"])
+                y1 = min(max(obj["y"] + obj["vy"] * t, 0), frame_height - obj["h"])
+                jitter = lambda: rng.uniform(-0.03, 0.03) * obj["w"]
+                detected.append({
+                    "class_name": obj["class_name"],
+                    "confidence": rng.uniform(0.3, 0.95),
+                    "bbox": {
+                        "x1": x1 + jitter(),
+                        "y1": y1 + jitter(),
+                        "x2": x1 + obj["w"] + jitter(),
+                        "y2": y1 + obj["h"] + jitter(),
+                    },
+                })
+            if detected:
+                frame_detections.append((frame, detected))
+        scene_bounds.append((start_frame, end_frame))
+        true_counts.append(counts)
+        start_frame = end_frame
+    return scene_bounds, frame_detections, true_counts
+
+
+def write_synthetic_video(path, seconds, fps=25.0, frame_width=1280, frame_height=720, scene_seconds=8.0,
+                          objects_per_scene=3, seed=0, motion=1.0):
+    """
+    Write a video of hard cuts between flat-colored scenes with bright rectangles moving across them.
+
+    Scene lengths vary around `scene_seconds`. Every cut changes the background color, so
+    ContentDetector finds it, and the rectangles give a detector something to find. `motion`
+    scales the speed of the rectangles; 0 makes every scene a static shot.
+
+    Returns:
+        str: `path`.
+    """
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (frame_width, frame_height))
+    total_frames = int(seconds * fps)
+    frame_index = 0
+    try:
+        while frame_index < total_frames:
+            length = max(1, int(rng.uniform(0.5, 1.5) * scene_seconds * fps))
+            background = [rng.randrange(0, 80) for _ in range(3)]
+            objects = [
+                (rng.uniform(0, frame_width), rng.uniform(0, frame_height), motion * rng.uniform(-8, 8),
+                 motion * rng.uniform(-4, 4),
+                 int(rng.uniform(0.1, 0.3) * frame_width), int(rng.uniform(0.1, 0.3) * frame_height),
+                 [rng.randrange(160, 256) for _ in range(3)])
+                for _ in range(objects_per_scene)
+            ]
+            for t in range(min(length, total_frames - frame_index)):
+                frame = np.empty((frame_height, frame_width, 3), dtype=np.uint8)
+                frame[:] = background
+                for x, y, vx, vy, w, h, color in objects:
+                    x1 = int(x + vx * t) % frame_width
+                    y1 = int(y + vy * t) % frame_height
+                    cv2.rectangle(frame, (x1, y1), (x1 + w, y1 + h), color, -1)
+                writer.write(frame)
+                frame_index += 1
+    finally:
+        writer.release()
+    return path
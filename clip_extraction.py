@@ -0,0 +1,192 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import uuid
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Seek this far past a keyframe so rounding in its printed timestamp cannot land on the one before
+_KEYFRAME_EPSILON = 0.005
+
+
+def find_ffmpeg():
+    """
+    Locate the ffmpeg binary.
+
+    Uses FREEZE_FFMPEG if set, then ffmpeg on the PATH, then the binary bundled with
+    imageio-ffmpeg (installed with MoviePy).
+
+    Returns:
+        str: Path to the ffmpeg executable.
+    """
+    path = os.environ.get("FREEZE_FFMPEG") or shutil.which("ffmpeg")
+    if path:
+        return path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def parse_timestamp(timestamp):
+    """Convert an "H:MM:SS(.ffffff)" timestamp to seconds."""
+    hours, minutes, seconds = map(float, timestamp.split(":"))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+@lru_cache(maxsize=32)
+def _probe(video_file, mtime, size):
+    # Decode only keyframes and let showinfo print their timestamps
+    output = subprocess.run(
+        [find_ffmpeg(), "-hide_banner", "-nostdin", "-skip_frame", "nokey", "-i", video_file,
+         "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    codec = re.search(r"Stream #\d+:\d+.*?: Video: (\w+)", output)
+    keyframes = [float(t) for t in re.findall(r"pts_time:\s*([-\d.]+)", output)]
+    return (codec.group(1) if codec else None), tuple(sorted(keyframes))
+
+
+def probe_video(video_file):
+    """
+    Read the video codec and keyframe timestamps of a file.
+
+    Results are cached per file path, modification time and size.
+
+    Args:
+        video_file (str): Path to the video.
+
+    Returns:
+        tuple: (codec name or None, sorted keyframe timestamps in seconds).
+    """
+    stat = os.stat(video_file)
+    return _probe(os.path.abspath(video_file), stat.st_mtime, stat.st_size)
+
+
+def _keyframe_at_or_before(keyframes, seconds):
+    i = bisect_right(keyframes, seconds + _KEYFRAME_EPSILON)
+    return keyframes[i - 1] if i else 0.0
+
+
+def _keyframe_after(keyframes, seconds):
+    i = bisect_right(keyframes, seconds + _KEYFRAME_EPSILON)
+    return keyframes[i] if i < len(keyframes) else None
+
+
+def _run_ffmpeg(args):
+    subprocess.run([find_ffmpeg(), "-hide_banner", "-nostdin", "-loglevel", "error", "-y", *args],
+                   capture_output=True, text=True, check=True)
+
+
+def _copy_range(video_file, start, duration, output_file, container_args=()):
+    _run_ffmpeg(["-ss", f"{start + _KEYFRAME_EPSILON:.6f}", "-i", video_file, "-t", f"{duration:.6f}",
+                 "-map", "0", "-c", "copy", "-avoid_negative_ts", "make_zero", *container_args, output_file])
+
+
+def _encode_range(video_file, start, duration, output_file, crf=18):
+    _run_ffmpeg(["-ss", f"{start:.6f}", "-i", video_file, "-t", f"{duration:.6f}", "-map", "0:v:0", "-map", "0:a?",
+                 "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", "yuv420p",
+                 "-c:a", "aac", output_file])
+
+
+def _extract_copy(video_file, start, end, output_file):
+    # Stream copy has to start on a keyframe, so the clip may begin up to one GOP early
+    _, keyframes = probe_video(video_file)
+    snapped = _keyframe_at_or_before(keyframes, start)
+    _copy_range(video_file, snapped, end - snapped, output_file)
+
+
+def _extract_exact(video_file, start, end, output_file):
+    codec, keyframes = probe_video(video_file)
+    if start - _keyframe_at_or_before(keyframes, start) < _KEYFRAME_EPSILON:
+        # Already starts on a keyframe
+        _copy_range(video_file, start, end - start, output_file)
+        return
+    head_end = _keyframe_after(keyframes, start)
+    if codec != "h264" or head_end is None or head_end >= end:
+        # Nothing to copy after the first GOP, or a codec we cannot re-encode the head in
+        _encode_range(video_file, start, end - start, output_file)
+        return
+
+    # Re-encode only up to the next keyframe and stream-copy the rest. The copied part keeps
+    # its own parameter sets in-band, so the joined stream decodes across the seam.
+    with tempfile.TemporaryDirectory(prefix="freeze_clip_") as work_dir:
+        head = os.path.join(work_dir, "head.mp4")
+        tail = os.path.join(work_dir, "tail.mp4")
+        parts = os.path.join(work_dir, "parts.txt")
+        try:
+            _encode_range(video_file, start, head_end - start, head)
+            _copy_range(video_file, head_end, end - head_end, tail, ["-bsf:v", "h264_mp4toannexb"])
+            with open(parts, "w") as f:
+                f.write(f"file '{head}'\nfile '{tail}'\n")
+            _run_ffmpeg(["-f", "concat", "-safe", "0", "-i", parts, "-map", "0", "-c", "copy",
+                         "-movflags", "+faststart", output_file])
+        except subprocess.CalledProcessError as e:
+            print(f"Smart cut failed for {output_file}: {e.stderr.strip()}. Re-encoding the whole clip.")
+            _encode_range(video_file, start, end - start, output_file)
+
+
+def _extract_moviepy(video_file, scenes, output_files):
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    video = VideoFileClip(video_file)
+    try:
+        for scene, output_file in zip(scenes, output_files):
+            clip = video.subclipped(parse_timestamp(scene["start_time"]), parse_timestamp(scene["end_time"]))
+            print(f"Creating clip: {output_file}")
+            clip.write_videofile(output_file, codec="libx264", audio=True, audio_codec="aac")
+    finally:
+        video.close()
+
+
+_EXTRACTORS = {
+    "copy": _extract_copy,
+    "exact": _extract_exact,
+}
+
+
+def create_subclips(video_file, scenes, output_folder="05_02_clips", mode="copy", workers=None):
+    """
+    Cut the given scenes out of a video.
+
+    Args:
+        video_file (str): Path to the source video.
+        scenes (list): Scene dicts with "scene", "start_time" and "end_time", as returned by
+            fetch_scenes_from_db.
+        output_folder (str): Directory for the clips, created if missing.
+        mode (str): "copy" stream-copies from the keyframe at or before the scene start, so
+            clips may start up to one GOP early but nothing is re-encoded. "exact" cuts on the
+            scene start by re-encoding only the frames up to the next keyframe. Copied parts can
+            end a few frames after the scene. "moviepy" is the previous full re-encode through
+            MoviePy.
+        workers (int): Number of clips extracted at once, defaults to the number of CPUs.
+
+    Returns:
+        list: Paths of the extracted clips, in the order of `scenes`.
+    """
+    if mode not in _EXTRACTORS and mode != "moviepy":
+        raise ValueError(f"Unknown extraction mode: {mode}")
+    os.makedirs(output_folder, exist_ok=True)
+
+    # A random suffix keeps concurrent extractions of the same scene from overwriting each other
+    stem = os.path.splitext(os.path.basename(video_file))[0]
+    output_files = [
+        os.path.join(output_folder, f"{stem}_scene_{scene['scene']}_{uuid.uuid4().hex[:8]}.mp4")
+        for scene in scenes
+    ]
+
+    if mode == "moviepy":
+        _extract_moviepy(video_file, scenes, output_files)
+        return output_files
+
+    extract = _EXTRACTORS[mode]
+    jobs = []
+    for scene, output_file in zip(scenes, output_files):
+        print(f"Creating clip: {output_file}")
+        jobs.append((video_file, parse_timestamp(scene["start_time"]), parse_timestamp(scene["end_time"]), output_file))
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        # Each job is an ffmpeg process, so threads are enough to run them in parallel
+        list(executor.map(lambda job: extract(*job), jobs))
+    return output_files
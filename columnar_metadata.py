@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+from datetime import timedelta
+
+import numpy as np
+
+# Suffix of the folder written next to a metadata JSON file
+COLUMNS_SUFFIX = ".columns"
+# Bump when the columns or their meaning change
+COLUMNAR_VERSION = 3
+
+_META_FILE = "meta.json"
+
+# One entry per scene
+_SCENE_COLUMNS = {
+    "scene_number": np.int32,
+    "scene_start": np.float64,  # Seconds
+    "scene_end": np.float64,
+}
+# One entry per object; object_scene is the position of its scene in the scene columns and
+# object_bbox is an (n, 4) array of x1, y1, x2, y2 normalized to [0, 1]
+_OBJECT_COLUMNS = {
+    "object_scene": np.int32,
+    "object_frame": np.int32,  # -1 if unknown
+    "object_time": np.float64,  # Seconds of object_frame, NaN if unknown
+    "object_class": np.int16,  # Index into the class names
+    "object_confidence": np.float32,
+    "object_bbox": np.float32,
+}
+# Only written for tracked objects
+_TRACK_COLUMNS = {
+    "object_first_frame": np.int32,
+    "object_last_frame": np.int32,
+    "object_detections": np.int32,
+    "object_first_time": np.float64,  # Seconds
+    "object_last_time": np.float64,
+}
+
+
+def columnar_path(metadata_json_path):
+    """Return the path of the columnar folder written next to a metadata JSON file."""
+    return os.path.splitext(metadata_json_path)[0] + COLUMNS_SUFFIX
+
+
+def parse_time_string(time_string):
+    """Inverse of str(timedelta(seconds=...)), e.g. "0:01:02.500000" or "1 day, 2:03:04", in seconds."""
+    days = 0
+    if "day" in time_string:
+        day_part, time_string = time_string.split(", ")
+        days = int(day_part.split()[0])
+    hours, minutes, seconds = time_string.split(":")
+    return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _time_string(seconds):
+    return str(timedelta(seconds=seconds))
+
+
+def write_columnar_metadata(scene_metadata, path, frame_size=None):
+    """
+    Write scene metadata as a folder of NumPy arrays, one .npy file per column.
+
+    Class names and the frame size are stored once in meta.json. Confidences and boxes are
+    stored as float32, the precision the model produces them in.
+
+    Args:
+        scene_metadata (list): Scene dicts as written to the metadata JSON.
+        path (str): Folder to write, replaced if it exists.
+        frame_size (tuple): (width, height) of the video frames, if known.
+
+    Returns:
+        str: `path`.
+    """
+    tracked = any("first_frame" in obj for scene in scene_metadata for obj in scene["objects"])
+    names = list(_SCENE_COLUMNS) + list(_OBJECT_COLUMNS) + (list(_TRACK_COLUMNS) if tracked else [])
+    columns = {name: [] for name in names}
+    classes = {}
+
+    for scene_index, scene in enumerate(scene_metadata):
+        columns["scene_number"].append(scene["scene"])
+        columns["scene_start"].append(parse_time_string(scene["start_time"]))
+        columns["scene_end"].append(parse_time_string(scene["end_time"]))
+        for obj in scene["objects"]:
+            bbox = obj["bbox"]
+            frame = obj.get("frame")
+            columns["object_scene"].append(scene_index)
+            columns["object_frame"].append(-1 if frame is None else frame)
+            columns["object_time"].append(parse_time_string(obj["time"]) if "time" in obj else np.nan)
+            columns["object_class"].append(classes.setdefault(obj["class_name"], len(classes)))
+            columns["object_confidence"].append(obj["confidence"])
+            columns["object_bbox"].append((bbox["x1"], bbox["y1"], bbox["x2"], bbox["y2"]))
+            if tracked:
+                columns["object_first_frame"].append(obj["first_frame"])
+                columns["object_last_frame"].append(obj["last_frame"])
+                columns["object_detections"].append(obj["detections"])
+                columns["object_first_time"].append(parse_time_string(obj["first_time"]))
+                columns["object_last_time"].append(parse_time_string(obj["last_time"]))
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    dtypes = {**_SCENE_COLUMNS, **_OBJECT_COLUMNS, **_TRACK_COLUMNS}
+    for name in names:
+        array = np.asarray(columns[name], dtype=dtypes[name])
+        if name == "object_bbox":
+            array = array.reshape(-1, 4)
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    # Written last, so a folder without it is incomplete
+    with open(os.path.join(path, _META_FILE), "w") as f:
+        json.dump({
+            "version": COLUMNAR_VERSION,
+            "classes": list(classes),
+            "tracked": tracked,
+            "frame_size": list(frame_size) if frame_size else None,
+        }, f)
+    return path
+
+
+class ColumnarMetadata:
+    """
+    Columnar scene metadata written by `write_columnar_metadata`.
+
+    Every column is an attribute holding a NumPy array, memory-mapped by default so opening
+    is immediate and only the pages of the columns actually used are read.
+
+    Args:
+        path (str): Folder written by `write_columnar_metadata`.
+        mmap (bool): Memory-map the columns instead of reading them into memory.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        try:
+            with open(os.path.join(path, _META_FILE)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"{path} is not a complete columnar metadata folder.") from None
+        if meta["version"] != COLUMNAR_VERSION:
+            raise ValueError(f"{path} has columnar format version {meta['version']}, expected {COLUMNAR_VERSION}.")
+        self.classes = meta["classes"]
+        self.tracked = meta["tracked"]
+        self.frame_size = tuple(meta["frame_size"]) if meta["frame_size"] else None
+
+        names = list(_SCENE_COLUMNS) + list(_OBJECT_COLUMNS) + (list(_TRACK_COLUMNS) if self.tracked else [])
+        for name in names:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None))
+
+    def __len__(self):
+        return len(self.scene_number)
+
+    def class_counts(self):
+        """Return an (n_scenes, n_classes) array of the number of objects of each class per scene."""
+        counts = np.bincount(
+            self.object_scene.astype(np.int64) * len(self.classes) + self.object_class,
+            minlength=len(self) * len(self.classes),
+        )
+        return counts.reshape(len(self), len(self.classes))
+
+    def to_scene_metadata(self):
+        """Rebuild the scene dicts of the metadata JSON."""
+        scenes = [
+            {
+                "scene": number,
+                "start_time": _time_string(start),
+                "end_time": _time_string(end),
+                "objects": [],
+                "class_counts": {},
+            }
+            for number, start, end in zip(self.scene_number.tolist(), self.scene_start.tolist(),
+                                          self.scene_end.tolist())
+        ]
+        columns = [self.object_scene.tolist(), self.object_frame.tolist(), self.object_time.tolist(),
+                   self.object_class.tolist(), self.object_confidence.tolist(), self.object_bbox.tolist()]
+        if self.tracked:
+            columns += [self.object_first_frame.tolist(), self.object_last_frame.tolist(),
+                        self.object_detections.tolist(), self.object_first_time.tolist(),
+                        self.object_last_time.tolist()]
+        for row in zip(*columns):
+            scene_index, frame, time, class_id, confidence, (x1, y1, x2, y2) = row[:6]
+            class_name = self.classes[class_id]
+            obj = {
+                "frame": None if frame < 0 else frame,
+                "class_name": class_name,
+                "confidence": confidence,
+                "bbox": {"x1": x1, "y1": y1, "x2": x2, "y2": y2},
+            }
+            if not np.isnan(time):
+                obj["time"] = _time_string(time)
+            if self.tracked:
+                first_frame, last_frame, detections, first_time, last_time = row[6:]
+                obj.update(first_frame=first_frame, last_frame=last_frame, detections=detections,
+                           first_time=_time_string(first_time), last_time=_time_string(last_time))
+            scene = scenes[scene_index]
+            scene["objects"].append(obj)
+            scene["class_counts"][class_name] = scene["class_counts"].get(class_name, 0) + 1
+        return scenes
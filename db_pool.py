@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def db_settings():
+    """
+    Read the database connection settings from the environment.
+
+    FREEZE_DB_HOST, FREEZE_DB_PORT, FREEZE_DB_NAME, FREEZE_DB_USER and FREEZE_DB_PASSWORD select
+    the database, FREEZE_DB_POOL_MIN and FREEZE_DB_POOL_MAX size the connection pool, and
+    FREEZE_DB_POOL_TIMEOUT is how many seconds a caller waits for a free connection.
+
+    Returns:
+        dict: Connection keyword arguments plus the pool settings.
+    """
+    return {
+        "host": os.environ.get("FREEZE_DB_HOST", "localhost"),
+        "port": int(os.environ.get("FREEZE_DB_PORT", "5432")),
+        "dbname": os.environ.get("FREEZE_DB_NAME", "video_metadata"),
+        "user": os.environ.get("FREEZE_DB_USER", "video_user_1"),
+        "password": os.environ.get("FREEZE_DB_PASSWORD", "user1password"),
+        "minconn": int(os.environ.get("FREEZE_DB_POOL_MIN", "1")),
+        "maxconn": int(os.environ.get("FREEZE_DB_POOL_MAX", "10")),
+        "timeout": float(os.environ.get("FREEZE_DB_POOL_TIMEOUT", "30")),
+    }
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Connection that remembers which server-side prepared statements it holds."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PreparingConnections that makes callers wait for a free connection.
+
+    psycopg2's ThreadedConnectionPool raises as soon as every connection is in use; this pool
+    blocks for up to `timeout` seconds instead and keeps counters for sizing the pool. It also
+    keeps every returned connection open, where ThreadedConnectionPool closes those beyond
+    `minconn`, so connections and the statements prepared on them last as long as the pool.
+
+    Args:
+        minconn (int): Connections opened up front.
+        maxconn (int): Upper bound on open connections.
+        timeout (float): Seconds to wait for a free connection before raising PoolError.
+        **connect_kwargs: Passed to psycopg2.connect.
+    """
+
+    def __init__(self, minconn, maxconn, timeout=30.0, **connect_kwargs):
+        if not 0 <= minconn <= maxconn or maxconn < 1:
+            raise psycopg2.pool.PoolError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._connect_kwargs = connect_kwargs
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._metrics = {
+            "connects": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+            "in_use": 0,
+            "in_use_peak": 0,
+            "discarded": 0,
+        }
+        # Open connections not in use, most recently returned last. The slots bound them and the
+        # checked-out connections together to `maxconn`.
+        self._idle = [self._connect() for _ in range(minconn)]
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PreparingConnection, **self._connect_kwargs)
+        with self._lock:
+            self._metrics["connects"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for one transaction.
+
+        Commits when the block succeeds and rolls back when it raises. Connections that broke
+        are closed instead of returned to the pool.
+        """
+        start = time.perf_counter()
+        waited = not self._slots.acquire(blocking=False)
+        if waited and not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._metrics["timeouts"] += 1
+            raise psycopg2.pool.PoolError(f"No database connection free after {self.timeout}s")
+        wait = time.perf_counter() - start
+
+        try:
+            with self._lock:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("Connection pool is closed")
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            metrics = self._metrics
+            metrics["checkouts"] += 1
+            metrics["waits"] += waited
+            metrics["wait_seconds_total"] += wait
+            metrics["wait_seconds_max"] = max(metrics["wait_seconds_max"], wait)
+            metrics["in_use"] += 1
+            metrics["in_use_peak"] = max(metrics["in_use_peak"], metrics["in_use"])
+
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    conn.close()
+            raise
+        finally:
+            broken = bool(conn.closed)
+            with self._lock:
+                if not broken and not self._closed:
+                    self._idle.append(conn)
+                    conn = None
+                self._metrics["in_use"] -= 1
+                self._metrics["discarded"] += broken
+            if conn is not None and not conn.closed:
+                conn.close()
+            self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["max_connections"] = self.maxconn
+        metrics["wait_seconds_avg"] = metrics["wait_seconds_total"] / metrics["checkouts"] if metrics["checkouts"] else 0.0
+        return metrics
+
+    def close(self):
+        """Close the idle connections; connections in use are closed when they are returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it from `db_settings` on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = db_settings()
+            _pool = ConnectionPool(settings.pop("minconn"), settings.pop("maxconn"), **settings)
+        return _pool
+
+
+def get_db_connection():
+    """Context manager that borrows a pooled connection for one transaction."""
+    return get_pool().connection()
+
+
+def pool_metrics():
+    """Counters of the process-wide pool, or an empty dict before it is first used."""
+    return _pool.metrics() if _pool is not None else {}
+
+
+def close_pool():
+    """Close every connection of the process-wide pool, e.g. before forking workers."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,195 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# Side of the grayscale thumbnail a frame is reduced to for hashing and comparing
+THUMBNAIL_SIZE = 32
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS detections (
+        key TEXT PRIMARY KEY,  -- "<model fingerprint>:<perceptual hash>"
+        thumbnail BLOB NOT NULL,
+        boxes BLOB NOT NULL,  -- float32 rows of x1, y1, x2, y2 normalized to [0, 1], confidence, class id
+        seconds REAL NOT NULL,  -- inference time the detections took
+        used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS detections_used ON detections (used);
+"""
+
+
+def frame_thumbnail(frame):
+    """Reduce a BGR frame to the grayscale THUMBNAIL_SIZE x THUMBNAIL_SIZE image the cache compares."""
+    # Area-averaging a full frame takes milliseconds, so sample it down bilinearly to 4x the
+    # thumbnail first and average only that, which still smooths out compression noise
+    small = cv2.resize(frame, (THUMBNAIL_SIZE * 4, THUMBNAIL_SIZE * 4), interpolation=cv2.INTER_LINEAR)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def perceptual_hash(thumbnail, hash_size=8):
+    """
+    DCT perceptual hash of a thumbnail from `frame_thumbnail`.
+
+    Compression noise and small brightness changes leave the hash unchanged, so the repeated
+    frames of a static shot, intro or slate hash alike.
+
+    Args:
+        thumbnail (np.ndarray): Grayscale thumbnail.
+        hash_size (int): Side of the block of lowest frequencies used, for hash_size ** 2 bits.
+
+    Returns:
+        str: The hash as hex digits.
+    """
+    low = cv2.dct(thumbnail.astype(np.float32))[:hash_size, :hash_size]
+    return np.packbits(low > np.median(low)).tobytes().hex()
+
+
+class DetectionCache:
+    """
+    LRU cache of detections keyed by a perceptual hash of the frame, in front of the model.
+
+    BatchInferenceEngine looks up every sampled frame before inference, so frames that repeat
+    within a video (static shots) or across videos (intros, slates) are only inferred once.
+    Entries are keyed by the model's fingerprint and the frame's perceptual hash. A hash match
+    is only a hit if the frames' thumbnails also differ by at most `max_pixel_difference` gray
+    levels in every pixel, so a small object moving in an otherwise static shot is inferred
+    again. Boxes are stored normalized to the frame size, with the inference time they took, so
+    the time a hit saves is known even in a run that infers nothing.
+
+    The cache is thread-safe. With a `path`, entries are also written to a SQLite file, shared
+    by every process using the same file and kept across runs; misses in memory are looked up
+    there. Each level keeps its `max_entries` most recently used entries. Hits served from
+    memory are written to the file's use times in batches, before evicting and on `close`.
+
+    Args:
+        max_entries (int): Entries kept.
+        path (str): SQLite file to persist entries in. In memory only if not given.
+        hash_size (int): See `perceptual_hash`.
+        max_pixel_difference (int): Largest thumbnail difference of a hit, in gray levels.
+    """
+
+    def __init__(self, max_entries=10000, path=None, hash_size=8, max_pixel_difference=8):
+        self.max_entries = max_entries
+        self.path = path
+        self.hash_size = hash_size
+        self.max_pixel_difference = max_pixel_difference
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> (thumbnail, boxes, seconds), least recently used first
+        self._entries = OrderedDict()
+        self._conn = None
+        self._puts = 0
+        # key -> time of the memory hits not yet written to the file
+        self._used = {}
+        if self.path:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA_SQL)
+
+    def lookup(self, model_key, frame):
+        """
+        Look up the detections of a frame.
+
+        Args:
+            model_key (str): Fingerprint of the model, e.g. from `analysis_cache.model_fingerprint`.
+            frame (np.ndarray): BGR frame.
+
+        Returns:
+            tuple: (entry, boxes, seconds). `entry` identifies the frame for `store`. `boxes` is
+                an (N, 6) float32 array of normalized x1, y1, x2, y2, confidence and class id, or
+                None on a miss. `seconds` is the inference time the hit saves, 0.0 on a miss.
+        """
+        thumbnail = frame_thumbnail(frame)
+        key = f"{model_key}:{perceptual_hash(thumbnail, self.hash_size)}"
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None and self._conn is not None:
+                row = self._conn.execute("SELECT thumbnail, boxes, seconds FROM detections WHERE key = ?",
+                                         (key,)).fetchone()
+                if row is not None:
+                    cached = (np.frombuffer(row[0], dtype=np.uint8).reshape(thumbnail.shape),
+                              np.frombuffer(row[1], dtype=np.float32).reshape(-1, 6), row[2])
+                    self._remember(key, cached)
+            if cached is not None and self._matches(cached[0], thumbnail):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                if self._conn is not None:
+                    self._used[key] = time.time()
+                    if len(self._used) >= 256:
+                        self._write_used()
+                self.hits += 1
+                return (key, thumbnail), cached[1], cached[2]
+            self.misses += 1
+            return (key, thumbnail), None, 0.0
+
+    def store(self, entry, boxes, seconds):
+        """
+        Cache the detections of a frame.
+
+        Args:
+            entry (tuple): From the frame's `lookup`.
+            boxes (np.ndarray): Detections, as `lookup` returns them.
+            seconds (float): Inference time of the frame.
+        """
+        key, thumbnail = entry
+        boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 6)
+        with self._lock:
+            self._remember(key, (thumbnail, boxes, seconds))
+            if self._conn is not None:
+                self._used.pop(key, None)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO detections (key, thumbnail, boxes, seconds, used) VALUES (?, ?, ?, ?, ?)",
+                    (key, thumbnail.tobytes(), boxes.tobytes(), seconds, time.time()))
+                self._puts += 1
+                # Evicting is a table scan, so it runs every few hundred writes rather than on each
+                if self._puts % 256 == 0:
+                    self._write_used()
+                    self._conn.execute(
+                        "DELETE FROM detections WHERE key NOT IN "
+                        "(SELECT key FROM detections ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+
+    def same_frame(self, entry, other):
+        """True if two frames' `lookup` entries would be a hit for each other."""
+        return entry[0] == other[0] and self._matches(entry[1], other[1])
+
+    def record_reuse(self):
+        """Count a missed lookup as a hit, for a frame that reused the detections of an identical frame of its batch."""
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+
+    def _write_used(self):
+        used, self._used = self._used, {}
+        self._conn.executemany("UPDATE detections SET used = ? WHERE key = ?",
+                               [(when, key) for key, when in used.items()])
+
+    def _remember(self, key, cached):
+        self._entries[key] = cached
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _matches(self, cached_thumbnail, thumbnail):
+        return int(cv2.absdiff(cached_thumbnail, thumbnail).max()) <= self.max_pixel_difference
+
+    @property
+    def hit_rate(self):
+        """Share of lookups that were hits."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._write_used()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,197 @@
+import numpy as np
+
+from columnar_metadata import ColumnarMetadata
+from regions import grid_masks, region_query
+
+
+def _clock(seconds):
+    # Formatted like the TIME columns returned by fetch_scenes_from_db, fractions dropped
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class DetectionSearchEngine:
+    """
+    In-process scene search over columnar metadata, for use without PostgreSQL.
+
+    Videos are added with `add_video`, and their columns are concatenated into flat arrays.
+    `fetch_scenes` takes the filters of `metadata_db.fetch_scenes_from_db` and returns the
+    same scenes.
+
+    How queries run:
+    - Object filters are boolean masks over detections. They must all hold for the same
+      detection.
+    - Grid-aligned location filters, such as the quadrants, test each detection's grid cell
+      bitmask instead of its coordinates.
+    - Class counts are read from a per-scene count matrix.
+    - A per-class inverted index lists each class's detections in order. A query for one
+      class only touches that class's detections.
+
+    The arrays are rebuilt on the first query after videos are added.
+    """
+
+    def __init__(self):
+        self._videos = {}
+        self._built = False
+
+    def add_video(self, video_id, metadata):
+        """
+        Add the metadata of one video, replacing any earlier metadata added under the same id.
+
+        Args:
+            video_id (str): Id of the video, e.g. from `compute_video_id`.
+            metadata (ColumnarMetadata or str): Columnar metadata, or the path of its folder.
+        """
+        if not isinstance(metadata, ColumnarMetadata):
+            metadata = ColumnarMetadata(metadata)
+        self._videos[video_id] = metadata
+        self._built = False
+
+    def __len__(self):
+        """Number of detections in the engine."""
+        self._ensure_built()
+        return len(self._det_scene)
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        classes = {}
+        scene_columns = ([], [], [], [])  # video, number, start, end
+        det_columns = ([], [], [], [])  # scene, class, confidence, bbox
+        self._video_index = {}
+        self._video_ids = list(self._videos)
+        self._scene_ranges = []
+        self._det_ranges = []
+        scene_offset = det_offset = 0
+
+        for video, (video_id, columns) in enumerate(self._videos.items()):
+            num_scenes, num_dets = len(columns), len(columns.object_scene)
+            # Class ids of this video mapped to ids shared by all videos
+            class_map = np.array([classes.setdefault(name, len(classes)) for name in columns.classes], dtype=np.int32)
+            scene_columns[0].append(np.full(num_scenes, video, dtype=np.int32))
+            scene_columns[1].append(columns.scene_number)
+            scene_columns[2].append(columns.scene_start)
+            scene_columns[3].append(columns.scene_end)
+            det_columns[0].append(columns.object_scene + np.int32(scene_offset))
+            det_columns[1].append(class_map[columns.object_class])
+            det_columns[2].append(columns.object_confidence)
+            det_columns[3].append(columns.object_bbox)
+
+            self._video_index[video_id] = video
+            self._scene_ranges.append((scene_offset, scene_offset + num_scenes))
+            self._det_ranges.append((det_offset, det_offset + num_dets))
+            scene_offset += num_scenes
+            det_offset += num_dets
+
+        def concatenate(parts, dtype, shape=(0,)):
+            return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(shape, dtype=dtype)
+
+        scene_video = concatenate(scene_columns[0], np.int32)
+        scene_number = concatenate(scene_columns[1], np.int32)
+        self._scene_video = scene_video
+        self._scene_number = scene_number
+        self._scene_start = concatenate(scene_columns[2], np.float64)
+        self._scene_end = concatenate(scene_columns[3], np.float64)
+        self._det_scene = concatenate(det_columns[0], np.int64)
+        det_class = concatenate(det_columns[1], np.int32)
+        self._det_confidence = concatenate(det_columns[2], np.float32)
+        self._det_bbox = concatenate(det_columns[3], np.float32, (0, 4))
+        self._det_grid = grid_masks(self._det_bbox)
+        self._classes = classes
+
+        # Inverted index: detection indices grouped by class, ascending within each class
+        self._postings = np.argsort(det_class, kind="stable")
+        self._class_offsets = np.searchsorted(det_class[self._postings], np.arange(len(classes) + 1))
+
+        # Objects per class and scene, as stored in video_metadata.class_counts
+        num_scenes, num_classes = len(scene_number), len(classes)
+        self._class_counts = np.bincount(
+            self._det_scene * num_classes + det_class, minlength=num_scenes * num_classes
+        ).reshape(num_scenes, num_classes)
+
+        # Result order of the SQL query: by video id, then scene number
+        video_rank = np.argsort(np.argsort(np.array(list(self._videos), dtype=object)))
+        self._scene_order = np.lexsort((scene_number, video_rank[scene_video]))
+        self._built = True
+
+    def _candidates(self, object_class, det_lo, det_hi):
+        # Detections that can match: one class's postings, or every detection in range
+        if object_class is None:
+            return slice(det_lo, det_hi), det_hi - det_lo
+        class_id = self._classes.get(object_class)
+        if class_id is None:
+            return slice(0, 0), 0
+        postings = self._postings[self._class_offsets[class_id]:self._class_offsets[class_id + 1]]
+        postings = postings[np.searchsorted(postings, det_lo):np.searchsorted(postings, det_hi)]
+        return postings, len(postings)
+
+    def fetch_scenes(self, object_class=None, confidence_threshold=50, location=None, min_class_counts=None,
+                     video_id=None):
+        """
+        Find scenes like `fetch_scenes_from_db` with `use_detections=True`.
+
+        Args:
+            object_class (str): The class name of the object to filter by (e.g., 'person').
+            confidence_threshold (float): Minimum confidence level for filtering objects.
+            location (tuple or str): Bounding box (x1, y1, x2, y2), normalized to [0, 1], that the
+                object must lie within, or a quadrant name from `regions.QUADRANTS`.
+            min_class_counts (dict): A dictionary where keys are class names and values are the minimum counts required.
+            video_id (str): Only search the scenes of this video.
+
+        Returns:
+            list: Matching scenes as dicts with scene, start_time, end_time and video_id,
+                ordered by video id and scene number.
+        """
+        self._ensure_built()
+        scene_mask = np.ones(len(self._scene_number), dtype=bool)
+        det_lo, det_hi = 0, len(self._det_scene)
+        if video_id:
+            if video_id not in self._video_index:
+                return []
+            video = self._video_index[video_id]
+            scene_lo, scene_hi = self._scene_ranges[video]
+            scene_mask[:] = False
+            scene_mask[scene_lo:scene_hi] = True
+            det_lo, det_hi = self._det_ranges[video]
+
+        # All object filters apply to the same detection
+        region = region_query(location)
+        if object_class or confidence_threshold is not None or region:
+            candidates, count = self._candidates(object_class or None, det_lo, det_hi)
+            keep = np.ones(count, dtype=bool)
+            # float64 thresholds, so float32 values are compared like PostgreSQL compares REAL
+            if confidence_threshold is not None:
+                keep &= self._det_confidence[candidates] >= np.float64(confidence_threshold)
+            if region:
+                (x1, y1, x2, y2), outside, exact = region
+                # The grid settles aligned regions; for any other rectangle the coordinates are
+                # compared directly, as prefiltering on the grid first saves nothing
+                if exact:
+                    keep &= (self._det_grid[candidates] & outside) == 0
+                else:
+                    bbox = self._det_bbox[candidates]
+                    x1, y1, x2, y2 = (np.float64(value) for value in (x1, y1, x2, y2))
+                    keep &= (bbox[:, 0] >= x1) & (bbox[:, 1] >= y1) & (bbox[:, 2] <= x2) & (bbox[:, 3] <= y2)
+            matched = np.zeros(len(scene_mask), dtype=bool)
+            matched[self._det_scene[candidates][keep]] = True
+            scene_mask &= matched
+
+        if min_class_counts:
+            for class_name, min_count in min_class_counts.items():
+                class_id = self._classes.get(class_name)
+                counts = self._class_counts[:, class_id] if class_id is not None else 0
+                scene_mask &= counts >= min_count
+
+        scenes = self._scene_order[scene_mask[self._scene_order]]
+        return [
+            {
+                "scene": number,
+                "start_time": _clock(start),
+                "end_time": _clock(end),
+                "video_id": self._video_ids[video],
+            }
+            for number, start, end, video in zip(self._scene_number[scenes].tolist(),
+                                                 self._scene_start[scenes].tolist(),
+                                                 self._scene_end[scenes].tolist(),
+                                                 self._scene_video[scenes].tolist())
+        ]
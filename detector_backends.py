@@ -0,0 +1,207 @@
+import glob
+import os
+import shutil
+import uuid
+
+import cv2
+import numpy as np
+
+# YOLOv8 sizes, from fastest to most accurate. Weights are <weights dir>/YOLOv8<size>.pt
+MODEL_SIZES = ("n", "s", "m", "l", "x")
+
+# How the detector runs:
+# - "torch": the ultralytics PyTorch model, as before
+# - "onnx": exported to ONNX and run by ONNX Runtime
+# - "openvino": exported to OpenVINO IR, for Intel CPUs
+# - "int8": the ONNX export quantized to INT8, calibrated on frames of sample videos
+DETECTOR_BACKENDS = ("torch", "onnx", "openvino", "int8")
+
+# Frames of the bundled clips, used to calibrate INT8 activations when no videos are given
+DEFAULT_CALIBRATION_VIDEOS = "03_scenes_segmented/*.mp4"
+
+
+def weights_path(size, weights_dir=None):
+    """
+    Path of the YOLOv8 weights of a model size.
+
+    Args:
+        size (str): One of MODEL_SIZES.
+        weights_dir (str): Folder of the weights, defaults to "yolo_models".
+
+    Returns:
+        str: <weights_dir>/YOLOv8<size>.pt
+    """
+    if size not in MODEL_SIZES:
+        raise ValueError(f"Unknown model size {size!r}, expected one of {', '.join(MODEL_SIZES)}.")
+    return os.path.join(weights_dir or "yolo_models", f"YOLOv8{size}.pt")
+
+
+def _export_path(weights, backend):
+    stem = os.path.splitext(weights)[0]
+    return {
+        "onnx": f"{stem}.onnx",
+        "openvino": f"{stem}_openvino_model",
+        "int8": f"{stem}.int8.onnx",
+    }[backend]
+
+
+def _is_current(path, weights):
+    # An export is reused until the weights it came from change
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(weights)
+
+
+def _publish(tmp_path, path):
+    # Move a finished export into place. If another process got there first, keep its export.
+    if os.path.isdir(tmp_path) and os.path.isdir(path):
+        shutil.rmtree(path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+
+
+def _export(weights, export_format, imgsz):
+    # Export from a private copy of the weights, so concurrent exports do not write the same files
+    from ultralytics import YOLO
+
+    tmp_folder = os.path.join(os.path.dirname(weights) or ".", f".export-{uuid.uuid4().hex}")
+    os.makedirs(tmp_folder)
+    try:
+        tmp_weights = os.path.join(tmp_folder, os.path.basename(weights))
+        shutil.copy2(weights, tmp_weights)
+        # Dynamic axes let the engine's batches and the letterboxed frame shapes vary
+        return tmp_folder, YOLO(tmp_weights).export(format=export_format, dynamic=True, imgsz=imgsz)
+    except BaseException:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+        raise
+
+
+def calibration_frames(videos, count=64):
+    """
+    Read frames spread evenly over videos, to calibrate INT8 activations on representative footage.
+
+    Args:
+        videos (list): Paths of the videos.
+        count (int): Number of frames to read in total.
+
+    Returns:
+        list: BGR frames.
+    """
+    lengths = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        lengths.append(int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        cap.release()
+    total = sum(lengths)
+    if not total:
+        raise ValueError("No frames to calibrate INT8 quantization with.")
+
+    frames = []
+    positions = np.linspace(0, total, num=min(count, total), endpoint=False).astype(int)
+    offset = 0
+    for video, length in zip(videos, lengths):
+        cap = cv2.VideoCapture(video)
+        for position in positions[(positions >= offset) & (positions < offset + length)]:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(position - offset))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(frame)
+        cap.release()
+        offset += length
+    return frames
+
+
+def _quantize_int8(onnx_path, output_path, frames, imgsz):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from ultralytics.data.augment import LetterBox
+
+    # Same letterboxing as ultralytics' predictor uses for dynamic-shape exports
+    letterbox = LetterBox((imgsz, imgsz), auto=True, stride=32)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            if frame is None:
+                return None
+            image = letterbox(image=frame)[..., ::-1].transpose(2, 0, 1)  # BGR HWC to RGB CHW
+            return {"images": np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0}
+
+    # Static QDQ quantization with per-channel weights. Dynamic quantization turns the convolutions
+    # into ConvInteger, which ONNX Runtime runs slower on CPU than the float model.
+    quantize_static(onnx_path, output_path, FrameReader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8)
+
+
+def export_detector(weights, backend, imgsz=640, calibration_videos=None):
+    """
+    Export YOLOv8 weights for a backend, reusing an earlier export of the same weights.
+
+    Exports are written next to the weights: <stem>.onnx, <stem>_openvino_model/ and
+    <stem>.int8.onnx.
+
+    Args:
+        weights (str): Path to the .pt weights.
+        backend (str): One of DETECTOR_BACKENDS.
+        imgsz (int): Longest input side of the exported model.
+        calibration_videos (list): Videos whose frames calibrate the "int8" backend, defaults to
+            the bundled clips matching DEFAULT_CALIBRATION_VIDEOS.
+
+    Returns:
+        str: Path to load with ultralytics' YOLO, the weights themselves for "torch".
+    """
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {', '.join(DETECTOR_BACKENDS)}.")
+    if not os.path.isfile(weights):
+        raise FileNotFoundError(f"No weights at {weights}.")
+    if backend == "torch":
+        return weights
+    path = _export_path(weights, backend)
+    if _is_current(path, weights):
+        return path
+
+    if backend == "int8":
+        onnx_path = export_detector(weights, "onnx", imgsz)
+        videos = calibration_videos or sorted(glob.glob(DEFAULT_CALIBRATION_VIDEOS))
+        print(f"Calibrating INT8 quantization of {onnx_path} on {len(videos)} videos...")
+        tmp_path = f"{path}.{uuid.uuid4().hex}"
+        try:
+            _quantize_int8(onnx_path, tmp_path, calibration_frames(videos), imgsz)
+            _publish(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    tmp_folder, exported = _export(weights, backend, imgsz)
+    try:
+        _publish(exported.rstrip(os.sep), path)
+    finally:
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+    return path
+
+
+def load_detector(size="x", backend="torch", weights_dir=None, imgsz=640, calibration_videos=None):
+    """
+    Load a YOLOv8 detector of the given size for the given backend, exporting it first if needed.
+
+    Every backend returns an ultralytics YOLO object, so it is used like the PyTorch model,
+    e.g. by BatchInferenceEngine, and identified by `analysis_cache.model_fingerprint`.
+
+    Args:
+        size (str): One of MODEL_SIZES.
+        backend (str): One of DETECTOR_BACKENDS.
+        weights_dir (str): Folder of the weights, see `weights_path`.
+        imgsz (int): Longest input side of exported models.
+        calibration_videos (list): Videos whose frames calibrate the "int8" backend.
+
+    Returns:
+        YOLO: The detector.
+    """
+    from ultralytics import YOLO
+
+    path = export_detector(weights_path(size, weights_dir), backend, imgsz, calibration_videos)
+    return YOLO(path, task="detect")
@@ -0,0 +1,193 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from analysis_metrics import NULL_METRICS
+
+# What to write for frames with detections, from nothing to every frame at full resolution
+ARTIFACT_MODES = ("none", "thumbnails", "keyframe", "full")
+
+_BOX_COLOR = (0, 255, 0)  # BGR
+
+
+def _frame_file(key):
+    scene_index, frame_index = key
+    return f"scene_{scene_index + 1}_frame_{frame_index}.jpg"
+
+
+def draw_detections(image, detected_objects):
+    """
+    Draw labeled boxes on an image in place, much cheaper than ultralytics' Results.plot().
+
+    Args:
+        image (ndarray): BGR image, of any size.
+        detected_objects (list): Detection dicts with class_name, confidence and a bbox
+            normalized to [0, 1].
+
+    Returns:
+        ndarray: `image`.
+    """
+    height, width = image.shape[:2]
+    thickness = max(1, round(min(width, height) / 240))
+    for obj in detected_objects:
+        bbox = obj["bbox"]
+        top_left = (int(bbox["x1"] * width), int(bbox["y1"] * height))
+        bottom_right = (int(bbox["x2"] * width), int(bbox["y2"] * height))
+        cv2.rectangle(image, top_left, bottom_right, _BOX_COLOR, thickness)
+        cv2.putText(image, f"{obj['class_name']} {obj['confidence']:.2f}", (top_left[0], max(top_left[1] - 3, 10)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.35 * thickness, _BOX_COLOR, thickness)
+    return image
+
+
+class FrameArtifactWriter:
+    """
+    Writes the images of frames with detections.
+
+    Modes:
+    - "full": the annotated frame from `result.plot()` and the raw frame, at full resolution,
+      for every frame with detections.
+    - "keyframe": the same two images for one frame per scene, the one whose detections have
+      the highest summed confidence.
+    - "thumbnails": one annotated copy per frame, downscaled to `thumbnail_size` pixels on its
+      longer side with the boxes drawn by `draw_detections`.
+    - "none": nothing.
+
+    Called as writer(key, frame, detected_objects, result), from any number of threads.
+    Keyframes are picked as frames arrive. Only the best frame of the newest two scenes is held
+    in memory; older scenes are written out, and a frame that arrives after its scene's
+    keyframe was written is skipped.
+
+    Args:
+        mode (str): One of ARTIFACT_MODES.
+        annotated_folder (str): Folder for annotated images and thumbnails.
+        detected_folder (str): Folder for raw frames.
+        jpeg_quality (int): JPEG quality from 0 to 100. 95 is OpenCV's default.
+        thumbnail_size (int): Longer side of thumbnails in pixels.
+        background_threads (int): Threads that encode and write the images, so callers do not
+            wait for them. With 0 the caller writes, e.g. when it is already a writer thread of
+            AnalysisPipeline.
+        max_pending (int): Maximum number of images waiting for a background thread.
+        metrics (AnalysisMetrics): Records the time spent drawing as "plot" and encoding and
+            writing as "imwrite", and counts images_written.
+    """
+
+    def __init__(self, mode, annotated_folder, detected_folder, jpeg_quality=95, thumbnail_size=320,
+                 background_threads=0, max_pending=32, metrics=None):
+        if mode not in ARTIFACT_MODES:
+            raise ValueError(f"Unknown artifact mode {mode!r}, expected one of {', '.join(ARTIFACT_MODES)}.")
+        self.mode = mode
+        self.annotated_folder = annotated_folder
+        self.detected_folder = detected_folder
+        self.jpeg_quality = jpeg_quality
+        self.thumbnail_size = thumbnail_size
+        self.images_written = 0
+        self.metrics = metrics or NULL_METRICS
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(background_threads, thread_name_prefix="artifacts") \
+            if background_threads and mode != "none" else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._errors = []
+        self._keyframes = {}  # scene_index -> (score, key, frame, result)
+        self._written_scenes = set()
+        self._latest_scene = -1
+        self._closed = False
+
+    def __call__(self, key, frame, detected_objects, result):
+        if self._errors:
+            raise self._errors[0]
+        if self.mode == "none":
+            return
+        if self.mode == "keyframe":
+            self._offer_keyframe(key, frame, detected_objects, result)
+        elif self.mode == "thumbnails":
+            self._submit(self._write_thumbnail, key, frame, detected_objects)
+        else:
+            self._submit(self._write_full, key, frame, result)
+
+    def _submit(self, write, *args):
+        if self._executor is None:
+            write(*args)
+            return
+        # Wait for a free slot, so pending images stay bounded
+        self._slots.acquire()
+        future = self._executor.submit(write, *args)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future):
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            self._errors.append(error)
+
+    def _imwrite(self, folder, key, image):
+        with self.metrics.timer("imwrite"):
+            written = cv2.imwrite(os.path.join(folder, _frame_file(key)), image,
+                                  [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not written:
+            raise OSError(f"Could not write {_frame_file(key)} to {folder}")
+        self.metrics.count("images_written")
+        with self._lock:
+            self.images_written += 1
+
+    def _write_full(self, key, frame, result):
+        with self.metrics.timer("plot"):
+            annotated = result.plot()
+        self._imwrite(self.annotated_folder, key, annotated)
+        self._imwrite(self.detected_folder, key, frame)
+
+    def _write_thumbnail(self, key, frame, detected_objects):
+        with self.metrics.timer("plot"):
+            height, width = frame.shape[:2]
+            scale = self.thumbnail_size / max(height, width)
+            if scale < 1:
+                thumbnail = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                                       interpolation=cv2.INTER_AREA)
+            else:
+                thumbnail = frame.copy()
+            draw_detections(thumbnail, detected_objects)
+        self._imwrite(self.annotated_folder, key, thumbnail)
+
+    def _offer_keyframe(self, key, frame, detected_objects, result):
+        scene_index = key[0]
+        score = sum(obj["confidence"] for obj in detected_objects)
+        with self._lock:
+            if scene_index in self._written_scenes:
+                return
+            best = self._keyframes.get(scene_index)
+            if best is None or score > best[0]:
+                self._keyframes[scene_index] = (score, key, frame, result)
+            self._latest_scene = max(self._latest_scene, scene_index)
+            # Frames arrive in order give or take the writer threads, so older scenes are complete
+            finished = [s for s in self._keyframes if s < self._latest_scene - 1]
+            keyframes = [self._keyframes.pop(s) for s in finished]
+            self._written_scenes.update(finished)
+        for _, best_key, best_frame, best_result in keyframes:
+            self._submit(self._write_full, best_key, best_frame, best_result)
+
+    def close(self, flush=True):
+        """
+        Write the remaining keyframes and wait for the background writes.
+
+        Args:
+            flush (bool): Set to False after a failed analysis to drop the remaining keyframes
+                and not raise write errors.
+
+        Raises:
+            Exception: The first error of a background write, when flushing.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if flush:
+                with self._lock:
+                    keyframes = [self._keyframes.pop(s) for s in sorted(self._keyframes)]
+                for _, key, frame, result in keyframes:
+                    self._submit(self._write_full, key, frame, result)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+        if flush and self._errors:
+            raise self._errors[0]
@@ -0,0 +1,408 @@
+import multiprocessing
+import queue
+import threading
+from bisect import bisect_right, insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from scenedetect import FrameTimecode, SceneManager, open_video
+from scenedetect.detectors import ContentDetector
+
+from analysis_metrics import NULL_METRICS
+
+# ContentDetector's default min_scene_len. In flash-merge mode a cut can be reported up to this
+# many frames after the frame it belongs to, so the single-pass sampler holds that many frames back.
+DEFAULT_MIN_SCENE_LEN = 15
+
+# Mean ContentDetector score per frame at which the adaptive sampler matches the fixed stride
+DEFAULT_CHANGE_PER_FRAME = 4.0
+
+# Default longest distance between adaptive samples, as a multiple of the fixed stride
+ADAPTIVE_MAX_SKIP_FACTOR = 2
+
+
+def max_sample_stride(frame_skip, adaptive=False):
+    """
+    Longest distance in frames between two sampled frames of a scene.
+
+    Args:
+        frame_skip (int): Fixed stride, or the base of the adaptive sampler's defaults.
+        adaptive (bool): Whether the frames are sampled by `AdaptiveSampler` with its default
+            `max_skip`.
+
+    Returns:
+        int: The stride.
+    """
+    return frame_skip * ADAPTIVE_MAX_SKIP_FACTOR if adaptive else frame_skip
+
+
+def _frame_number(timecode):
+    # scenedetect 0.6 passes frame numbers as ints, 0.7+ passes FrameTimecode objects
+    return timecode if isinstance(timecode, int) else timecode.get_frames()
+
+
+def _scene_manager(threshold, video, detection_width):
+    scene_manager = SceneManager()
+    scene_manager.add_detector(ContentDetector(threshold=threshold))
+    if detection_width:
+        # A fixed detection size instead of scenedetect's default of at least 256 pixels wide
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = max(1, round(max(video.frame_size) / detection_width))
+    return scene_manager
+
+
+def _detect_chunk(video_path, threshold, detection_width, read_from, keep_from, keep_until, read_until):
+    # Detect cuts from read_from to read_until (the end of the video if None), and keep those in
+    # [keep_from, keep_until). Returns frame numbers, so the result pickles cheaply.
+    video = open_video(video_path)
+    if read_from:
+        video.seek(read_from)
+    scene_manager = _scene_manager(threshold, video, detection_width)
+    scene_manager.detect_scenes(video, end_time=read_until)
+    scene_list = scene_manager.get_scene_list(start_in_scene=True)
+    cuts = [_frame_number(start) for start, _ in scene_list[1:]]
+    end_frame = _frame_number(scene_list[-1][1]) if scene_list else read_from
+    return [cut for cut in cuts if keep_from <= cut and (keep_until is None or cut < keep_until)], end_frame
+
+
+def detect_scene_list(video_path, threshold=30.0, start_frame=0, detection_width=None, workers=1,
+                      chunk_overlap=2 * DEFAULT_MIN_SCENE_LEN, min_chunk_frames=1500):
+    """
+    Run PySceneDetect's ContentDetector over the video and return its scene list.
+
+    With `workers` > 1, the video is split into time chunks that are searched for cuts in
+    parallel processes. Each chunk is decoded from `chunk_overlap` frames before its start to
+    as many frames after its end, so ContentDetector has a previous frame to compare with and
+    settles cuts it reports late the same way as in one pass. Each chunk keeps only the cuts
+    inside it. The stitched cuts match a single pass, except where cuts follow each other
+    closer than the overlap around a chunk boundary.
+
+    Args:
+        video_path (str): Path to the input video file.
+        threshold (float): ContentDetector threshold.
+        start_frame (int): Frame to start detection at; the first scene starts there.
+        detection_width (int): Longer side, in pixels, of the downscaled frames ContentDetector
+            compares. Defaults to scenedetect's choice of at least 256 pixels wide. Smaller is
+            faster, but may miss cuts between similar shots.
+        workers (int): Number of processes searching chunks in parallel.
+        chunk_overlap (int): Frames decoded on both sides of a chunk in addition to the chunk.
+        min_chunk_frames (int): Chunks are not made shorter than this, so short videos use
+            fewer workers. Starting a worker process takes about a second.
+
+    Returns:
+        list: (start, end) FrameTimecode pairs, one per scene. A video without cuts is one scene.
+    """
+    video = open_video(video_path)
+    total_frames = _frame_number(video.duration)
+    # Seeking past the end would land on the last frame
+    if start_frame and start_frame >= total_frames:
+        return []
+    num_chunks = max(1, min(workers, (total_frames - start_frame) // max(1, min_chunk_frames)))
+    if num_chunks == 1:
+        if start_frame:
+            video.seek(start_frame)
+        scene_manager = _scene_manager(threshold, video, detection_width)
+        scene_manager.detect_scenes(video)
+        return scene_manager.get_scene_list(start_in_scene=True)
+
+    # The last chunk reads to the end of the video, since the container's frame count is an estimate
+    bounds = [start_frame + (total_frames - start_frame) * i // num_chunks for i in range(num_chunks)] + [None]
+    chunks = [
+        (video_path, threshold, detection_width, max(start_frame, chunk_start - chunk_overlap), chunk_start,
+         chunk_end, None if chunk_end is None else chunk_end + chunk_overlap)
+        for chunk_start, chunk_end in zip(bounds, bounds[1:])
+    ]
+    # Spawn rather than fork: the caller may already hold torch and decoder threads
+    with ProcessPoolExecutor(max_workers=num_chunks, mp_context=multiprocessing.get_context("spawn")) as executor:
+        results = list(executor.map(_detect_chunk, *zip(*chunks)))
+
+    cuts = sorted({cut for chunk_cuts, _ in results for cut in chunk_cuts})
+    end_frame = results[-1][1]
+    fps = video.frame_rate
+    scenes = [start_frame] + cuts + [end_frame]
+    return [(FrameTimecode(start, fps), FrameTimecode(end, fps)) for start, end in zip(scenes, scenes[1:])]
+
+
+class SeekingSampler:
+    """
+    Detects scenes first, then seeks to every `frame_skip`-th frame of each scene.
+
+    Iterating yields (scene_index, frame_index, frame) tuples. `scene_list` holds the
+    detected (start, end) FrameTimecode pairs once iteration has started. Pass a precomputed
+    `scene_list` to skip detection, and `scene_indices` to sample only some of its scenes.
+    `start_frame` skips the part of the video before it. `detection_width` and `scene_workers`
+    are passed to `detect_scene_list`. Seeks, reads and failed reads are recorded in `metrics`,
+    an `analysis_metrics.AnalysisMetrics`.
+    """
+
+    def __init__(self, video_path, frame_skip=24, threshold=30.0, scene_list=None, scene_indices=None,
+                 start_frame=0, metrics=None, detection_width=None, scene_workers=1):
+        self.video_path = video_path
+        self.frame_skip = frame_skip
+        self.threshold = threshold
+        self.detection_width = detection_width
+        self.scene_workers = scene_workers
+        self.scene_list = scene_list
+        self.scene_indices = scene_indices
+        self.start_frame = start_frame
+        self.metrics = metrics or NULL_METRICS
+
+    def __iter__(self):
+        if self.scene_list is None:
+            self.scene_list = detect_scene_list(self.video_path, self.threshold, self.start_frame,
+                                                detection_width=self.detection_width, workers=self.scene_workers)
+
+        scene_indices = self.scene_indices
+        if scene_indices is None:
+            scene_indices = range(len(self.scene_list))
+
+        metrics = self.metrics
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            for i in scene_indices:
+                start_time, end_time = self.scene_list[i]
+                start_frame = start_time.get_frames()
+                end_frame = end_time.get_frames()
+                frame_index = start_frame
+
+                while frame_index < end_frame:
+                    # Directly set the video capture to the desired frame
+                    with metrics.timer("seek"):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+                    with metrics.timer("read"):
+                        ret, frame = cap.read()
+                    if not ret:
+                        metrics.count("read_failures")
+                        print(f"Warning: Unable to read frame {frame_index}. Skipping...")
+                        break
+                    metrics.count("frames_read")
+                    yield i, frame_index, frame
+                    frame_index += self.frame_skip
+        finally:
+            cap.release()
+
+
+class _FrameTap:
+    """VideoStream proxy that keeps each decoded full-resolution frame for the sampler."""
+
+    def __init__(self, video):
+        self._video = video
+        self.frames = {}
+
+    def __getattr__(self, name):
+        return getattr(self._video, name)
+
+    def read(self, *args, **kwargs):
+        frame = self._video.read(*args, **kwargs)
+        # read(decode=False) only advances and returns True
+        if frame is not False and frame is not True:
+            self.frames[_frame_number(self._video.position)] = frame
+        return frame
+
+
+class _TappedContentDetector(ContentDetector):
+    """ContentDetector that reports every processed frame, its content score and every cut to a callback."""
+
+    def __init__(self, on_frame, **kwargs):
+        super().__init__(**kwargs)
+        self._on_frame = on_frame
+
+    def process_frame(self, timecode, frame_img):
+        cuts = super().process_frame(timecode, frame_img)
+        # Change to the previous frame, None for the first frame
+        score = getattr(self, "_frame_score", None)
+        self._on_frame(_frame_number(timecode), [_frame_number(cut) for cut in cuts], score)
+        return cuts
+
+    def post_process(self, timecode):
+        cuts = super().post_process(timecode)
+        self._on_frame(None, [_frame_number(cut) for cut in cuts], None)
+        return cuts
+
+
+class SinglePassSampler:
+    """
+    Finds scene cuts and samples frames in the same sequential decode, without seeking.
+
+    The video is decoded once by SceneManager (same downscaling and ContentDetector settings
+    as `detect_scene_list`, so the cuts are identical). Every decoded frame is held back for
+    `lookback` frames, which covers cuts that ContentDetector reports late, and is then
+    sampled if it lies on the `frame_skip` stride of its scene. Iterating yields the same
+    (scene_index, frame_index, frame) tuples as `SeekingSampler`; `scene_list` is set once
+    iteration finishes. `frames_decoded` and `frames_sampled` count the frames of the last run.
+    Decoding starts at `start_frame`, which also starts the first scene. The time the consumer
+    waits for each sampled frame is recorded as "decode_wait" in `metrics`.
+
+    Args:
+        video_path (str): Path to the input video file.
+        frame_skip (int): Sample every `frame_skip`-th frame of each scene.
+        threshold (float): ContentDetector threshold.
+        min_scene_len (int): ContentDetector minimum scene length, in frames.
+        queue_size (int): Maximum number of sampled frames buffered ahead of the consumer.
+        start_frame (int): Frame to start decoding at.
+        metrics (AnalysisMetrics): Where to record decoding metrics.
+    """
+
+    def __init__(self, video_path, frame_skip=24, threshold=30.0,
+                 min_scene_len=DEFAULT_MIN_SCENE_LEN, queue_size=8, start_frame=0, metrics=None):
+        self.video_path = video_path
+        self.frame_skip = frame_skip
+        self.threshold = threshold
+        self.min_scene_len = min_scene_len
+        self.lookback = min_scene_len + 1
+        self.queue_size = queue_size
+        self.start_frame = start_frame
+        self.metrics = metrics or NULL_METRICS
+        self.scene_list = None
+        self.frames_decoded = 0
+        self.frames_sampled = 0
+
+    def _reset(self):
+        self.frames_decoded = 0
+        self.frames_sampled = 0
+
+    def _should_sample(self, offset, score):
+        # offset is the frame's position within its scene
+        return offset % self.frame_skip == 0
+
+    def __iter__(self):
+        self._reset()
+        video = _FrameTap(open_video(self.video_path))
+        if self.start_frame:
+            if self.start_frame >= _frame_number(video.duration):
+                self.scene_list = []
+                return
+            video.seek(self.start_frame)
+        scene_manager = SceneManager()
+        out_queue = queue.Queue(self.queue_size)
+        stop = threading.Event()
+        pending = deque()
+        cuts = []
+        state = {"start": None, "released": -1}
+
+        def put(item):
+            # Block while the consumer is busy, but give up once it has gone away
+            while not stop.is_set():
+                try:
+                    out_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def release(frame_index, frame, score):
+            state["released"] = frame_index
+            scene_index = bisect_right(cuts, frame_index)
+            scene_start = cuts[scene_index - 1] if scene_index else state["start"]
+            self.frames_decoded += 1
+            if self._should_sample(frame_index - scene_start, score):
+                self.frames_sampled += 1
+                put((scene_index, frame_index, frame))
+
+        def on_frame(frame_index, new_cuts, score):
+            for cut in new_cuts:
+                if cut in cuts:
+                    continue
+                if cut <= state["released"]:
+                    print(f"Warning: scene cut at frame {cut} reported after frame "
+                          f"{state['released']} was sampled.")
+                insort(cuts, cut)
+            if frame_index is None:
+                return
+            if state["start"] is None:
+                state["start"] = frame_index
+            pending.append((frame_index, video.frames.pop(frame_index, None), score))
+            while len(pending) > self.lookback:
+                release(*pending.popleft())
+
+        def run():
+            try:
+                scene_manager.detect_scenes(video)
+                while pending:
+                    release(*pending.popleft())
+                self.scene_list = scene_manager.get_scene_list(start_in_scene=True)
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        scene_manager.add_detector(_TappedContentDetector(
+            on_frame, threshold=self.threshold, min_scene_len=self.min_scene_len))
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        metrics = self.metrics
+        try:
+            while True:
+                with metrics.timer("decode_wait"):
+                    item = out_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                if item[2] is not None:
+                    metrics.count("frames_read")
+                    yield item
+        finally:
+            # Unblock the decoder if the consumer stopped early
+            stop.set()
+            scene_manager.stop()
+            worker.join()
+
+
+class AdaptiveSampler(SinglePassSampler):
+    """
+    Single-pass sampler that samples densely while the picture changes and sparsely while it does not.
+
+    Reuses the per-frame score ContentDetector computes for cut detection anyway (the mean
+    HSV difference to the previous, downscaled frame), so it adds no decoding or image work.
+    Scores are summed from the last sampled frame, and a frame is sampled once the sum reaches
+    `change_threshold`, but no sooner than `min_skip` and no later than `max_skip` frames after
+    the previous sample. The first frame of every scene is always sampled.
+
+    `fixed_stride_samples` counts the frames a `frame_skip` stride would have sampled in the
+    same run, to compare inference calls against.
+
+    Args:
+        video_path (str): Path to the input video file.
+        frame_skip (int): Fixed stride the sampler is compared against, and the base for the
+            `min_skip` and `max_skip` defaults.
+        threshold (float): ContentDetector threshold.
+        change_threshold (float): Summed content score that triggers a new sample, defaults to
+            `DEFAULT_CHANGE_PER_FRAME * frame_skip`.
+        min_skip (int): Minimum distance between samples, defaults to a quarter of `frame_skip`.
+        max_skip (int): Maximum distance between samples, defaults to
+            `max_sample_stride(frame_skip, adaptive=True)`, twice `frame_skip`.
+        min_scene_len (int): ContentDetector minimum scene length, in frames.
+        queue_size (int): Maximum number of sampled frames buffered ahead of the consumer.
+        start_frame (int): Frame to start decoding at.
+        metrics (AnalysisMetrics): Where to record decoding metrics.
+    """
+
+    def __init__(self, video_path, frame_skip=24, threshold=30.0, change_threshold=None,
+                 min_skip=None, max_skip=None, min_scene_len=DEFAULT_MIN_SCENE_LEN, queue_size=8, start_frame=0,
+                 metrics=None):
+        super().__init__(video_path, frame_skip=frame_skip, threshold=threshold, min_scene_len=min_scene_len,
+                         queue_size=queue_size, start_frame=start_frame, metrics=metrics)
+        self.change_threshold = change_threshold or DEFAULT_CHANGE_PER_FRAME * frame_skip
+        self.min_skip = min_skip or max(1, frame_skip // 4)
+        self.max_skip = max_skip or max_sample_stride(frame_skip, adaptive=True)
+        self.fixed_stride_samples = 0
+        self._last_offset = 0
+        self._change = 0.0
+
+    def _reset(self):
+        super()._reset()
+        self.fixed_stride_samples = 0
+
+    def _should_sample(self, offset, score):
+        if offset % self.frame_skip == 0:
+            self.fixed_stride_samples += 1
+        if offset == 0:
+            sample = True
+        else:
+            self._change += score or 0.0
+            since = offset - self._last_offset
+            sample = since >= self.max_skip or (since >= self.min_skip and self._change >= self.change_threshold)
+        if sample:
+            self._last_offset = offset
+            self._change = 0.0
+        return sample
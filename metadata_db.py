@@ -0,0 +1,737 @@
+import csv
+import hashlib
+import io
+import json
+import os
+from itertools import repeat
+
+import cv2
+import numpy as np
+
+from columnar_metadata import ColumnarMetadata, parse_time_string
+from db_pool import get_db_connection
+from regions import grid_masks, region_query, resolve_location
+
+# One row per scene, keyed by the content hash of the video it belongs to
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS video_metadata (
+        video_id TEXT NOT NULL,
+        scene INTEGER NOT NULL,
+        start_time TIME NOT NULL,
+        end_time TIME NOT NULL,
+        objects JSONB NOT NULL,
+        class_counts JSONB NOT NULL,
+        PRIMARY KEY (video_id, scene)
+    );
+    -- Tables created before videos had ids keep their rows under 'legacy'. ALTER TABLE locks
+    -- out readers even when it changes nothing, so the catalog is checked first.
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = current_schema() AND table_name = 'video_metadata'
+                       AND column_name = 'video_id') THEN
+            ALTER TABLE video_metadata ADD COLUMN video_id TEXT NOT NULL DEFAULT 'legacy';
+        END IF;
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'video_metadata'
+                   AND column_name = 'video_id' AND column_default IS NOT NULL) THEN
+            ALTER TABLE video_metadata ALTER COLUMN video_id DROP DEFAULT;
+        END IF;
+    END $$;
+    CREATE UNIQUE INDEX IF NOT EXISTS video_metadata_video_scene_idx ON video_metadata (video_id, scene);
+    CREATE INDEX IF NOT EXISTS video_metadata_class_counts_idx ON video_metadata USING GIN (class_counts);
+
+    -- One row per detected object, bbox normalized to [0, 1] by the frame size
+    CREATE TABLE IF NOT EXISTS detections (
+        video_id TEXT NOT NULL,
+        scene INTEGER NOT NULL,
+        frame INTEGER,
+        frame_time DOUBLE PRECISION,
+        first_time DOUBLE PRECISION,
+        last_time DOUBLE PRECISION,
+        class_name TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        x1 REAL NOT NULL,
+        y1 REAL NOT NULL,
+        x2 REAL NOT NULL,
+        y2 REAL NOT NULL,
+        grid_mask BIGINT NOT NULL
+    );
+    -- Seconds into the video of the frame, and of the first and last frame of a tracked object
+    DO $$
+    DECLARE
+        time_column TEXT;
+    BEGIN
+        FOREACH time_column IN ARRAY ARRAY['frame_time', 'first_time', 'last_time'] LOOP
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                           WHERE table_schema = current_schema() AND table_name = 'detections'
+                           AND column_name = time_column) THEN
+                EXECUTE format('ALTER TABLE detections ADD COLUMN %I DOUBLE PRECISION', time_column);
+            END IF;
+        END LOOP;
+    END $$;
+    -- Grid cells each bbox overlaps (see regions.grid_masks), backfilled once for older tables
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = current_schema() AND table_name = 'detections'
+                       AND column_name = 'grid_mask') THEN
+            ALTER TABLE detections ADD COLUMN grid_mask BIGINT;
+            UPDATE detections SET grid_mask = (
+                SELECT COALESCE(bit_or(1::bigint << (cy * 8 + cx)), 0)
+                FROM generate_series(
+                         LEAST(GREATEST(floor(x1 * 8)::int, 0), 7),
+                         GREATEST(LEAST(ceil(x2 * 8)::int - 1, 7), LEAST(GREATEST(floor(x1 * 8)::int, 0), 7))) AS cx,
+                     generate_series(
+                         LEAST(GREATEST(floor(y1 * 8)::int, 0), 7),
+                         GREATEST(LEAST(ceil(y2 * 8)::int - 1, 7), LEAST(GREATEST(floor(y1 * 8)::int, 0), 7))) AS cy
+            );
+            ALTER TABLE detections ALTER COLUMN grid_mask SET NOT NULL;
+        END IF;
+    END $$;
+    -- Covering indexes: class, confidence and grid-aligned location filters are answered
+    -- without reading the table rows
+    DROP INDEX IF EXISTS detections_video_class_idx;
+    DROP INDEX IF EXISTS detections_class_idx;
+    CREATE INDEX IF NOT EXISTS detections_video_class_grid_idx ON detections (video_id, class_name, confidence)
+        INCLUDE (scene, grid_mask);
+    CREATE INDEX IF NOT EXISTS detections_class_grid_idx ON detections (class_name, confidence)
+        INCLUDE (video_id, scene, grid_mask);
+    CREATE INDEX IF NOT EXISTS detections_video_scene_idx ON detections (video_id, scene);
+
+    -- Frame size of each video, to turn normalized bboxes back into pixels
+    CREATE TABLE IF NOT EXISTS videos (
+        video_id TEXT PRIMARY KEY,
+        frame_width INTEGER,
+        frame_height INTEGER
+    );
+
+    -- Analysis cache key of the rows currently stored for each video
+    CREATE TABLE IF NOT EXISTS video_analyses (
+        video_id TEXT PRIMARY KEY,
+        analysis_key TEXT NOT NULL
+    );
+"""
+
+SCENE_COLUMNS = ["scene", "start_time", "end_time", "objects", "class_counts"]
+
+_schema_ready = False
+
+
+def compute_video_id(video_path, chunk_size=8 * 1024 * 1024):
+    """
+    Identify a video by the SHA-256 hash of its content.
+
+    Args:
+        video_path (str): Path to the video file.
+        chunk_size (int): Number of bytes hashed per read.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(video_path, "rb") as video_file:
+        for chunk in iter(lambda: video_file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_video_frame_size(video_path):
+    """Return the (width, height) of a video's frames."""
+    cap = cv2.VideoCapture(video_path)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+    if not all(frame_size):
+        raise ValueError(f"Unable to read the frame size of {video_path}.")
+    return frame_size
+
+
+def ensure_schema(cursor):
+    """
+    Create or migrate the tables, once per process.
+
+    The schema changes are committed on the cursor's connection right away, so call this
+    before the transaction's own statements. If they fail, the next call tries again.
+    """
+    global _schema_ready
+    if not _schema_ready:
+        cursor.execute(SCHEMA_SQL)
+        cursor.connection.commit()
+        _schema_ready = True
+
+
+def _scenes_as_csv(video_id, data):
+    # COPY input for one video, one CSV line per scene
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for scene in data:
+        if not all(key in scene for key in SCENE_COLUMNS):
+            raise ValueError(
+                "Invalid JSON format. Ensure all scenes contain 'scene', 'start_time', 'end_time', 'objects', and 'class_counts'.")
+        writer.writerow([
+            video_id,
+            scene['scene'],
+            scene['start_time'],
+            scene['end_time'],
+            json.dumps(scene['objects']),
+            json.dumps(scene['class_counts']),
+        ])
+    buffer.seek(0)
+    return buffer
+
+
+def _detections_as_csv(video_id, data):
+    # COPY input for the detections table, one CSV line per detected object
+    bboxes = [
+        (obj['bbox']['x1'], obj['bbox']['y1'], obj['bbox']['x2'], obj['bbox']['y2'])
+        for scene in data for obj in scene['objects']
+    ]
+    masks = iter(grid_masks(bboxes).tolist())
+
+    def seconds(obj, key):
+        # Missing in metadata written before timestamps were kept
+        return parse_time_string(obj[key]) if key in obj else None
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for scene in data:
+        for obj in scene['objects']:
+            bbox = obj['bbox']
+            writer.writerow([
+                video_id,
+                scene['scene'],
+                obj.get('frame'),
+                seconds(obj, 'time'),
+                seconds(obj, 'first_time'),
+                seconds(obj, 'last_time'),
+                obj['class_name'],
+                obj['confidence'],
+                bbox['x1'],
+                bbox['y1'],
+                bbox['x2'],
+                bbox['y2'],
+                next(masks),
+            ])
+    buffer.seek(0)
+    return buffer
+
+
+def _columnar_detections_as_csv(video_id, columns):
+    # Same rows as _detections_as_csv, built column-wise from the arrays
+    frames = [None if frame < 0 else frame for frame in columns.object_frame.tolist()]
+    times = [None if np.isnan(time) else time for time in columns.object_time.tolist()]
+    if columns.tracked:
+        first_times, last_times = columns.object_first_time.tolist(), columns.object_last_time.tolist()
+    else:
+        first_times = last_times = repeat(None)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(zip(
+        repeat(video_id),
+        columns.scene_number[columns.object_scene].tolist(),
+        frames,
+        times,
+        first_times,
+        last_times,
+        np.asarray(columns.classes, dtype=object)[columns.object_class].tolist(),
+        columns.object_confidence.tolist(),
+        *columns.object_bbox.T.tolist(),
+        grid_masks(columns.object_bbox).tolist(),
+    ))
+    buffer.seek(0)
+    return buffer
+
+
+def _normalize_pixel_bboxes(data, frame_size):
+    # Metadata written before bboxes were normalized holds pixel coordinates
+    if not any(obj['bbox']['x2'] > 1.01 or obj['bbox']['y2'] > 1.01 for scene in data for obj in scene['objects']):
+        return
+    if frame_size is None:
+        raise ValueError("The metadata has pixel bboxes; frame_size or video_path is required to normalize them.")
+    width, height = frame_size
+    for scene in data:
+        for obj in scene['objects']:
+            bbox = obj['bbox']
+            obj['bbox'] = {
+                'x1': bbox['x1'] / width,
+                'y1': bbox['y1'] / height,
+                'x2': bbox['x2'] / width,
+                'y2': bbox['y2'] / height,
+            }
+
+
+def _read_metadata(path, frame_size=None):
+    # A columnar metadata folder is memory-mapped, a JSON file is parsed
+    if os.path.isdir(path):
+        return ColumnarMetadata(path)
+    with open(path, 'r') as file:
+        data = json.load(file)
+    _normalize_pixel_bboxes(data, frame_size)
+    return data
+
+
+def _replace_video_rows(cursor, video_id, data, frame_size, analysis_key=None):
+    if isinstance(data, ColumnarMetadata):
+        detections = _columnar_detections_as_csv(video_id, data)
+        # The scene rows still hold every object as JSON
+        scenes = _scenes_as_csv(video_id, data.to_scene_metadata())
+        frame_size = frame_size or data.frame_size
+    else:
+        scenes = _scenes_as_csv(video_id, data)
+        detections = _detections_as_csv(video_id, data)
+    width, height = frame_size or (None, None)
+    # Serialize concurrent ingests of the same video; other videos are not blocked
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (video_id,))
+    cursor.execute("DELETE FROM video_metadata WHERE video_id = %s", (video_id,))
+    cursor.execute("DELETE FROM detections WHERE video_id = %s", (video_id,))
+    cursor.copy_expert(
+        "COPY video_metadata (video_id, scene, start_time, end_time, objects, class_counts) FROM STDIN WITH (FORMAT csv)",
+        scenes
+    )
+    cursor.copy_expert(
+        "COPY detections (video_id, scene, frame, frame_time, first_time, last_time, class_name, confidence, "
+        "x1, y1, x2, y2, grid_mask) "
+        "FROM STDIN WITH (FORMAT csv)",
+        detections
+    )
+    cursor.execute(
+        "INSERT INTO videos (video_id, frame_width, frame_height) VALUES (%s, %s, %s) "
+        "ON CONFLICT (video_id) DO UPDATE SET frame_width = EXCLUDED.frame_width, frame_height = EXCLUDED.frame_height",
+        (video_id, width, height)
+    )
+    if analysis_key is None:
+        cursor.execute("DELETE FROM video_analyses WHERE video_id = %s", (video_id,))
+    else:
+        cursor.execute(
+            "INSERT INTO video_analyses (video_id, analysis_key) VALUES (%s, %s) "
+            "ON CONFLICT (video_id) DO UPDATE SET analysis_key = EXCLUDED.analysis_key",
+            (video_id, analysis_key)
+        )
+
+
+def insert_metadata_into_db(json_file_path, video_id=None, video_path=None, frame_size=None, analysis_key=None):
+    """
+    Store the scene metadata of one video, replacing any rows previously stored for it.
+
+    Rows of other videos are left untouched. Scenes go to `video_metadata` and every detected
+    object also goes to the normalized `detections` table, each loaded with a single COPY in
+    one transaction, so a failed ingest leaves the previous rows of the video in place.
+
+    Args:
+        json_file_path (str): Metadata JSON written by `detect_scenes_and_objects`, or the
+            columnar folder written next to it (see `columnar_metadata.columnar_path`).
+        video_id (str): Id of the video, e.g. from `compute_video_id`.
+        video_path (str): Path to the video, hashed to get its id when `video_id` is not given
+            and probed for its frame size when `frame_size` is not known.
+        frame_size (tuple): (width, height) of the video frames, stored in the `videos` table.
+            Defaults to the size recorded in columnar metadata. Required, or `video_path`, for
+            metadata written before bboxes were normalized, which holds pixel coordinates.
+        analysis_key (str): Analysis cache key the metadata came from, see `stored_analysis_key`.
+
+    Returns:
+        str: The video id the rows were stored under.
+    """
+    if video_id is None:
+        if video_path is None:
+            raise ValueError("video_path is required unless video_id is given.")
+        video_id = compute_video_id(video_path)
+    if frame_size is None and video_path is not None:
+        frame_size = get_video_frame_size(video_path)
+
+    # Load metadata
+    data = _read_metadata(json_file_path, frame_size)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_schema(cursor)
+            _replace_video_rows(cursor, video_id, data, frame_size, analysis_key)
+    return video_id
+
+
+def video_frame_size(video_id):
+    """
+    Return the (width, height) stored for a video, or None if it is not known.
+
+    Bboxes are stored normalized to [0, 1]; multiply by this size to get pixels.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_schema(cursor)
+            cursor.execute("SELECT frame_width, frame_height FROM videos WHERE video_id = %s", (video_id,))
+            row = cursor.fetchone()
+    return tuple(row) if row and row[0] is not None else None
+
+
+def stored_analysis_key(video_id):
+    """
+    Return the analysis cache key of the rows stored for a video.
+
+    Lets a cache hit skip the ingest when the database already holds the same analysis.
+
+    Args:
+        video_id (str): Id of the video.
+
+    Returns:
+        str: The key passed to `insert_metadata_into_db`, or None if the video has no rows or
+            they were stored without a key.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_schema(cursor)
+            cursor.execute("SELECT analysis_key FROM video_analyses WHERE video_id = %s", (video_id,))
+            row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def bulk_insert_metadata_into_db(metadata_files):
+    """
+    Store the metadata of many videos over one connection, one transaction per video.
+
+    Args:
+        metadata_files (iterable): (video_id, json_file_path, frame_size) tuples. The path may
+            also be a columnar metadata folder, and frame_size None if it is not known.
+
+    Returns:
+        int: Number of scene rows written.
+    """
+    rows = 0
+    with get_db_connection() as conn:
+        for video_id, json_file_path, frame_size in metadata_files:
+            data = _read_metadata(json_file_path, frame_size)
+            with conn.cursor() as cursor:
+                ensure_schema(cursor)
+                _replace_video_rows(cursor, video_id, data, frame_size)
+            conn.commit()
+            rows += len(data)
+    return rows
+
+
+def fetch_scenes_from_db(object_class=None, confidence_threshold=50, location=None, min_class_counts=None, video_id=None,
+                         use_detections=True, prepared=True):
+    """
+    Fetch scenes from the database with optional filters for object class, confidence, location, and class counts.
+
+    The object filters are matched against the `detections` table and must all hold for the
+    same detected object.
+
+    Args:
+        object_class (str): The class name of the object to filter by (e.g., 'person').
+        confidence_threshold (float): Minimum confidence level for filtering objects.
+        location (tuple or str): Bounding box (x1, y1, x2, y2), normalized to [0, 1], that the
+            object must lie within, or a quadrant name from `regions.QUADRANTS`.
+        min_class_counts (dict): A dictionary where keys are class names and values are the minimum counts required.
+        video_id (str): Only search the scenes of this video.
+        use_detections (bool): Set to False to run the previous query over the `objects` JSONB
+            column instead, where each filter may match a different object.
+        prepared (bool): Run detections queries as server-side prepared statements, planned
+            once per filter shape and pooled connection.
+
+    Returns:
+        list: Filtered scenes as dicts with scene, start_time, end_time and video_id, ordered by
+            video id and scene.
+    """
+    if use_detections:
+        query, params = _detections_query(object_class, confidence_threshold, location, min_class_counts, video_id)
+    else:
+        query, params = _jsonb_query(object_class, confidence_threshold, location, min_class_counts, video_id)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_schema(cursor)
+            # Execute query
+            if use_detections and prepared:
+                execute_prepared(cursor, query, params)
+            else:
+                cursor.execute(query, params)
+
+            # Fetch results
+            scenes = cursor.fetchall()
+
+    scene_list = [
+        {
+            "scene": row[0],
+            "start_time": row[1].strftime("%H:%M:%S"),  # Convert to string
+            "end_time": row[2].strftime("%H:%M:%S"),  # Convert to string
+            "video_id": row[3]
+        }
+        for row in scenes
+    ]
+
+    print(json.dumps(scene_list, indent=4))
+    return scene_list
+
+
+def fetch_time_spans_from_db(object_class=None, confidence_threshold=50, location=None, min_class_counts=None,
+                             video_id=None, max_gap=1.0, padding=0.5, prepared=True):
+    """
+    Fetch the time spans in which a detected object matches the filters, instead of whole scenes.
+
+    Takes the same filters as `fetch_scenes_from_db`. Every matching detection marks the time of
+    its frame, and a tracked object the time from its first to its last frame. Within a scene,
+    marks at most `max_gap` seconds apart are merged into one span, which is then widened by
+    `padding` seconds on each side without leaving the scene. Detections stored without
+    timestamps, by analyses that did not record them, are not searched.
+
+    Args:
+        object_class (str): The class name of the object to filter by (e.g., 'person').
+        confidence_threshold (float): Minimum confidence level for filtering objects.
+        location (tuple or str): Bounding box (x1, y1, x2, y2), normalized to [0, 1], that the
+            object must lie within, or a quadrant name from `regions.QUADRANTS`.
+        min_class_counts (dict): Minimum class counts of the scene a span lies in.
+        video_id (str): Only search the scenes of this video.
+        max_gap (float): Longest gap, in seconds, bridged within a span. Should be at least the
+            time between sampled frames (frame_skip / fps), or every sampled frame becomes a span.
+        padding (float): Seconds added before and after each span. Spans closer than twice the
+            padding are merged, so padded spans never overlap.
+        prepared (bool): Run the query as a server-side prepared statement.
+
+    Returns:
+        list: Spans as dicts with scene, start_time, end_time and video_id, ordered by video id,
+            scene and start. Times are "H:MM:SS.ffffff", so the spans can be passed to `create_subclips`.
+    """
+    query, params = _time_spans_query(object_class, confidence_threshold, location, min_class_counts, video_id,
+                                      max(max_gap, 2 * padding), padding)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            ensure_schema(cursor)
+            if prepared:
+                execute_prepared(cursor, query, params)
+            else:
+                cursor.execute(query, params)
+            spans = cursor.fetchall()
+
+    span_list = [
+        {
+            "scene": row[0],
+            "start_time": _span_time(row[1]),
+            "end_time": _span_time(row[2]),
+            "video_id": row[3]
+        }
+        for row in spans
+    ]
+    return span_list
+
+
+def _span_time(seconds):
+    # Keeps the fraction that the scene times drop, in a format parse_timestamp reads
+    seconds = max(seconds, 0.0)
+    return f"{int(seconds // 3600)}:{int(seconds % 3600 // 60):02d}:{seconds % 60:09.6f}"
+
+
+def execute_prepared(cursor, query, params):
+    """
+    Run a query as a server-side prepared statement.
+
+    The statement is named after the query text, so every filter shape is prepared once per
+    connection and later calls only send EXECUTE with the parameter values.
+
+    Args:
+        cursor: Cursor of a pooled connection.
+        query (str): Query with %s placeholders.
+        params (list): Values for the placeholders.
+    """
+    conn = cursor.connection
+    name = "freeze_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+    if name not in conn.prepared:
+        # Swap psycopg2 placeholders for PostgreSQL's positional parameters
+        parts = query.split("%s")
+        positional = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+        cursor.execute(f"PREPARE {name} AS {positional}")
+        conn.prepared.add(name)
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+def _class_count_filters(min_class_counts):
+    query = ""
+    params = []
+    if min_class_counts:
+        for class_name, min_count in min_class_counts.items():
+            query += """
+                AND COALESCE((m.class_counts->>%s::text)::int, 0) >= %s
+            """
+            params.extend([class_name, min_count])
+            if min_count > 0:
+                # Key-existence check the GIN index on class_counts can answer
+                query += """
+                    AND m.class_counts ? %s::text
+                """
+                params.append(class_name)
+    return query, params
+
+
+def _detection_conditions(object_class, confidence_threshold, location):
+    # Conditions on one row of detections d
+    conditions = []
+    params = []
+    if object_class:
+        conditions.append("d.class_name = %s")
+        params.append(object_class)
+    if confidence_threshold is not None:
+        conditions.append("d.confidence >= %s")
+        params.append(confidence_threshold)
+    region = region_query(location)
+    if region:
+        (x1, y1, x2, y2), outside, exact = region
+        if exact:
+            # Grid-aligned regions such as the quadrants are decided by the grid cells alone,
+            # which the covering indexes hold
+            conditions.append("(d.grid_mask & %s) = 0")
+            params.append(outside)
+        else:
+            conditions.append("d.x1 >= %s AND d.y1 >= %s AND d.x2 <= %s AND d.y2 <= %s")
+            params.extend([x1, y1, x2, y2])
+    return conditions, params
+
+
+def _detections_query(object_class, confidence_threshold, location, min_class_counts, video_id):
+    query = """
+        SELECT m.scene, m.start_time, m.end_time, m.video_id
+        FROM video_metadata m
+        WHERE 1=1
+    """
+    params = []
+
+    # Restrict to one video
+    if video_id:
+        query += """
+            AND m.video_id = %s
+        """
+        params.append(video_id)
+
+    # All object filters apply to the same detection
+    conditions, condition_params = _detection_conditions(object_class, confidence_threshold, location)
+    params.extend(condition_params)
+    if conditions:
+        query += """
+            AND EXISTS (
+                SELECT 1 FROM detections d
+                WHERE d.video_id = m.video_id AND d.scene = m.scene
+                AND {}
+            )
+        """.format(" AND ".join(conditions))
+
+    count_query, count_params = _class_count_filters(min_class_counts)
+    query += count_query
+    params.extend(count_params)
+
+    query += """
+        ORDER BY m.video_id, m.scene
+    """
+    return query, params
+
+
+def _time_spans_query(object_class, confidence_threshold, location, min_class_counts, video_id, merge_gap, padding):
+    conditions, params = _detection_conditions(object_class, confidence_threshold, location)
+    if video_id:
+        conditions.insert(0, "d.video_id = %s")
+        params.insert(0, video_id)
+    # Gaps and islands: a mark starts a new span unless it begins within merge_gap of the
+    # latest end among the earlier marks of its scene, and the running count of span starts
+    # numbers the spans
+    query = """
+        WITH marks AS (
+            SELECT d.video_id, d.scene,
+                   COALESCE(d.first_time, d.frame_time) AS mark_start,
+                   COALESCE(d.last_time, d.frame_time) AS mark_end
+            FROM detections d
+            WHERE d.frame_time IS NOT NULL
+            {}
+        ), starts AS (
+            SELECT video_id, scene, mark_start, mark_end,
+                   CASE WHEN mark_start - max(mark_end) OVER earlier <= %s THEN 0 ELSE 1 END AS new_span
+            FROM marks
+            WINDOW earlier AS (PARTITION BY video_id, scene ORDER BY mark_start, mark_end
+                               ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+        ), spans AS (
+            SELECT video_id, scene, mark_start, mark_end,
+                   sum(new_span) OVER (PARTITION BY video_id, scene ORDER BY mark_start, mark_end
+                                       ROWS UNBOUNDED PRECEDING) AS span
+            FROM starts
+        )
+        SELECT s.scene,
+               GREATEST(min(s.mark_start) - %s, EXTRACT(EPOCH FROM m.start_time)::double precision),
+               LEAST(max(s.mark_end) + %s, EXTRACT(EPOCH FROM m.end_time)::double precision),
+               s.video_id
+        FROM spans s
+        JOIN video_metadata m ON m.video_id = s.video_id AND m.scene = s.scene
+        WHERE 1=1
+    """.format("\n            ".join(f"AND {condition}" for condition in conditions))
+    params.extend([merge_gap, padding, padding])
+    if video_id:
+        # Repeated for the scene rows, which the planner would otherwise scan in full
+        query += """
+            AND m.video_id = %s
+        """
+        params.append(video_id)
+
+    count_query, count_params = _class_count_filters(min_class_counts)
+    query += count_query
+    params.extend(count_params)
+
+    query += """
+        GROUP BY s.video_id, s.scene, s.span, m.start_time, m.end_time
+        ORDER BY s.video_id, s.scene, 2
+    """
+    return query, params
+
+
+def _jsonb_query(object_class, confidence_threshold, location, min_class_counts, video_id):
+    # Base query
+    query = """
+        SELECT scene, start_time, end_time, video_id
+        FROM video_metadata m
+        WHERE 1=1
+    """
+    params = []
+
+    # Restrict to one video
+    if video_id:
+        query += """
+            AND video_id = %s
+        """
+        params.append(video_id)
+
+    # Add filters for object class
+    if object_class:
+        query += """
+            AND jsonb_path_exists(
+                objects,
+                %s
+            )
+        """
+        params.append(f'$[*] ? (@.class_name == "{object_class}")')
+
+    # Add filters for confidence
+    if confidence_threshold is not None:
+        query += """
+            AND jsonb_path_exists(
+                objects,
+                %s
+            )
+        """
+        params.append(f'$[*] ? (@.confidence >= {confidence_threshold})')
+
+    # Add filters for location
+    location = resolve_location(location)
+    if location:
+        x1, y1, x2, y2 = location
+        query += """
+            AND jsonb_path_exists(
+                objects,
+                %s
+            )
+        """
+        params.append(f'$[*] ? (@.bbox.x1 >= {x1} && @.bbox.y1 >= {y1} && @.bbox.x2 <= {x2} && @.bbox.y2 <= {y2})')
+
+    # Add filters for min class counts
+    count_query, count_params = _class_count_filters(min_class_counts)
+    query += count_query
+    params.extend(count_params)
+
+    query += """
+        ORDER BY video_id, scene
+    """
+    return query, params
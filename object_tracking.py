@@ -0,0 +1,130 @@
+def bbox_iou(a, b):
+    """Intersection over union of two {"x1", "y1", "x2", "y2"} boxes."""
+    width = min(a["x2"], b["x2"]) - max(a["x1"], b["x1"])
+    height = min(a["y2"], b["y2"]) - max(a["y1"], b["y1"])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area_a = (a["x2"] - a["x1"]) * (a["y2"] - a["y1"])
+    area_b = (b["x2"] - b["x1"]) * (b["y2"] - b["y1"])
+    return intersection / (area_a + area_b - intersection)
+
+
+def _center_distance(a, b):
+    # Distance between box centers, relative to the larger side of box a
+    dx = (a["x1"] + a["x2"] - b["x1"] - b["x2"]) / 2
+    dy = (a["y1"] + a["y2"] - b["y1"] - b["y2"]) / 2
+    size = max(a["x2"] - a["x1"], a["y2"] - a["y1"], 1e-9)
+    return (dx * dx + dy * dy) ** 0.5 / size
+
+
+class IoUTracker:
+    """
+    Greedy IoU/centroid tracker that merges the detections of one scene into distinct objects.
+
+    Frames are fed in order with `update`. Each detection joins the open track of the same class
+    whose last box overlaps it most (IoU of at least `iou_threshold`). Failing that it joins the
+    track whose last box center is within `max_center_distance` box sizes, which catches objects
+    that moved a lot between sparse samples. Unmatched detections start new tracks, and tracks
+    that go unmatched for more than `max_missed` sampled frames are closed.
+
+    Args:
+        iou_threshold (float): Minimum IoU to continue a track.
+        max_center_distance (float): Maximum center distance, in multiples of the track's box
+            size, to continue a track without overlap.
+        max_missed (int): Number of sampled frames a track may go undetected before closing.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_center_distance=1.0, max_missed=2):
+        self.iou_threshold = iou_threshold
+        self.max_center_distance = max_center_distance
+        self.max_missed = max_missed
+        self._open = []
+        self._closed = []
+        self._frames_seen = 0
+
+    def update(self, frame_index, detected_objects):
+        """
+        Associate the detections of the next sampled frame with the open tracks.
+
+        Args:
+            frame_index (int): Index of the frame in the video.
+            detected_objects (list): Detection dicts with class_name, confidence and bbox.
+        """
+        self._frames_seen += 1
+        candidates = []
+        for t, track in enumerate(self._open):
+            for d, obj in enumerate(detected_objects):
+                if obj["class_name"] != track["class_name"]:
+                    continue
+                iou = bbox_iou(track["last_bbox"], obj["bbox"])
+                if iou >= self.iou_threshold:
+                    candidates.append((0, -iou, t, d))
+                else:
+                    distance = _center_distance(track["last_bbox"], obj["bbox"])
+                    if distance <= self.max_center_distance:
+                        candidates.append((1, distance, t, d))
+
+        # Best overlaps first, then nearest centers
+        candidates.sort()
+        matched_tracks, matched_objects = set(), set()
+        for _, _, t, d in candidates:
+            if t in matched_tracks or d in matched_objects:
+                continue
+            matched_tracks.add(t)
+            matched_objects.add(d)
+            self._extend(self._open[t], frame_index, detected_objects[d])
+
+        still_open = []
+        for t, track in enumerate(self._open):
+            if t in matched_tracks or self._frames_seen - track["last_seen"] <= self.max_missed:
+                still_open.append(track)
+            else:
+                self._closed.append(track)
+        self._open = still_open
+
+        for d, obj in enumerate(detected_objects):
+            if d not in matched_objects:
+                self._open.append(self._new_track(frame_index, obj))
+
+    def _new_track(self, frame_index, obj):
+        return {
+            "class_name": obj["class_name"],
+            "best": obj,
+            "best_frame": frame_index,
+            "first_frame": frame_index,
+            "last_frame": frame_index,
+            "last_bbox": obj["bbox"],
+            "last_seen": self._frames_seen,
+            "detections": 1,
+        }
+
+    def _extend(self, track, frame_index, obj):
+        track["last_frame"] = frame_index
+        track["last_bbox"] = obj["bbox"]
+        track["last_seen"] = self._frames_seen
+        track["detections"] += 1
+        if obj["confidence"] > track["best"]["confidence"]:
+            track["best"] = obj
+            track["best_frame"] = frame_index
+
+    def tracks(self):
+        """
+        Return every track, ordered by the frame it was first seen in.
+
+        Returns:
+            list: Dicts with the best-confidence detection of the track (class_name,
+                confidence, bbox, frame) plus first_frame, last_frame and the number of
+                detections merged into it.
+        """
+        tracks = sorted(self._closed + self._open, key=lambda track: track["first_frame"])
+        return [
+            {
+                "frame": track["best_frame"],
+                **track["best"],
+                "first_frame": track["first_frame"],
+                "last_frame": track["last_frame"],
+                "detections": track["detections"],
+            }
+            for track in tracks
+        ]
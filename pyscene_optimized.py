@@ -1,19 +1,30 @@
 import os
 import cv2
 import datetime
+from bisect import bisect_right
 from tqdm import tqdm
-from ultralytics import YOLO
-from scenedetect import SceneManager, open_video
-from scenedetect.detectors import ContentDetector
 import time
 from datetime import timedelta
-import psycopg2
 import json
-from moviepy.video.io.VideoFileClip import VideoFileClip
-import torch
+from analysis_cache import AnalysisCache, model_fingerprint
+from analysis_metrics import AnalysisMetrics
+from analysis_pipeline import AnalysisPipeline
+from clip_extraction import create_subclips
+from columnar_metadata import columnar_path, write_columnar_metadata
+from object_tracking import IoUTracker
+from batch_inference import BatchInferenceEngine
+from db_pool import pool_metrics
+from frame_artifacts import FrameArtifactWriter
+from metadata_db import (
+    bulk_insert_metadata_into_db,
+    compute_video_id,
+    fetch_scenes_from_db,
+    fetch_time_spans_from_db,
+    get_video_frame_size,
+    insert_metadata_into_db,
+    stored_analysis_key,
+)
 
-# Base line version of Streamlit
-print(torch.backends.mps.is_available())
 
 def get_video_fps(video_path):
     cap = cv2.VideoCapture(video_path)
@@ -21,291 +32,353 @@ def get_video_fps(video_path):
     cap.release()
     return fps
 
-def detect_scenes_and_objects(model, video_path, base_output_folder, fps, metadata_file_prefix="video_metadata", frame_skip = 24):
-    """
-    Optimized function for scene detection and object detection using PySceneDetect and YOLOv8.
+def get_video_frame_count(video_path):
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
 
-    Args:
-        model (YOLO): Pre-trained YOLOv8 model for object detection.
-        video_path (str): Path to the input video file.
-        base_output_folder (str): Base path for output folders and metadata files.
-        fps (int): Frames per second of the original video.
-        metadata_file_prefix (str): Prefix for the metadata file.
-        frame_skip (int): Number of frames to skip during object detection.
+def _create_output_paths(base_output_folder, metadata_file_prefix, run_name=None):
+    """Create this run's frame folders and return them with the metadata JSON path.
 
-    Returns:
-        None
+    Names end in `run_name`, or in a timestamp if it is not given.
     """
-    print("fps:" , fps)
-    # Start timing
-    exec_start_time = time.time()
-
-    # Create output folders
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = run_name or datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     annotated_folder = os.path.join(base_output_folder, f"annotated_frames_{timestamp}")
     detected_folder = os.path.join(base_output_folder, f"frames_with_objects_{timestamp}")
     metadata_json_path = os.path.join(base_output_folder, f"{metadata_file_prefix}_{timestamp}.json")
 
     os.makedirs(annotated_folder, exist_ok=True)
     os.makedirs(detected_folder, exist_ok=True)
+    return annotated_folder, detected_folder, metadata_json_path
 
-    # Initialize PySceneDetect for scene detection
-    video = open_video(video_path)
-    scene_manager = SceneManager()
-    scene_manager.add_detector(ContentDetector(threshold=30.0))  # Adjust threshold as needed
-    scene_manager.detect_scenes(video)
-    scene_list = scene_manager.get_scene_list()
-
-    scene_metadata = []
-
-    print("Processing scenes...")
-    cap = cv2.VideoCapture(video_path)
-
-    for i, scene in enumerate(tqdm(scene_list)):
-        start_time, end_time = scene
-        scene_data = {
-            "scene": i + 1,
-            # "start_time": str(start_time.get_seconds()),
-            # "end_time": str(end_time.get_seconds()),
-            "start_time": str(timedelta(seconds=start_time.get_seconds())),
-            "end_time": str(timedelta(seconds=end_time.get_seconds())),
-            "objects": [],
-            "class_counts": {}  # New field to store object counts
-        }
-
-        # Get frame ranges
-        start_frame = start_time.get_frames()
-        end_frame = end_time.get_frames()
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-
-        frame_index = start_frame
-
-        while frame_index < end_frame:
-            # # Skip frames for faster processing
-            # if (frame_index - start_frame) % frame_skip != 0:
-            #     frame_index += 1
-            #     cap.read()  # Move to the next frame
-            #     continue
-            # Directly set the video capture to the desired frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-
-            ret, frame = cap.read()
-            if not ret:
-                print(f"Warning: Unable to read frame {frame_index}. Skipping...")
-                break
-
-            frame_file = f"scene_{i + 1}_frame_{frame_index}.jpg"
-            frame_path = os.path.join(detected_folder, frame_file)
-
-            detected_objects = []
-
-            # Perform object detection
-            try:
-                results = model(frame, device="mps")
-                for box in results[0].boxes:
-                    class_id = int(box.cls[0])
-                    class_name = model.names[class_id]  # Map class ID to real-world name
-                    confidence = float(box.conf[0])
-                    bbox = box.xyxy[0].tolist()
-                    detected_objects.append({
-                        # "class_id": class_id,
-                        "class_name": class_name,
-                        "confidence": confidence,
-                        "bbox": {
-                            "x1": float(bbox[0]),
-                            "y1": float(bbox[1]),
-                            "x2": float(bbox[2]),
-                            "y2": float(bbox[3]),
-                        },
-                    })
-                    # Update class count
-                    if class_name not in scene_data["class_counts"]:
-                        scene_data["class_counts"][class_name] = 0
-                    scene_data["class_counts"][class_name] += 1
-            except Exception as e:
-                print(f"Detection error: {e}")
-
-            # Annotate and save frame if objects are detected
-            if detected_objects:
-                annotated_img = results[0].plot()
-                annotated_path = os.path.join(annotated_folder, frame_file)
-                cv2.imwrite(annotated_path, annotated_img)
-                cv2.imwrite(frame_path, frame)
-
-                # Append detected objects to scene metadata
-                scene_data["objects"].extend(detected_objects)
-            # Skip frames directly by updating frame index
-            frame_index += frame_skip
-
-        scene_metadata.append(scene_data)
-
-    cap.release()
-
+def _write_metadata(scene_metadata, metadata_json_path, columnar=True, frame_size=None):
     # Save metadata to JSON
     with open(metadata_json_path, 'w') as json_file:
         json.dump(scene_metadata, json_file, indent=4)
+    # And as memory-mappable columns next to it, for ingest and offline search
+    if columnar:
+        write_columnar_metadata(scene_metadata, columnar_path(metadata_json_path), frame_size)
 
+def _print_processing_time(exec_start_time):
     # End timing
     exec_end_time = time.time()
-    print(f"Scene detection and object detection completed. Metadata saved to {metadata_json_path}")
     # Calculate total processing time
     total_time = exec_end_time - exec_start_time
-    # print(f"Total time: {total_time}")
     # Convert total time to hours, minutes, seconds
     hours, remainder = divmod(total_time, 3600)
     minutes, seconds = divmod(remainder, 60)
     print(f"Total processing time: {int(hours)}h {int(minutes)}m {seconds:.2f}s")
-    return metadata_json_path
 
-# Database connection details
-DB_HOST = "localhost"
-DB_NAME = "video_metadata"
-DB_USER = "video_user_1"
-DB_PASS = "user1password"
-
-def insert_metadata_into_db(json_file_path):
-    # Connect to PostgreSQL
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM video_metadata")
-    # Load JSON metadata
-    with open(json_file_path, 'r') as file:
-        data = json.load(file)
-
-    # Insert each scene into the database
-    for scene in data:
-        if not all(key in scene for key in ["scene", "start_time", "end_time", "objects", "class_counts"]):
-            raise ValueError(
-                "Invalid JSON format. Ensure all scenes contain 'scene', 'start_time', 'end_time', 'objects', and 'class_counts'.")
-        cursor.execute(
-            """
-            INSERT INTO video_metadata (scene, start_time, end_time, objects, class_counts)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
-            (scene['scene'],
-             scene['start_time'],
-             scene['end_time'],
-             json.dumps(scene['objects']),
-             json.dumps(scene['class_counts'])) # Convert dictionary to JSON
-        )
-
-    # Commit and close connection
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-def fetch_scenes_from_db(object_class=None, confidence_threshold=50, location=None, min_class_counts=None):
+def _analyze_frames(sampler, engine, write_artifacts, show_progress=True, on_result=None):
     """
-    Fetch scenes from the database with optional filters for object class, confidence, location, and class counts.
+    Run every sampled frame through the inference engine on the calling thread.
+
+    `on_result(key, detected_objects)`, if given, is called for every sampled frame in order.
+
+    Returns:
+        list: (frame_index, detected_objects) pairs for every frame with detections.
+    """
+    frame_detections = []
+
+    def handle_batch(completed):
+        for key, frame, detected_objects, result in completed:
+            if on_result is not None:
+                on_result(key, detected_objects)
+            # Annotate and save frame if objects are detected
+            if detected_objects:
+                write_artifacts(key, frame, detected_objects, result)
+                frame_detections.append((key[1], detected_objects))
+
+    for scene_index, frame_index, frame in tqdm(sampler, unit="frame", disable=not show_progress):
+        # Perform object detection once a batch of sampled frames is full
+        handle_batch(engine.submit((scene_index, frame_index), frame))
+    handle_batch(engine.flush())
+    return frame_detections
+
+def _frame_time(frame_index, scene_start):
+    # Timestamp of a frame, in the same format as the scene start and end times
+    from scenedetect import FrameTimecode
+    return str(timedelta(seconds=FrameTimecode(frame_index, scene_start).get_seconds()))
+
+def _build_scene_metadata(scene_list, frame_detections, track_objects=True):
+    """
+    Assemble per-scene metadata from the detections of every sampled frame.
 
     Args:
-        object_class (str): The class name of the object to filter by (e.g., 'person').
-        confidence_threshold (float): Minimum confidence level for filtering objects.
-        location (tuple): Bounding box (x1, y1, x2, y2) to filter objects within a specific region.
-        min_class_counts (dict): A dictionary where keys are class names and values are the minimum counts required.
+        scene_list (list): (start, end) FrameTimecode pairs from scene detection.
+        frame_detections (list): (frame_index, detected_objects) pairs in frame order.
+        track_objects (bool): Merge the detections of each scene into tracks of distinct
+            objects, so `objects` holds one entry per object and `class_counts` counts objects.
+            If False, every detection is kept and counted.
 
     Returns:
-        list: Filtered scenes with metadata.
+        list: One metadata dict per scene.
     """
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
-    cursor = conn.cursor()
-
-    # Base query
-    query = """
-        SELECT scene, start_time, end_time
-        FROM video_metadata
-        WHERE 1=1
+    scene_metadata = []
+    scene_starts = []
+    trackers = []
+    for i, (start_time, end_time) in enumerate(scene_list):
+        scene_metadata.append({
+            "scene": i + 1,
+            # "start_time": str(start_time.get_seconds()),
+            # "end_time": str(end_time.get_seconds()),
+            "start_time": str(timedelta(seconds=start_time.get_seconds())),
+            "end_time": str(timedelta(seconds=end_time.get_seconds())),
+            "objects": [],
+            "class_counts": {}  # New field to store object counts
+        })
+        scene_starts.append(start_time.get_frames())
+        trackers.append(IoUTracker() if track_objects else None)
+
+    for frame_index, detected_objects in frame_detections:
+        scene_index = bisect_right(scene_starts, frame_index) - 1
+        if scene_index < 0 or frame_index >= scene_list[scene_index][1].get_frames():
+            continue
+        if track_objects:
+            trackers[scene_index].update(frame_index, detected_objects)
+            continue
+        scene_data = scene_metadata[scene_index]
+        frame_time = _frame_time(frame_index, scene_list[scene_index][0])
+        for obj in detected_objects:
+            # Update class count
+            class_name = obj["class_name"]
+            if class_name not in scene_data["class_counts"]:
+                scene_data["class_counts"][class_name] = 0
+            scene_data["class_counts"][class_name] += 1
+            # Append detected object to scene metadata, keeping the frame it was seen in and its time
+            scene_data["objects"].append({"frame": frame_index, "time": frame_time, **obj})
+
+    if track_objects:
+        for scene_data, tracker, (start_time, _) in zip(scene_metadata, trackers, scene_list):
+            for track in tracker.tracks():
+                track["time"] = _frame_time(track["frame"], start_time)
+                track["first_time"] = _frame_time(track["first_frame"], start_time)
+                track["last_time"] = _frame_time(track["last_frame"], start_time)
+                scene_data["objects"].append(track)
+                class_name = track["class_name"]
+                scene_data["class_counts"][class_name] = scene_data["class_counts"].get(class_name, 0) + 1
+
+    return scene_metadata
+
+def analysis_options(adaptive=False, change_threshold=None, track_objects=True, single_pass=False,
+                     detection_width=None, detection_cache=None, **_):
     """
-    params = []
-
-    # Add filters for object class
-    if object_class:
-        query += """
-            AND jsonb_path_exists(
-                objects,
-                %s
-            )
-        """
-        params.append(f'$[*] ? (@.class_name == "{object_class}")')
-
-    # Add filters for confidence
-    if confidence_threshold is not None:
-        query += """
-            AND jsonb_path_exists(
-                objects,
-                %s
-            )
-        """
-        params.append(f'$[*] ? (@.confidence >= {confidence_threshold})')
-
-    # Add filters for location
-    if location:
-        x1, y1, x2, y2 = location
-        query += """
-            AND jsonb_path_exists(
-                objects,
-                %s
-            )
-        """
-        params.append(f'$[*] ? (@.bbox.x1 >= {x1} && @.bbox.y1 >= {y1} && @.bbox.x2 <= {x2} && @.bbox.y2 <= {y2})')
-
-    # Add filters for min class counts
-    if min_class_counts:
-        for class_name, min_count in min_class_counts.items():
-            query += """
-                    AND COALESCE((class_counts->>%s)::int, 0) >= %s
-                """
-            params.extend([class_name, min_count])
-
-    # Execute query
-    cursor.execute(query, params)
-
-    # Fetch results
-    scenes = cursor.fetchall()
-    scene_list = [
-        {
-            "scene": row[0],
-            "start_time": row[1].strftime("%H:%M:%S"),  # Convert to string
-            "end_time": row[2].strftime("%H:%M:%S")  # Convert to string
-        }
-        for row in scenes
-    ]
+    Settings of an analysis that change its result, besides the video, model, frame_skip and threshold.
 
-    cursor.close()
-    conn.close()
-    print(json.dumps(scene_list, indent=4))
-    return scene_list
+    Only settings that differ from the defaults are included, so default runs keep their keys.
 
-def create_subclips(video_file, scenes):
-    video = VideoFileClip(video_file)
+    Args:
+        Keyword arguments of `detect_scenes_and_objects`; those that do not change the result,
+        e.g. pipelined or artifacts, are ignored.
 
-    for scene in scenes:
-        # Parse start and end times
-        start_parts = list(map(float, scene["start_time"].split(":")))
-        end_parts = list(map(float, scene["end_time"].split(":")))
+    Returns:
+        dict: Options for `AnalysisCache.key`.
+    """
+    options = {"adaptive": True, "change_threshold": change_threshold} if adaptive else {}
+    if not track_objects:
+        options["track_objects"] = False
+    if detection_width and not (single_pass or adaptive):
+        options["detection_width"] = detection_width
+    if detection_cache is not None:
+        options["detection_cache"] = True
+    return options
+
+def detect_scenes_and_objects(model, video_path, base_output_folder, fps, metadata_file_prefix="video_metadata", frame_skip = 24, single_pass=False,
+                              batch_size=8, device="auto", cross_scene_batches=True, pipelined=False, writer_threads=None,
+                              threshold=30.0, cache=None, video_id=None, adaptive=False, change_threshold=None,
+                              track_objects=True, checkpoint_path=None, resume=False, columnar=True, on_progress=None,
+                              artifacts="full", jpeg_quality=95, thumbnail_size=320, metrics=None, scene_workers=1,
+                              detection_width=None, detection_cache=None):
+    """
+    Optimized function for scene detection and object detection using PySceneDetect and YOLOv8.
 
-        # Convert to seconds
-        start_seconds = start_parts[0] * 3600 + start_parts[1] * 60 + start_parts[2]
-        end_seconds = end_parts[0] * 3600 + end_parts[1] * 60 + end_parts[2]
+    Args:
+        model (YOLO): Pre-trained YOLOv8 model for object detection.
+        video_path (str): Path to the input video file.
+        base_output_folder (str): Base path for output folders and metadata files.
+        fps (int): Frames per second of the original video.
+        metadata_file_prefix (str): Prefix for the metadata file.
+        frame_skip (int): Number of frames to skip during object detection.
+        single_pass (bool): Find scene cuts and sample frames in one sequential decode
+            instead of detecting scenes first and seeking to every sampled frame.
+        batch_size (int): Number of sampled frames per model call.
+        device (str): Inference device ("auto", "cpu", "mps", "cuda:0", ...). Falls back to CPU
+            if the device fails.
+        cross_scene_batches (bool): Allow a batch to hold frames from more than one scene.
+        pipelined (bool): Run decoding, inference and image writing on separate threads
+            connected by bounded queues.
+        writer_threads (int): Number of image-writer threads, defaults to the number of CPUs.
+        threshold (float): ContentDetector threshold for scene cuts.
+        cache (AnalysisCache): If given, return the cached metadata of an earlier run with the
+            same video, model, frame_skip and threshold, and cache the outputs of a new run
+            instead of writing them to `base_output_folder`.
+        video_id (str): Content hash of the video, computed when a cache is used and not given.
+        adaptive (bool): Sample by content change instead of at a fixed stride, see
+            `frame_sampling.AdaptiveSampler`. Implies a single decoding pass.
+        change_threshold (float): Summed content change that triggers an adaptive sample.
+        track_objects (bool): Store one entry per tracked object instead of one per detection,
+            and count distinct objects in `class_counts`.
+        checkpoint_path (str): Log every finished scene to this JSON Lines file, see
+            `analysis_checkpoint.AnalysisCheckpoint`. The metadata is assembled from the log.
+        resume (bool): Continue from the scenes already in `checkpoint_path` instead of
+            starting over. Also picks up footage appended to the video since the last run.
+        columnar (bool): Also write the metadata as NumPy columns to `columnar_path(<json path>)`,
+            see `columnar_metadata.ColumnarMetadata`.
+        on_progress (callable): Called as on_progress(frames_done, total_frames) after every
+            sampled frame is analyzed. An exception raised from it stops the analysis; scenes
+            already logged to `checkpoint_path` are kept for a resumed run.
+        artifacts (str): Images written for frames with detections: "full", "keyframe",
+            "thumbnails" or "none", see `frame_artifacts.FrameArtifactWriter`. Does not change
+            the metadata.
+        jpeg_quality (int): JPEG quality of the written images.
+        thumbnail_size (int): Longer side of thumbnails in pixels.
+        metrics (AnalysisMetrics): Records per-stage timings and counters of the analysis, e.g.
+            to show them in `on_progress` or export them. A fresh one is used when not given,
+            and its summary is printed at the end.
+        scene_workers (int): Processes that search time chunks of the video for scene cuts in
+            parallel, see `frame_sampling.detect_scene_list`. Only used when scenes are detected
+            up front, i.e. without single_pass or adaptive.
+        detection_width (int): Longer side of the downscaled frames scene detection compares,
+            defaults to scenedetect's choice. Only used when scenes are detected up front.
+        detection_cache (DetectionCache): Reuse the detections of frames that look the same as
+            earlier ones, from this or other videos, instead of inferring them again, see
+            `detection_cache.DetectionCache`. Cached analyses made with and without one are
+            kept apart.
 
-        # Extract subclip
-        clip = video.subclipped(start_seconds, end_seconds)
-        output_file = f"05_02_clips/scene_{scene['scene']}.mp4"
-        print(f"Creating clip: {output_file}")
-        clip.write_videofile(output_file, codec="libx264", audio=True, audio_codec="aac")
-        return output_file
+    Returns:
+        str: Path to the metadata JSON file.
+    """
+    print("fps:" , fps)
+    # Start timing
+    exec_start_time = time.time()
+
+    if cache is not None:
+        options = analysis_options(adaptive, change_threshold, track_objects, single_pass, detection_width,
+                                   detection_cache)
+        cache_key = cache.key(video_id or compute_video_id(video_path), model, frame_skip, threshold, **options)
+        cached_metadata_path = cache.get(cache_key)
+        if cached_metadata_path is not None:
+            print(f"Found cached analysis. Metadata at {cached_metadata_path}")
+            _print_processing_time(exec_start_time)
+            return cached_metadata_path
+        base_output_folder = cache.staging_folder()
+
+    try:
+        metadata_json_path = _detect_scenes_and_objects(
+            model, video_path, base_output_folder, metadata_file_prefix, frame_skip, single_pass, batch_size,
+            device, cross_scene_batches, pipelined, writer_threads, threshold, adaptive, change_threshold,
+            track_objects, fps, checkpoint_path, resume, columnar, on_progress, artifacts, jpeg_quality,
+            thumbnail_size, metrics if metrics is not None else AnalysisMetrics(), scene_workers, detection_width,
+            detection_cache)
+    except BaseException:
+        if cache is not None:
+            cache.discard(base_output_folder)
+        raise
+
+    if cache is not None:
+        metadata_json_path = cache.put(cache_key, base_output_folder, metadata_json_path)
+    print(f"Scene detection and object detection completed. Metadata saved to {metadata_json_path}")
+    _print_processing_time(exec_start_time)
+    return metadata_json_path
 
+def _detect_scenes_and_objects(model, video_path, base_output_folder, metadata_file_prefix, frame_skip, single_pass,
+                               batch_size, device, cross_scene_batches, pipelined, writer_threads, threshold,
+                               adaptive, change_threshold, track_objects, fps, checkpoint_path, resume,
+                               columnar, on_progress, artifacts, jpeg_quality, thumbnail_size, metrics, scene_workers,
+                               detection_width, detection_cache):
+    # Imported here so that search-only users of this module do not pay for scenedetect
+    from analysis_checkpoint import AnalysisCheckpoint
+    from frame_sampling import AdaptiveSampler, SeekingSampler, SinglePassSampler
+
+    checkpoint = None
+    start_frame = 0
+    run_name = None
+    if checkpoint_path:
+        # Settings that change which frames are sampled or what is detected in them
+        settings = {
+            "model": model_fingerprint(model),
+            "frame_skip": frame_skip,
+            "threshold": threshold,
+            "adaptive": adaptive,
+            "change_threshold": change_threshold,
+        }
+        if detection_width and not (single_pass or adaptive):
+            settings["detection_width"] = detection_width
+        if detection_cache is not None:
+            settings["detection_cache"] = True
+        checkpoint = AnalysisCheckpoint(checkpoint_path, settings, fps, resume=resume)
+        start_frame = checkpoint.end_frame
+        if start_frame:
+            print(f"Resuming after {len(checkpoint.scenes)} checkpointed scenes at frame {start_frame}.")
+        # Keep the output names stable so a resumed run adds to the same folders
+        run_name = os.path.splitext(os.path.basename(checkpoint_path))[0]
+
+    # Create output folders
+    annotated_folder, detected_folder, metadata_json_path = _create_output_paths(
+        base_output_folder, metadata_file_prefix, run_name)
+
+    # Scene detection with PySceneDetect, either up front or interleaved with frame sampling
+    if adaptive:
+        sampler = AdaptiveSampler(video_path, frame_skip=frame_skip, threshold=threshold,
+                                  change_threshold=change_threshold, start_frame=start_frame, metrics=metrics)
+    elif single_pass:
+        sampler = SinglePassSampler(video_path, frame_skip=frame_skip, threshold=threshold, start_frame=start_frame,
+                                    metrics=metrics)
+    else:
+        sampler = SeekingSampler(video_path, frame_skip=frame_skip, threshold=threshold, start_frame=start_frame,
+                                 metrics=metrics, detection_width=detection_width, scene_workers=scene_workers)
+
+    engine = BatchInferenceEngine(model, batch_size=batch_size, device=device, cross_scene=cross_scene_batches,
+                                  metrics=metrics, cache=detection_cache)
+    # The pipeline already writes on its own threads; otherwise keep encoding off the inference loop
+    write_artifacts = FrameArtifactWriter(
+        artifacts, annotated_folder, detected_folder, jpeg_quality=jpeg_quality, thumbnail_size=thumbnail_size,
+        background_threads=0 if pipelined else writer_threads or os.cpu_count() or 1, metrics=metrics)
+
+    total_frames = get_video_frame_count(video_path) if on_progress is not None else None
+
+    def _on_result(key, detected_objects):
+        if checkpoint is not None:
+            checkpoint.record(key, detected_objects)
+        if on_progress is not None:
+            # The container's frame count is an estimate, so never report more than 100%
+            on_progress(key[1] + 1, max(total_frames, key[1] + 1))
+
+    on_result = _on_result if (checkpoint is not None or on_progress is not None) else None
 
+    print("Processing scenes...")
+    try:
+        if pipelined:
+            pipeline = AnalysisPipeline(sampler, engine, write_artifacts, writer_threads=writer_threads,
+                                        on_result=on_result)
+            frame_detections = pipeline.run()
+        else:
+            frame_detections = _analyze_frames(sampler, engine, write_artifacts, on_result=on_result)
+        write_artifacts.close()
+        if checkpoint is not None:
+            checkpoint.finish(sampler.scene_list)
+    finally:
+        # No-op after a successful close; after an error, only waits for writes in flight
+        write_artifacts.close(flush=False)
+        if checkpoint is not None:
+            checkpoint.close()
+    print(f"Analysis metrics: {metrics.summary()}")
+
+    if adaptive:
+        saved = sampler.fixed_stride_samples - sampler.frames_sampled
+        print(f"Adaptive sampling sent {sampler.frames_sampled} of {sampler.frames_decoded} frames to the model, "
+              f"{abs(saved)} {'fewer' if saved >= 0 else 'more'} than a fixed stride of {frame_skip} "
+              f"({sampler.fixed_stride_samples}).")
+
+    if checkpoint is not None:
+        scene_list, frame_detections = checkpoint.scene_list(), checkpoint.frame_detections()
+    else:
+        scene_list = sampler.scene_list
+    scene_metadata = _build_scene_metadata(scene_list, frame_detections, track_objects)
+
+    _write_metadata(scene_metadata, metadata_json_path, columnar, get_video_frame_size(video_path))
+    return metadata_json_path
 
 # if __name__ == "__main__":
 #     # Parameters
@@ -321,8 +394,8 @@ def create_subclips(video_file, scenes):
 #     metadata = detect_scenes_and_objects(model, video_path, base_output_folder, fps, frame_skip=frame_skip)
 #
 #     # Step 1: Insert metadata into the database
-#     insert_metadata_into_db(metadata)
+#     video_id = insert_metadata_into_db(metadata, video_path=video_path)
 #     # Step 2: Fetch scenes from the database
-#     scenes = fetch_scenes_from_db(object_class="person", confidence_threshold=0.80, min_class_counts={"person": 20 })
+#     scenes = fetch_scenes_from_db(object_class="person", confidence_threshold=0.80, min_class_counts={"person": 20 }, video_id=video_id)
 #     # Step 3: Extract subclips from the video
 #     create_subclips(video_path, scenes)
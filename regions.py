@@ -0,0 +1,107 @@
+import numpy as np
+
+# The frame is split into GRID_SIZE x GRID_SIZE cells, one bit each in a 64-bit mask.
+# A power of two, so cell boundaries are exact in binary floating point.
+GRID_SIZE = 8
+
+# Named regions in normalized (x1, y1, x2, y2) coordinates
+QUADRANTS = {
+    "top-left": (0.0, 0.0, 0.5, 0.5),
+    "top-right": (0.5, 0.0, 1.0, 0.5),
+    "bottom-left": (0.0, 0.5, 0.5, 1.0),
+    "bottom-right": (0.5, 0.5, 1.0, 1.0),
+}
+
+
+def resolve_location(location):
+    """
+    Turn a location filter into a normalized rectangle.
+
+    Args:
+        location (str or tuple): A name from QUADRANTS, an (x1, y1, x2, y2) rectangle
+            normalized to [0, 1], or None / "None" for no filter.
+
+    Returns:
+        tuple: (x1, y1, x2, y2) as floats, or None.
+    """
+    if location is None or location == "None":
+        return None
+    if isinstance(location, str):
+        if location not in QUADRANTS:
+            raise ValueError(f"Unknown location {location!r}, expected one of {', '.join(QUADRANTS)}.")
+        return QUADRANTS[location]
+    x1, y1, x2, y2 = (float(value) for value in location)
+    if not x1 <= x2 or not y1 <= y2:
+        raise ValueError(f"Invalid location {location}, expected x1 <= x2 and y1 <= y2.")
+    return x1, y1, x2, y2
+
+
+def _cell_ranges(x1, y1, x2, y2):
+    # First and last grid column and row each box overlaps with positive area, clamped to the grid
+    last = GRID_SIZE - 1
+    col1 = np.clip(np.floor(x1 * GRID_SIZE), 0, last).astype(np.int64)
+    row1 = np.clip(np.floor(y1 * GRID_SIZE), 0, last).astype(np.int64)
+    col2 = np.maximum(np.clip(np.ceil(x2 * GRID_SIZE) - 1, 0, last).astype(np.int64), col1)
+    row2 = np.maximum(np.clip(np.ceil(y2 * GRID_SIZE) - 1, 0, last).astype(np.int64), row1)
+    return col1, row1, col2, row2
+
+
+def grid_masks(bboxes):
+    """
+    Compute the grid cell bitmask of every box.
+
+    Bit `row * GRID_SIZE + col` is set for every cell the box overlaps. Boxes are rounded to
+    float32 first, the precision they are stored in, so masks agree with the stored coordinates.
+
+    Args:
+        bboxes (array): (n, 4) normalized x1, y1, x2, y2.
+
+    Returns:
+        array: (n,) int64 masks, the unsigned bit pattern as stored in a BIGINT column.
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+    col1, row1, col2, row2 = _cell_ranges(*bboxes.T)
+    # Bits of the overlapped columns within one row, then that row pattern on every overlapped row
+    column_bits = (np.uint64(1) << (col2 - col1 + 1).astype(np.uint64)) - np.uint64(1)
+    column_bits <<= col1.astype(np.uint64)
+    masks = np.zeros(len(bboxes), dtype=np.uint64)
+    for row in range(GRID_SIZE):
+        overlapped = (row1 <= row) & (row <= row2)
+        masks[overlapped] |= column_bits[overlapped] << np.uint64(row * GRID_SIZE)
+    return masks.view(np.int64)
+
+
+def region_query(location):
+    """
+    Grid form of a location filter.
+
+    A box lies within the region only if it overlaps no cell outside the cells the region
+    touches, so `mask & outside == 0` rules out most boxes without reading coordinates. When the
+    region's edges fall on cell boundaries, as for the quadrants, the test is exact.
+
+    Args:
+        location (str or tuple): Anything accepted by `resolve_location`.
+
+    Returns:
+        tuple: ((x1, y1, x2, y2), outside, exact), where `outside` is the int64 mask of cells
+            the region does not touch, or None if there is no location filter.
+    """
+    rectangle = resolve_location(location)
+    if rectangle is None:
+        return None
+    x1, y1, x2, y2 = (min(max(value, 0.0), 1.0) for value in rectangle)
+    col1, row1, col2, row2 = (int(value) for value in _cell_ranges(x1, y1, x2, y2))
+    inside = 0
+    for row in range(row1, row2 + 1):
+        for col in range(col1, col2 + 1):
+            inside |= 1 << (row * GRID_SIZE + col)
+    outside = _signed(~inside & (2 ** 64 - 1))
+    # Edges on cell boundaries and inside the frame: the cells decide containment on their own
+    exact = rectangle == (x1, y1, x2, y2) and all(
+        (value * GRID_SIZE).is_integer() for value in rectangle)
+    return rectangle, outside, exact
+
+
+def _signed(mask):
+    # Unsigned 64-bit pattern as the int64 value PostgreSQL's BIGINT holds
+    return mask - 2 ** 64 if mask >= 2 ** 63 else mask
@@ -0,0 +1,158 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import torch
+from tqdm import tqdm
+from ultralytics import YOLO
+
+from analysis_metrics import AnalysisMetrics
+from batch_inference import BatchInferenceEngine
+from frame_artifacts import FrameArtifactWriter
+from frame_sampling import SeekingSampler, detect_scene_list
+from metadata_db import get_video_frame_size
+from pyscene_optimized import (
+    _analyze_frames,
+    _build_scene_metadata,
+    _create_output_paths,
+    _print_processing_time,
+    _write_metadata,
+)
+
+# Model instance of the current worker process, loaded once by _init_worker
+_worker_model = None
+
+
+def split_scenes_into_shards(scene_list, num_shards):
+    """
+    Split a scene list into contiguous runs of scenes with roughly equal frame counts.
+
+    Args:
+        scene_list (list): (start, end) FrameTimecode pairs from scene detection.
+        num_shards (int): Number of shards wanted. Fewer are returned if there are fewer scenes.
+
+    Returns:
+        list: One list of scene indices per shard, in scene order.
+    """
+    lengths = [end.get_frames() - start.get_frames() for start, end in scene_list]
+    total_frames = sum(lengths)
+    num_shards = max(1, min(num_shards, len(scene_list)))
+
+    shards = []
+    current = []
+    frames_so_far = 0
+    for i, length in enumerate(lengths):
+        if current:
+            target = total_frames * (len(shards) + 1) / num_shards
+            shards_left = num_shards - len(shards) - 1
+            scenes_left = len(lengths) - i
+            # Close the shard when it is closer to its share without this scene than with it,
+            # or when every shard left needs one of the remaining scenes
+            if shards_left > 0 and (abs(frames_so_far - target) <= abs(frames_so_far + length - target)
+                                    or scenes_left == shards_left):
+                shards.append(current)
+                current = []
+        current.append(i)
+        frames_so_far += length
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _init_worker(model_path, torch_threads):
+    global _worker_model
+    # Keep workers from oversubscribing the CPU with torch's own thread pool
+    torch.set_num_threads(torch_threads)
+    _worker_model = YOLO(model_path)
+
+
+def _analyze_shard(video_path, scene_list, scene_indices, frame_skip, batch_size, device,
+                   annotated_folder, detected_folder, artifacts, jpeg_quality, thumbnail_size):
+    # Each worker opens its own cv2.VideoCapture through the sampler
+    metrics = AnalysisMetrics()
+    sampler = SeekingSampler(video_path, frame_skip=frame_skip, scene_list=scene_list, scene_indices=scene_indices,
+                             metrics=metrics)
+    engine = BatchInferenceEngine(_worker_model, batch_size=batch_size, device=device, verbose=False, metrics=metrics)
+    write_artifacts = FrameArtifactWriter(artifacts, annotated_folder, detected_folder, jpeg_quality=jpeg_quality,
+                                          thumbnail_size=thumbnail_size, background_threads=1, metrics=metrics)
+    try:
+        frame_detections = _analyze_frames(sampler, engine, write_artifacts, show_progress=False)
+        write_artifacts.close()
+    finally:
+        write_artifacts.close(flush=False)
+    # Metrics are per process, so the shard's are sent back with its detections
+    return frame_detections, metrics.snapshot()
+
+
+def detect_scenes_and_objects_sharded(model_path, video_path, base_output_folder, fps, metadata_file_prefix="video_metadata",
+                                      frame_skip=24, workers=None, num_shards=None, batch_size=8, device="auto",
+                                      track_objects=True, artifacts="full", jpeg_quality=95, thumbnail_size=320,
+                                      metrics=None, detection_width=None, threshold=30.0):
+    """
+    Scene and object detection split across worker processes by scene ranges.
+
+    Scene detection runs first, split into time chunks over the same number of worker
+    processes (see `frame_sampling.detect_scene_list`). The scene list is then split into shards
+    of roughly equal frame counts, and each shard is analyzed in a worker process with its own
+    video capture and model instance. The per-shard detections are merged in scene order into
+    the same JSON `detect_scenes_and_objects` writes.
+
+    Args:
+        model_path (str): Path to the YOLOv8 weights, loaded once in every worker.
+        video_path (str): Path to the input video file.
+        base_output_folder (str): Base path for output folders and metadata files.
+        fps (int): Frames per second of the original video.
+        metadata_file_prefix (str): Prefix for the metadata file.
+        frame_skip (int): Number of frames to skip during object detection.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        num_shards (int): Number of shards, defaults to `workers`. More shards than workers
+            evens out scenes that are slower to analyze than their frame count suggests.
+        batch_size (int): Number of sampled frames per model call in each worker.
+        device (str): Inference device for the workers.
+        track_objects (bool): Store one entry per tracked object instead of one per detection.
+        artifacts (str): Images written for frames with detections, see
+            `frame_artifacts.FrameArtifactWriter`. Keyframes are picked per shard.
+        jpeg_quality (int): JPEG quality of the written images.
+        thumbnail_size (int): Longer side of thumbnails in pixels.
+        metrics (AnalysisMetrics): Receives the merged metrics of all shards.
+        detection_width (int): Longer side of the downscaled frames scene detection compares,
+            defaults to scenedetect's choice.
+        threshold (float): ContentDetector threshold for scene cuts.
+
+    Returns:
+        str: Path to the metadata JSON file.
+    """
+    print("fps:", fps)
+    exec_start_time = time.time()
+    workers = workers or os.cpu_count() or 1
+    metrics = metrics if metrics is not None else AnalysisMetrics()
+    annotated_folder, detected_folder, metadata_json_path = _create_output_paths(base_output_folder, metadata_file_prefix)
+
+    scene_list = detect_scene_list(video_path, threshold=threshold, detection_width=detection_width, workers=workers)
+    shards = split_scenes_into_shards(scene_list, num_shards or workers)
+    print(f"Processing {len(scene_list)} scenes in {len(shards)} shards on {workers} workers...")
+
+    frame_detections = []
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    # Spawn rather than fork: the parent may already hold torch and decoder threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(model_path, torch_threads)) as executor:
+        futures = [
+            executor.submit(_analyze_shard, video_path, scene_list, shard, frame_skip, batch_size, device,
+                            annotated_folder, detected_folder, artifacts, jpeg_quality, thumbnail_size)
+            for shard in shards
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures), unit="shard"):
+            shard_detections, shard_metrics = future.result()
+            frame_detections.extend(shard_detections)
+            metrics.merge(shard_metrics)
+    print(f"Analysis metrics: {metrics.summary()}")
+
+    frame_detections.sort(key=lambda item: item[0])
+    scene_metadata = _build_scene_metadata(scene_list, frame_detections, track_objects)
+
+    _write_metadata(scene_metadata, metadata_json_path, frame_size=get_video_frame_size(video_path))
+    print(f"Scene detection and object detection completed. Metadata saved to {metadata_json_path}")
+    _print_processing_time(exec_start_time)
+    return metadata_json_path
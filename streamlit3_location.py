@@ -2,20 +2,41 @@ import streamlit as st
 import cv2
 import tempfile
 from pyscene_optimized import *
-from ultralytics import YOLO
 import os
 import json
 import shutil
+from analysis_jobs import ACTIVE_STATUSES, JobQueue, start_workers
+from analysis_metrics import summarize
+from detector_backends import DETECTOR_BACKENDS, MODEL_SIZES
+from video_storage import VideoStorage
+from functools import partial
 
-# Load YOLO model
-MODEL_PATH = "yolo_models/YOLOv8x.pt"
-model = YOLO(MODEL_PATH)
+MODEL_PATH = os.environ.get("FREEZE_MODEL_PATH", "yolo_models/YOLOv8x.pt")
+# Frame images kept per analysis, see frame_artifacts.ARTIFACT_MODES
+ARTIFACTS = os.environ.get("FREEZE_ARTIFACTS", "keyframe")
+# Default detector of the analysis, see detector_backends
+MODEL_SIZE = os.environ.get("FREEZE_MODEL_SIZE", "x")
+DETECTOR_BACKEND = os.environ.get("FREEZE_DETECTOR_BACKEND", "torch")
 
-# Initialize database connection details (update with your credentials)
-DB_HOST = "localhost"
-DB_NAME = "video_metadata"
-DB_USER = "video_user_1"
-DB_PASS = "user1password"
+
+# Streamlit reruns this script on every interaction, so process-wide resources are cached
+@st.cache_resource
+def get_job_queue():
+    """Start the analysis workers on the first run and keep them for the life of the process."""
+    # FREEZE_ANALYSIS_WORKERS sets how many videos are analyzed at once. Each worker loads the
+    # model on its first job, so the app itself never imports torch.
+    job_queue = JobQueue()
+    start_workers(MODEL_PATH, job_queue.path)
+    return job_queue
+
+
+@st.cache_resource
+def get_video_storage():
+    # Uploads are kept here under their content hash until the FREEZE_UPLOAD_MAX_MB quota evicts them
+    return VideoStorage()
+
+
+# Database connection details are read from the FREEZE_DB_* environment variables (see db_pool.py)
 
 st.title("Freeze - Video Content Search Engine")
 
@@ -23,33 +44,63 @@ st.title("Freeze - Video Content Search Engine")
 uploaded_file = st.file_uploader("Upload your video", type=["mp4", "mov", "avi"])
 
 if uploaded_file:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        temp_video.write(uploaded_file.read())
-        video_path = temp_video.name
+    # Streamed to storage once per uploaded file, not on every rerun of the script
+    if st.session_state.get("upload_file_id") != uploaded_file.file_id:
+        # Videos still being analyzed or searched are not evicted to make room
+        in_use = [job["video_path"] for job in get_job_queue().active_jobs()]
+        in_use += [st.session_state["video_path"]] if "video_path" in st.session_state else []
+        try:
+            upload_video_id, upload_path = get_video_storage().store(uploaded_file, uploaded_file.name, keep=in_use)
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+        st.session_state["upload_file_id"] = uploaded_file.file_id
+        st.session_state["upload_video_id"] = upload_video_id
+        st.session_state["upload_path"] = upload_path
+    video_path = st.session_state["upload_path"]
 
     st.video(video_path)
 
-    # Step 2: Analyze Video
+    # Smaller models and the exported CPU backends trade some accuracy for speed
+    model_size = st.selectbox("Model size", MODEL_SIZES, index=MODEL_SIZES.index(MODEL_SIZE))
+    backend = st.selectbox("Detector backend", DETECTOR_BACKENDS, index=DETECTOR_BACKENDS.index(DETECTOR_BACKEND))
+
+    # Step 2: Analyze Video, queued for a background worker so the app stays responsive
     if st.button("Analyze Video"):
-        with st.spinner("Analyzing video..."):
-            fps = get_video_fps(video_path)
-            base_output_folder = "output_metadata"
-            frame_skip = 24  # Default frame skipping value for faster processing
-
-            # Run detection
-            metadata_file = detect_scenes_and_objects(
-                model=model,
-                video_path=video_path,
-                base_output_folder=base_output_folder,
-                fps=fps,
-                frame_skip=frame_skip
-            )
-
-            # Insert metadata into the database
-            insert_metadata_into_db(metadata_file)
-
-            st.success("Video analyzed and metadata stored successfully!")
-            st.session_state["video_path"] = video_path
+        job_id = get_job_queue().submit(video_path, st.session_state["upload_video_id"], artifacts=ARTIFACTS,
+                                        model_size=model_size, backend=backend)
+        st.success(f"Analysis queued as job {job_id}.")
+
+
+# Jobs are kept in the queue's table, so they survive a browser refresh. Only this part of the
+# page reruns while polling.
+@st.fragment(run_every=2)
+def show_jobs():
+    jobs = get_job_queue().jobs()
+    if not jobs:
+        return
+    st.subheader("Analysis Jobs")
+    for job in jobs:
+        st.write(f"Job {job['id']}: {os.path.basename(job['video_path'])} - {job['status']}")
+        if job["status"] in ACTIVE_STATUSES:
+            st.progress(job["progress"], text=job["message"] or job["status"])
+            if job["metrics"]:
+                # Frames, errors and the mean time per stage so far
+                st.caption(summarize(job["metrics"]))
+            if st.button("Cancel", key=f"cancel_{job['id']}"):
+                get_job_queue().cancel(job["id"])
+        elif job["status"] == "failed":
+            st.error(job["message"])
+        elif job["status"] == "done" and st.button("Search this video", key=f"search_{job['id']}"):
+            st.session_state["video_path"] = job["video_path"]
+            st.session_state["video_id"] = job["result"]["video_id"]
+            # Seconds between sampled frames, to join the frames of one time span
+            st.session_state["sample_interval"] = job["result"]["sample_interval"]
+            st.session_state.pop("scenes", None)
+            st.rerun()
+
+
+show_jobs()
 
 # Step 3: Search Functionality
 if "video_path" in st.session_state:
@@ -57,19 +108,33 @@ if "video_path" in st.session_state:
     object_class = st.text_input("Enter object class (e.g., person, car)")
     confidence_threshold = st.number_input("Confidence Threshold (0.0 to 1.0)", value=0.8, step=0.1)
     min_class_counts_input = st.text_input("Enter minimum class counts in JSON format (e.g., {\"person\": 2})")
+    time_spans = st.checkbox("Return only the time spans the object appears in, not whole scenes")
     # Add location filter
     location = st.selectbox(
         "Select location",
-        ["None", "top-left", "top-right", "bottom-left", "bottom-right"]
+        ["None", "top-left", "top-right", "bottom-left", "bottom-right", "custom"]
     )
+    if location == "custom":
+        # Fractions of the frame width and height the object must lie within
+        x_range = st.slider("Horizontal range", 0.0, 1.0, (0.0, 1.0), step=0.05)
+        y_range = st.slider("Vertical range", 0.0, 1.0, (0.0, 1.0), step=0.05)
+        location = (x_range[0], y_range[0], x_range[1], y_range[1])
     if st.button("Search"):
         with st.spinner("Fetching scenes..."):
             try:
                 min_class_counts = json.loads(min_class_counts_input) if min_class_counts_input else None
-                scenes = fetch_scenes_from_db(
+                if time_spans:
+                    # A span survives one sampled frame in which the object was missed
+                    search = partial(fetch_time_spans_from_db,
+                                     max_gap=2 * st.session_state.get("sample_interval", 1.0))
+                else:
+                    search = fetch_scenes_from_db
+                scenes = search(
                     object_class=object_class,
                     confidence_threshold=confidence_threshold,
-                    min_class_counts=min_class_counts
+                    location=location,
+                    min_class_counts=min_class_counts,
+                    video_id=st.session_state.get("video_id")
                 )
                 st.session_state["scenes"] = scenes  # Save scenes to session state
                 st.success("Scenes fetched successfully!")
@@ -80,9 +145,9 @@ if "video_path" in st.session_state:
 # Display and extract scenes if available
 if "scenes" in st.session_state and st.session_state["scenes"]:
     scenes = st.session_state["scenes"]
-    for scene in scenes:
+    for i, scene in enumerate(scenes):
         st.write(f"Scene {scene['scene']}: {scene['start_time']} - {scene['end_time']}")
-        if st.button(f"Extract Scene {scene['scene']}"):
+        if st.button(f"Extract Scene {scene['scene']}", key=f"extract_{i}"):
             with st.spinner(f"Extracting Scene {scene['scene']}..."):
                 try:
                     video_path = st.session_state["video_path"]
@@ -91,7 +156,7 @@ if "scenes" in st.session_state and st.session_state["scenes"]:
                     clip_path = os.path.join(temp_dir.name, "extracted_scene.mp4")
 
                     # Create the subclip
-                    output_path = create_subclips(video_path, [scene])  # Save the extracted clip
+                    output_path = create_subclips(video_path, [scene], mode="exact")[0]  # Save the extracted clip
 
                     if os.path.exists(output_path):
                         # Copy the output to the temporary directory
@@ -107,3 +172,7 @@ if "scenes" in st.session_state and st.session_state["scenes"]:
 # Display extracted clip if available
 if "clip_path" in st.session_state and st.session_state["clip_path"]:
     st.video(st.session_state["clip_path"])
+
+# Connection pool counters, for sizing FREEZE_DB_POOL_MAX
+with st.sidebar.expander("Database pool"):
+    st.json(pool_metrics())
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+# Containers accepted for upload, matching the app's file uploader
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+
+_PARTIAL_PREFIX = ".upload-"
+# Partial uploads older than this were left by a crashed process
+_STALE_PARTIAL_SECONDS = 3600
+
+
+class VideoStorage:
+    """
+    Directory of uploaded videos, each stored once under its content hash.
+
+    `store` streams an upload to disk in fixed-size chunks and hashes it in the same pass, so
+    memory use does not grow with the file size and the returned id is the one
+    `compute_video_id` would compute. Files keep the extension of the uploaded name.
+
+    When storing a video would take the directory past `max_bytes`, the least recently stored
+    or re-uploaded videos are deleted first. Videos passed as `keep`, e.g. those of queued
+    analysis jobs, are never deleted.
+
+    Args:
+        root (str): Storage directory, defaults to FREEZE_UPLOAD_DIR or "uploaded_videos".
+        max_bytes (int): Size limit, defaults to FREEZE_UPLOAD_MAX_MB megabytes (20 GB).
+    """
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.environ.get("FREEZE_UPLOAD_DIR", "uploaded_videos")
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("FREEZE_UPLOAD_MAX_MB", "20480")) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_stale_partials()
+
+    def _remove_stale_partials(self):
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if name.startswith(_PARTIAL_PREFIX) and now - os.path.getmtime(path) > _STALE_PARTIAL_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass  # Removed by another process
+
+    def _videos(self):
+        # (path, size, mtime) of every stored video
+        videos = []
+        for name in os.listdir(self.root):
+            if name.startswith(_PARTIAL_PREFIX):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Evicted by another process
+            videos.append((path, stat.st_size, stat.st_mtime))
+        return videos
+
+    def path(self, video_id):
+        """Return the path of a stored video, or None if it is not stored."""
+        for extension in VIDEO_EXTENSIONS:
+            path = os.path.join(self.root, video_id + extension)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def store(self, file, filename, keep=(), chunk_size=8 * 1024 * 1024):
+        """
+        Store an uploaded video, unless the same content is already stored.
+
+        Args:
+            file: Readable binary file object, e.g. a Streamlit UploadedFile. Read from the start.
+            filename (str): Name of the uploaded file, whose extension is kept.
+            keep (iterable): Paths of stored videos that must not be deleted to make room.
+            chunk_size (int): Number of bytes read, hashed and written at a time.
+
+        Returns:
+            tuple: (video_id, path), the SHA-256 of the content and the stored file.
+
+        Raises:
+            ValueError: If the extension is not a supported container, or the video does not fit
+                in `max_bytes` even after deleting every video not in `keep`.
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in VIDEO_EXTENSIONS:
+            raise ValueError(f"Unsupported video type {extension!r}, expected one of {', '.join(VIDEO_EXTENSIONS)}.")
+
+        digest = hashlib.sha256()
+        size = 0
+        partial_path = os.path.join(self.root, f"{_PARTIAL_PREFIX}{uuid.uuid4().hex}")
+        try:
+            file.seek(0)
+            with open(partial_path, "wb") as partial:
+                for chunk in iter(lambda: file.read(chunk_size), b""):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f"{filename} is larger than the upload limit of "
+                                         f"{self.max_bytes // (1024 * 1024)} MB.")
+                    digest.update(chunk)
+                    partial.write(chunk)
+            video_id = digest.hexdigest()
+
+            with self._lock:
+                existing = self.path(video_id)
+                if existing is not None:
+                    # Already stored: count the upload as a use, so it is evicted last
+                    os.utime(existing)
+                    return video_id, existing
+                self._make_room(size, keep)
+                path = os.path.join(self.root, video_id + extension)
+                os.replace(partial_path, path)
+            return video_id, path
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+    def _make_room(self, size, keep):
+        keep = {os.path.abspath(path) for path in keep}
+        videos = sorted(self._videos(), key=lambda video: video[2])
+        total = sum(video_size for _, video_size, _ in videos)
+        # Oldest first
+        for path, video_size, _ in videos:
+            if total + size <= self.max_bytes:
+                return
+            if os.path.abspath(path) in keep:
+                continue
+            os.remove(path)
+            total -= video_size
+        if total + size > self.max_bytes:
+            raise ValueError("Video storage is full with videos that are still in use. Try again later.")
+
+    def remove(self, video_id):
+        """Delete a stored video, if it is stored."""
+        path = self.path(video_id)
+        if path is not None:
+            os.remove(path)
+
+    def stats(self):
+        """Return the number of stored videos, their total size and the size limit."""
+        videos = self._videos()
+        return {
+            "videos": len(videos),
+            "bytes": sum(size for _, size, _ in videos),
+            "max_bytes": self.max_bytes,
+        }